@@ -13,10 +13,85 @@ class Settings(BaseSettings):
     database_url: str
     debug_level: int
 
+    # Defaults to database_url with its async driver (aiosqlite / asyncpg)
+    async_database_url: str = ""
+
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
     refresh_access_token_expire_days: int = 7
 
+    # Rows updated per transaction by the midnight streak reset
+    streak_reset_chunk_size: int = 1000
+
+    # Compute expired streaks on read instead of resetting them in bulk
+    lazy_streak_expiry: bool = False
+
+    # Days of raw check-ins kept before they are folded into run-length segments
+    checkin_compaction_days: int = 30
+
+    # Bounds of the process-wide username/email -> user cache, 0 disables it
+    identity_cache_size: int = 10000
+    identity_cache_ttl_seconds: int = 300
+
+    # Scheduler leadership: lease length, and how often the leader renews it
+    scheduler_lease_seconds: int = 30
+    scheduler_heartbeat_seconds: int = 10
+
+    # SQLite connection pragmas, applied on connect when the database is SQLite
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are KiB, positive values are pages
+    sqlite_cache_size: int = -64 * 1024
+
+    # Write-behind batching of check-ins, flushed every interval or max items
+    checkin_write_behind: bool = False
+    checkin_flush_interval_ms: int = 200
+    checkin_flush_max_items: int = 500
+    # "flush": respond once the batch is committed, "enqueue": respond once validated
+    checkin_durability: str = "flush"
+
+    # Access log: share of requests logged with their body (errors always are),
+    # and how many body bytes to keep, 0 disables body logging
+    access_log_sample_rate: float = 0.0
+    access_log_body_bytes: int = 1024
+
+    # Log output, written by a background thread: "text" or "json", a size-rotated
+    # file ("" logs to the console only), and per-logger levels as "name=LEVEL,..."
+    log_format: str = "text"
+    log_file: str = "app.log"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_levels: str = ""
+
+    # Statements slower than this are logged to "sql.slow", 0 disables the log
+    sql_slow_query_ms: float = 200
+    # Per-request SQL profiler, for every request or for requests sending the
+    # X-SQL-Profile header, and the repeat count flagging a statement as N+1
+    sql_profiling: bool = False
+    sql_profile_by_header: bool = False
+    sql_profile_repeat_threshold: int = 5
+    # Send the profile summary back in the X-SQL-Profile response header
+    sql_profile_response_header: bool = True
+
+    # bcrypt cost, hashes with another cost are replaced on the next login
+    bcrypt_rounds: int = 12
+    # Threads hashing passwords, and calls allowed to wait for them before a 503
+    password_workers: int = 2
+    password_queue_size: int = 32
+
+    # Verified JWT claims kept per process until the token expires, 0 disables it
+    token_cache_size: int = 10000
+
+    # Cached responses of the public event reads: "" keeps them in an in-process LRU
+    # of response_cache_size entries, "redis://..." shares them between replicas
+    # (needs the redis package); TTL per kind of response, 0 disables its caching
+    response_cache_url: str = ""
+    response_cache_size: int = 1000
+    response_cache_list_ttl_seconds: float = 30
+    response_cache_details_ttl_seconds: float = 10
+
     class Config:
         """Class to set the configuration for the settings class."""
 
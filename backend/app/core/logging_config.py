@@ -0,0 +1,134 @@
+"""
+This module configures the application's log pipeline.
+
+Request handlers must not wait on file or console I/O, so the root logger only has
+a `QueueHandler`: a log call renders its message, puts the record on an in-memory
+queue and returns. A `QueueListener` thread takes records off the queue and writes
+them to the console and to a size-rotated file (`log_file`, `log_max_bytes`,
+`log_backup_count`), either as text or as one JSON object per line (`log_format`).
+`log_levels` sets the level of individual loggers, e.g. "access=WARNING,auth=INFO".
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+from app.core.config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_FORMATS = ("text", "json")
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        # Structured fields of the access log, see `AccessLogMiddleware`
+        entry.update(getattr(record, "access", None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _EnqueueHandler(QueueHandler):
+    """QueueHandler that leaves the formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments and tracebacks are rendered now, they may change or go away once
+        # the call returns, the rest of the formatting happens on the listener thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_log_levels(value: str) -> Dict[str, int]:
+    """
+    Parse per-logger levels, e.g. "access=WARNING,sqlalchemy.engine=INFO".
+
+    Returns:
+        dict: logger name -> level.
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, level = (part.strip() for part in item.partition("="))
+        level = int(level) if level.isdigit() else logging.getLevelName(level.upper())
+        if not name or not isinstance(level, int):
+            raise ValueError(f"Invalid log level setting [{item}]")
+        levels[name] = level
+    return levels
+
+
+def setup_logging() -> QueueListener:
+    """Route every log record through a queue to a background writer thread."""
+    global _listener  # pylint: disable=global-statement
+    if settings.log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format [{settings.log_format}]")
+    stop_logging()
+
+    formatter = (
+        JsonFormatter()
+        if settings.log_format == "json"
+        else logging.Formatter(TEXT_FORMAT)
+    )
+    handlers = [logging.StreamHandler()]  # Logs to console
+    if settings.log_file:
+        handlers.append(
+            RotatingFileHandler(
+                settings.log_file,
+                maxBytes=settings.log_max_bytes,
+                backupCount=settings.log_backup_count,
+                encoding="utf-8",
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(_EnqueueHandler(log_queue))
+    root.setLevel(int(settings.debug_level))
+    for name, level in parse_log_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write the queued records and stop the writer thread."""
+    global _listener  # pylint: disable=global-statement
+    _remove_enqueue_handlers(logging.getLogger())
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def _remove_enqueue_handlers(logger: logging.Logger):
+    for handler in [h for h in logger.handlers if isinstance(h, _EnqueueHandler)]:
+        logger.removeHandler(handler)
+
+
+# Flush what is still queued when the process exits
+atexit.register(stop_logging)
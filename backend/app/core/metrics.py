@@ -0,0 +1,318 @@
+"""
+This module contains the in-process metrics exposed on `/metrics`.
+
+Counters, gauges and histograms are plain objects updated under a lock, cheap
+enough for the request path; `registry.render()` produces the Prometheus text
+format on scrape. Values that already live elsewhere (pool usage, cache counters)
+are read by collectors at scrape time instead of being tracked on every call.
+
+Metrics are per process, each replica is scraped on its own.
+"""
+
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from sub-millisecond queries to slow scheduler jobs
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# (sample name, labels, value) of a metric
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base of the metric types, one child value per combination of labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Reported (as zero) before the first update
+            self.labels()
+
+    def labels(self, *values):
+        """Return the child for some label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def clear(self):
+        """Drop every child, e.g. between tests."""
+        with self._lock:
+            self._children.clear()
+        if not self.labelnames:
+            self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[Sample]:
+        """Return the samples of every child."""
+        raise NotImplementedError
+
+    def _label_dict(self, values: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+
+class _Value:
+    """Counter or gauge value."""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Add to the value."""
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        """Subtract from the value."""
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        """Set the value."""
+        self.value = value
+
+
+class _ValueMetric(_Metric):
+    """Metric with a single value per child."""
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        """Increment the value of a metric without labels."""
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, self._label_dict(values), child.value
+
+
+class Counter(_ValueMetric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def samples(self):
+        for _, labels, value in super().samples():
+            yield f"{self.name}_total", labels, value
+
+
+class Gauge(_ValueMetric):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        """Decrement the value of a metric without labels."""
+        self.labels().dec(amount)
+
+
+class _HistogramValue:
+    """Bucket counts (not cumulative) and sum of the observations."""
+
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Count an observation in its bucket."""
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float):
+        """Observe a value of a metric without labels."""
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            labels = self._label_dict(values)
+            with child._lock:  # pylint: disable=protected-access
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = dict(labels, le=_format_value(bound))
+                yield f"{self.name}_bucket", bucket_labels, cumulative
+            yield f"{self.name}_count", labels, cumulative
+            yield f"{self.name}_sum", labels, total
+
+
+class MetricsRegistry:
+    """The metrics and collectors rendered on `/metrics`."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # (name, kind, documentation, callback returning samples)
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric, returns it."""
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        """Create and register a gauge."""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(self, name: str, kind: str, documentation: str):
+        """Decorate a function returning the (labels, value) pairs of a metric."""
+
+        def decorator(func: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+            self._collectors.append((name, kind, documentation, func))
+            return func
+
+        return decorator
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics:
+            name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(
+                    f"{sample_name}{_format_labels(labels)} {_format_value(value)}"
+                )
+        for name, kind, documentation, func in self._collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in func():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries",
+    "Database queries issued per HTTP request.",
+    ("route",),
+    buckets=COUNT_BUCKETS,
+)
+http_request_db_duration = registry.histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per HTTP request.",
+    ("route",),
+)
+db_queries = registry.counter("db_queries", "Database queries executed.", ("engine",))
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Database query duration.", ("engine",)
+)
+db_pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    ("engine",),
+)
+scheduler_job_duration = registry.histogram(
+    "scheduler_job_duration_seconds",
+    "Duration of the scheduled jobs run by this replica.",
+    ("job", "outcome"),
+)
+websocket_connections = registry.gauge(
+    "websocket_connections", "Open WebSocket connections."
+)
+
+
+class RequestQueries:
+    """Database queries issued while serving the current request."""
+
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Set by `MetricsMiddleware` for the duration of a request, None outside requests
+current_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar(
+    "current_request_queries", default=None
+)
@@ -3,48 +3,213 @@
 """
 
 import logging
+import random
+import re
 import time
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.metrics import (
+    RequestQueries,
+    current_request_queries,
+    http_request_db_duration,
+    http_request_db_queries,
+    http_request_duration,
+)
+from app.core.sql_profiler import SqlProfile, current_sql_profile
 
-middleware_logger = logging.getLogger("middleware")
+access_logger = logging.getLogger("access")
 
-class LogRequestsMiddleware(BaseHTTPMiddleware):
-    """Logs incoming requests and response metadata."""
+# Bodies of these routes carry credentials or tokens, they are never kept
+UNLOGGED_BODY_PATHS = frozenset(
+    {"/api/v1/users/login", "/api/v1/users/signup", "/api/v1/users/token/refresh"}
+)
+# Values of these JSON fields are masked in logged bodies
+REDACTED_FIELDS = ("password", "token", "access_token", "refresh_token")
+_REDACTED_VALUE = re.compile(
+    r'("(?:%s)"\s*:\s*)("(?:[^"\\]|\\.)*"?|[^\s,}\]]*)' % "|".join(REDACTED_FIELDS)
+)
 
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
 
-        # Log Request Details
-        client_ip = request.client.host if request.client else "Unknown"
-        headers = dict(request.headers)
-        query_params = dict(request.query_params)
+def _keeps_body(scope: Scope) -> bool:
+    """Only JSON bodies are kept, and never those of the auth routes."""
+    if scope["path"] in UNLOGGED_BODY_PATHS:
+        return False
+    content_type = dict(scope["headers"]).get(b"content-type", b"")
+    return content_type.split(b";")[0].strip().lower() == b"application/json"
+
+
+def _redact(body: str) -> str:
+    """Mask the secret fields of a (possibly truncated) JSON body."""
+    return _REDACTED_VALUE.sub(r'\1"***"', body)
+
+
+class AccessLogMiddleware:
+    """
+    Pure ASGI access log, one line per request.
+
+    Request bodies are only kept (up to `access_log_body_bytes`, as the app reads them)
+    and logged for server errors and for a sampled `access_log_sample_rate` share of
+    requests, the body is never read on the app's behalf. Only JSON bodies are kept,
+    never those of the auth routes, and their secret fields are masked. Blocked
+    (403) requests are logged as warnings. Nothing is measured when the logger is
+    disabled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not access_logger.isEnabledFor(logging.WARNING):
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+        body_limit = settings.access_log_body_bytes if _keeps_body(scope) else 0
+        body_chunks = []
+        body_size = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_size
+            message = await receive()
+            if body_size < body_limit and message["type"] == "http.request":
+                chunk = message.get("body", b"")[: body_limit - body_size]
+                body_chunks.append(chunk)
+                body_size += len(chunk)
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
 
         try:
-            body = await request.json()
-        except Exception:
-            body = None  # Handle cases where body is not JSON or unavailable
+            await self.app(
+                scope, receive_wrapper if body_limit > 0 else receive, send_wrapper
+            )
+        finally:
+            if status_code >= 500:
+                level = logging.ERROR
+            elif status_code == 403:
+                level = logging.WARNING
+            else:
+                level = logging.INFO
+            if access_logger.isEnabledFor(level):
+                self._log(
+                    scope, level, status_code, response_bytes, start_time, body_chunks
+                )
 
-        middleware_logger.info(
-            "Received request: %s %s\nClient IP: %s\nHeaders: %s\nQuery Params: %s\nPayload: %s",
-            request.method, request.url, client_ip, headers, query_params, body
-        )
+    @staticmethod
+    def _log(scope, level, status_code, response_bytes, start_time, body_chunks):
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        client = scope.get("client")
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "bytes": response_bytes,
+            "client": client[0] if client else None,
+        }
+        message = "method=%s path=%s status=%s duration_ms=%.2f bytes=%s client=%s"
+        args = tuple(fields.values())
+        rate = settings.access_log_sample_rate
+        sampled = rate > 0 and random.random() < rate
+        if body_chunks and (level == logging.ERROR or sampled):
+            fields["body"] = _redact(b"".join(body_chunks).decode("utf-8", "replace"))
+            message += " body=%r"
+            args += (fields["body"],)
+        access_logger.log(level, message, *args, extra={"access": fields})
 
-        # Process the request
-        response = await call_next(request)
 
-        process_time = time.time() - start_time
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording the latency and the database queries of each
+    request, labelled by route template so /events/1 and /events/2 share a series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        # Filled by the engine events of app.db.session
+        queries = RequestQueries()
+        token = current_request_queries.set(queries)
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start_time
+            current_request_queries.reset(token)
+            # Set by the router once a route matched
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.labels(
+                scope["method"], route, str(status_code)
+            ).observe(duration)
+            http_request_db_queries.labels(route).observe(queries.count)
+            http_request_db_duration.labels(route).observe(queries.duration)
+
+
+class SqlProfileMiddleware:
+    """
+    Pure ASGI middleware profiling the SQL statements of a request, see
+    app.core.sql_profiler for when a request is profiled.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self._is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = SqlProfile(scope["method"], scope["path"])
+
+        async def send_wrapper(message: Message):
+            if (
+                message["type"] == "http.response.start"
+                and settings.sql_profile_response_header
+            ):
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-profile", profile.summary().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = current_sql_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_sql_profile.reset(token)
+            profile.log()
 
-        # Log Response Metadata
-        middleware_logger.info(
-            "Response: %s - %s\nProcessing Time: %.2fs",
-            response.status_code,
-            response.headers.get('content-type', 'Unknown'),
-            process_time
+    @staticmethod
+    def _is_profiled(scope: Scope) -> bool:
+        if settings.sql_profiling:
+            return True
+        return settings.sql_profile_by_header and any(
+            name == b"x-sql-profile" for name, _ in scope["headers"]
         )
 
-        return response
 
 # authentification middleware
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -0,0 +1,331 @@
+"""
+This module contains the read-through cache of the public event read responses.
+
+`ResponseCache.respond` serves a cached JSON body with its `ETag`, or builds it from
+the database and stores it with the TTL of that kind of response. A request whose
+`If-None-Match` matches gets a 304, from the cache alone when the entry is there.
+
+Entries are not deleted on writes. Every key embeds the current version of its tags
+("events" for the listings, "event:<id>" for an event's details) and the service
+methods bump the version of the tags they change, so the old entries are never
+read again and age out of the store. Versions live next to the entries, in the
+in-process `LRUBackend` by default (other replicas see a write once their TTL
+expires) or in Redis with `response_cache_url` (every replica sees it at once,
+needs the `redis` package, used through its asyncio client so a slow store never
+blocks the event loop). Store errors are logged and served as misses.
+
+Listed events carry counters (participants, completions) that change with every
+check-in, the listings are only invalidated by new events and otherwise lag by
+their TTL.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+EVENTS_TAG = "events"
+
+
+def event_tag(event_id: int) -> str:
+    """Method to get the tag of the cached responses of one event."""
+    return f"event:{event_id}"
+
+
+class LRUBackend:
+    """In-process store: bounded LRU of entries with an expiry, and tag versions."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        # Never evicted, a forgotten version would bring back old entries
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a key, None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        """Store a value for `ttl_seconds`."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        """Return the current version of each tag."""
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    async def bump(self, tags: Iterable[str]):
+        """Increment the version of each tag."""
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    async def clear(self):
+        """Drop every entry and version."""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    async def close(self):
+        """Nothing to release, entries live as long as the process."""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Store shared by the replicas, entries expire in Redis itself."""
+
+    PREFIX = "cs:response:"
+
+    def __init__(self, url: str):
+        # Optional dependency, only needed when a shared store is configured
+        import redis.asyncio  # pylint: disable=import-outside-toplevel
+
+        # Keep lookups short when Redis is unreachable, a miss beats a wait
+        self._connect = functools.partial(
+            redis.asyncio.Redis.from_url,
+            url,
+            socket_timeout=0.05,
+            socket_connect_timeout=0.05,
+        )
+        # Connections belong to the event loop they were opened on
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._connect()
+        return client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the value of a key, None when missing or expired."""
+        return await self._client().get(self.PREFIX + key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        """Store a value for `ttl_seconds`."""
+        await self._client().set(self.PREFIX + key, value, px=int(ttl_seconds * 1000))
+
+    async def versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        """Return the current version of each tag."""
+        values = await self._client().mget(
+            [f"{self.PREFIX}version:{tag}" for tag in tags]
+        )
+        return tuple(int(value or 0) for value in values)
+
+    async def bump(self, tags: Iterable[str]):
+        """Increment the version of each tag."""
+        pipeline = self._client().pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"{self.PREFIX}version:{tag}")
+        await pipeline.execute()
+
+    async def clear(self):
+        """Drop every entry and version of this application."""
+        client = self._client()
+        async for key in client.scan_iter(f"{self.PREFIX}*"):
+            await client.delete(key)
+
+    async def close(self):
+        """Close the connections opened on the running event loop."""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class ResponseCache:
+    """Cached JSON responses keyed by request, invalidated by tag."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+        # The event loop only keeps weak references to the tasks it runs
+        self._bumps = set()
+
+    def invalidate(self, *tags: str):
+        """
+        Method to make every cached response with one of the tags stale.
+
+        The service methods calling it are sync. On the event loop (through
+        `run_in_async_session`) the versions are bumped by a task, the loop must not
+        wait on the store; elsewhere (scheduler jobs) the bump runs to completion on
+        a loop of its own.
+        """
+        if not tags:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._bump(tags, close=True))
+            return
+        task = loop.create_task(self._bump(tags))
+        self._bumps.add(task)
+        task.add_done_callback(self._bumps.discard)
+
+    async def _bump(self, tags: Tuple[str, ...], close: bool = False):
+        try:
+            await self.backend.bump(tags)
+        except Exception as e:  # pylint: disable=broad-except
+            self.errors += 1
+            logger.warning("Could not invalidate cached responses %s: %s", tags, e)
+        finally:
+            if close:
+                await self.backend.close()
+
+    async def respond(
+        self,
+        request: Request,
+        tags: Tuple[str, ...],
+        ttl_seconds: float,
+        load: Callable[[], Awaitable[Tuple[object, Dict[str, str]]]],
+        vary: str = "",
+    ) -> Response:
+        """
+        Serve a response from the cache, or build it with `load` and store it.
+
+        Args:
+            request (Request): The request, its path and query are part of the key.
+            tags (tuple): Tags invalidating the response.
+            ttl_seconds (float): Lifetime of the entry, 0 disables the cache.
+            load: Coroutine function returning (content, headers) of the response.
+            vary (str): Rest of the key, e.g. the user a response is built for.
+        """
+        if ttl_seconds <= 0:
+            content, headers = await load()
+            return JSONResponse(jsonable_encoder(content), headers=headers)
+
+        key = await self._key(request, tags, vary)
+        entry = await self._get(key) if key else None
+        cached = entry is not None
+        if not cached:
+            content, headers = await load()
+            body = JSONResponse(jsonable_encoder(content)).body
+            entry = {"etag": _etag(body), "headers": headers, "body": body.decode()}
+            if key:
+                await self._set(key, entry, ttl_seconds)
+
+        headers = {
+            **entry["headers"],
+            "ETag": entry["etag"],
+            # Responses built for a user must not be shared by proxies
+            "Cache-Control": "private, no-cache" if vary else "no-cache",
+        }
+        if entry["etag"] in _if_none_match(request):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return Response(entry["body"], media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        """Return the lookup counters and the size, None for a shared store."""
+        in_process = isinstance(self.backend, LRUBackend)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+            "size": len(self.backend) if in_process else None,
+        }
+
+    async def clear(self):
+        """Drop every entry and reset the counters, e.g. between tests."""
+        await self.backend.clear()
+        self.hits = self.misses = self.not_modified = self.errors = 0
+
+    async def _key(self, request: Request, tags: Tuple[str, ...], vary: str) -> str:
+        try:
+            versions = await self.backend.versions(tags)
+        except Exception as e:  # pylint: disable=broad-except
+            # Without the versions an entry could be stale, do not cache at all
+            self.errors += 1
+            logger.warning("Could not read cached response versions: %s", e)
+            return ""
+        query = urlencode(sorted(request.query_params.multi_items()))
+        version = ",".join(f"{tag}={v}" for tag, v in zip(tags, versions))
+        return f"{request.url.path}?{query}|{vary}|{version}"
+
+    async def _get(self, key: str) -> Optional[dict]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:  # pylint: disable=broad-except
+            self.errors += 1
+            logger.warning("Could not read a cached response: %s", e)
+            return None
+        return json.loads(value) if value is not None else None
+
+    async def _set(self, key: str, entry: dict, ttl_seconds: float):
+        try:
+            await self.backend.set(key, json.dumps(entry).encode(), ttl_seconds)
+        except Exception as e:  # pylint: disable=broad-except
+            self.errors += 1
+            logger.warning("Could not store a cached response: %s", e)
+
+
+def _if_none_match(request: Request) -> set:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+response_cache = ResponseCache(
+    RedisBackend(settings.response_cache_url)
+    if settings.response_cache_url
+    else LRUBackend(settings.response_cache_size)
+)
+
+
+@registry.collector(
+    "response_cache_lookups_total", "counter", "Response cache lookups by outcome."
+)
+def _response_cache_lookups():
+    stats = response_cache.stats()
+    for outcome in ("hits", "misses", "not_modified", "errors"):
+        yield {"outcome": outcome}, stats[outcome]
+
+
+@registry.collector(
+    "response_cache_size", "gauge", "Entries in the in-process response cache."
+)
+def _response_cache_size():
+    # Left out with Redis, its entries are shared by every replica
+    size = response_cache.stats()["size"]
+    if size is not None:
+        yield {}, size
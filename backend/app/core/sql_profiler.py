@@ -0,0 +1,122 @@
+"""
+This module contains the per-request SQL profiler and the slow-query log.
+
+Every statement slower than `sql_slow_query_ms` is logged to the "sql.slow" logger,
+this only costs a comparison per query and is always on. Profiling records every
+statement of a request with its duration and parameters. It is enabled for all
+requests with `sql_profiling`, or per request with the `X-SQL-Profile` header when
+`sql_profile_by_header` is set. At the end of a profiled request the
+"sql.profile" logger gets a summary, as a warning when statements repeat at least
+`sql_profile_repeat_threshold` times (an N+1 pattern) or are slow; with
+`sql_profile_response_header` the summary is also sent back in `X-SQL-Profile`.
+"""
+
+import logging
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+SQL_PROFILE_HEADER = "X-SQL-Profile"
+# Characters of a statement or its parameters kept in the logs
+MAX_LOGGED_CHARS = 300
+
+slow_query_logger = logging.getLogger("sql.slow")
+profile_logger = logging.getLogger("sql.profile")
+
+
+def _shorten(text: str) -> str:
+    text = " ".join(text.split())
+    if len(text) <= MAX_LOGGED_CHARS:
+        return text
+    return text[: MAX_LOGGED_CHARS - 3] + "..."
+
+
+def log_slow_query(statement: str, parameters, duration: float):
+    """Method to log a statement that took longer than `sql_slow_query_ms`."""
+    slow_query_logger.warning(
+        "Slow query (%.1f ms): %s parameters=%s",
+        duration * 1000,
+        _shorten(statement),
+        _shorten(repr(parameters)),
+    )
+
+
+class SqlProfile:
+    """Statements issued while serving one request."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        # (statement, parameters, duration in seconds)
+        self.statements: List[Tuple[str, object, float]] = []
+
+    def record(self, statement: str, parameters, duration: float):
+        """Method to record an executed statement."""
+        self.statements.append((statement, parameters, duration))
+
+    @property
+    def duration(self) -> float:
+        """Total time spent in the statements, in seconds."""
+        return sum(duration for _, _, duration in self.statements)
+
+    def repeated(self) -> List[Tuple[str, int, float]]:
+        """
+        Statements executed at least `sql_profile_repeat_threshold` times.
+
+        Returns:
+            list: (statement, count, total seconds), most executed first.
+        """
+        counts: Dict[str, List] = defaultdict(lambda: [0, 0.0])
+        for statement, _, duration in self.statements:
+            counts[statement][0] += 1
+            counts[statement][1] += duration
+        threshold = settings.sql_profile_repeat_threshold
+        return sorted(
+            (
+                (statement, count, total)
+                for statement, (count, total) in counts.items()
+                if count >= threshold
+            ),
+            key=lambda item: -item[1],
+        )
+
+    def slow(self) -> List[Tuple[str, object, float]]:
+        """Statements slower than `sql_slow_query_ms`."""
+        if settings.sql_slow_query_ms <= 0:
+            return []
+        threshold = settings.sql_slow_query_ms / 1000
+        return [entry for entry in self.statements if entry[2] >= threshold]
+
+    def summary(self) -> str:
+        """Short summary, sent in the `X-SQL-Profile` response header."""
+        return (
+            f"queries={len(self.statements)}; "
+            f"duration_ms={self.duration * 1000:.2f}; "
+            f"repeated={len(self.repeated())}; slow={len(self.slow())}"
+        )
+
+    def log(self):
+        """Method to log the summary, with the flagged and then every statement."""
+        repeated, slow = self.repeated(), self.slow()
+        level = logging.WARNING if repeated or slow else logging.INFO
+        if not profile_logger.isEnabledFor(level):
+            return
+        lines = [f"SQL profile of {self.method} {self.path}: {self.summary()}"]
+        for statement, count, total in repeated:
+            lines.append(
+                f"  possible N+1, {count}x in {total * 1000:.1f} ms: "
+                f"{_shorten(statement)}"
+            )
+        for statement, parameters, duration in self.statements:
+            lines.append(
+                f"  {duration * 1000:.2f} ms: {_shorten(statement)} "
+                f"parameters={_shorten(repr(parameters))}"
+            )
+        profile_logger.log(level, "\n".join(lines))
+
+
+# Set by `SqlProfileMiddleware` for profiled requests, None otherwise
+current_sql_profile: ContextVar[Optional[SqlProfile]] = ContextVar(
+    "current_sql_profile", default=None
+)
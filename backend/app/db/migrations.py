@@ -0,0 +1,222 @@
+"""
+This file contains the versioned schema migrations for the application.
+
+Each migration is a (version, description, function) entry in `MIGRATIONS`. The
+function receives a connection inside its own transaction and must be idempotent,
+so a replica that races another one at startup (or a database created by the old
+`Base.metadata.create_all` call) ends up in the same state. Applied versions are
+recorded in the `cs_schema_version` table.
+
+Run the pending migrations before rolling out a new version with:
+    python -m app.db.migrations
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    and_,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+from app.db.session import Base, engine as app_engine
+from app.services.event_stats import add_event_stats
+from app.db.models import (
+    CS_Users,
+    CS_Events,
+    CS_EventStats,
+    CS_UserProps,
+    CS_EventProps,
+    CS_UserEvents,
+    CS_Checkins,
+    CS_CheckinSegments,
+    CS_SchedulerLeases,
+    CS_JobRuns,
+)
+
+logger = logging.getLogger(__name__)
+
+schema_version = Table(
+    "cs_schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+# Indexes added by migration 2, the baseline may already have them on new databases
+HOT_LOOKUP_INDEXES = {
+    CS_UserEvents.__table__: [
+        "uq_cs_user_events_user_event",
+        "ix_cs_user_events_event_streak",
+        "ix_cs_user_events_modified",
+    ],
+    CS_EventProps.__table__: ["ix_cs_event_props_event_id"],
+    CS_Events.__table__: [
+        "ix_cs_events_flags_created_at",
+        "ix_cs_events_created_at_id",
+        "ix_cs_events_created_by",
+    ],
+    CS_Users.__table__: ["ix_cs_users_created_at_id"],
+}
+
+
+def _create_indexes(conn: Connection, table: Table, names: List[str]):
+    """Create the named indexes of a mapped table if they do not exist yet."""
+    for index in table.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _baseline(conn: Connection):
+    """Tables as they were created by `Base.metadata.create_all`."""
+    Base.metadata.create_all(
+        conn,
+        tables=[
+            CS_Users.__table__,
+            CS_Events.__table__,
+            CS_UserProps.__table__,
+            CS_EventProps.__table__,
+            CS_UserEvents.__table__,
+        ],
+    )
+
+
+def _hot_lookup_indexes(conn: Connection):
+    """Indexes for the columns filtered on by the service layer."""
+    # The unique index needs a single membership per (user_id, event_id) pair.
+    # The oldest row of a duplicated pair is kept, after taking the best streak
+    # and the latest check-in of the whole pair, then the others are removed
+    memberships = CS_UserEvents.__table__
+    duplicate = memberships.alias("duplicate")
+    same_pair = and_(
+        duplicate.c.user_id == memberships.c.user_id,
+        duplicate.c.event_id == memberships.c.event_id,
+    )
+    kept = (
+        select(func.min(memberships.c.id))
+        .group_by(memberships.c.user_id, memberships.c.event_id)
+        .having(func.count() > 1)
+    )
+    merged = conn.execute(
+        update(memberships)
+        .where(memberships.c.id.in_(kept))
+        .values(
+            streak_count=select(func.max(duplicate.c.streak_count))
+            .where(same_pair)
+            .scalar_subquery(),
+            modified=select(func.max(duplicate.c.modified))
+            .where(same_pair)
+            .scalar_subquery(),
+        )
+    ).rowcount
+    keep = (
+        select(func.min(CS_UserEvents.id))
+        .group_by(CS_UserEvents.user_id, CS_UserEvents.event_id)
+        .scalar_subquery()
+    )
+    removed = conn.execute(
+        delete(CS_UserEvents).where(CS_UserEvents.id.not_in(keep))
+    ).rowcount
+    if removed:
+        logger.warning(
+            "Merged %s duplicate cs_user_events rows into %s memberships.",
+            removed,
+            merged,
+        )
+
+    for table, names in HOT_LOOKUP_INDEXES.items():
+        _create_indexes(conn, table, names)
+
+
+def _user_props_indexes(conn: Connection):
+    """Indexes for the per-user timezone lookups of the streak expiry job."""
+    _create_indexes(
+        conn,
+        CS_UserProps.__table__,
+        ["ix_cs_user_props_user_name", "ix_cs_user_props_name_value"],
+    )
+
+
+def _checkin_log(conn: Connection):
+    """Append-only check-in log and its compacted run-length segments."""
+    Base.metadata.create_all(
+        conn, tables=[CS_Checkins.__table__, CS_CheckinSegments.__table__]
+    )
+
+
+def _scheduler_leadership(conn: Connection):
+    """Scheduler lease rows and the log of job runs."""
+    Base.metadata.create_all(
+        conn, tables=[CS_SchedulerLeases.__table__, CS_JobRuns.__table__]
+    )
+
+
+def _event_stats(conn: Connection):
+    """Per-event aggregates, counted from the existing memberships."""
+    Base.metadata.create_all(conn, tables=[CS_EventStats.__table__])
+    add_event_stats(conn)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline schema", _baseline),
+    (2, "indexes for hot lookup columns", _hot_lookup_indexes),
+    (3, "indexes for user props lookups", _user_props_indexes),
+    (4, "check-in log and segments", _checkin_log),
+    (5, "scheduler leases and job runs", _scheduler_leadership),
+    (6, "event stats", _event_stats),
+]
+
+
+def current_version(conn: Connection) -> int:
+    """Return the latest applied migration version, 0 for an empty database."""
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def run_migrations(engine: Engine, target: int = None) -> int:
+    """
+    Apply the pending migrations in order.
+
+    Args:
+        engine (Engine): The engine of the database to migrate.
+        target (int, optional): Stop after this version. Defaults to the latest one.
+
+    Returns:
+        int: The schema version of the database after the run.
+    """
+    schema_version.create(engine, checkfirst=True)
+
+    for version, description, migrate in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            if current_version(conn) >= version:
+                continue
+            logger.info("Applying migration %s: %s", version, description)
+            migrate(conn)
+            conn.execute(
+                insert(schema_version).values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow(),
+                )
+            )
+
+    with engine.connect() as conn:
+        return current_version(conn)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Database schema at version {run_migrations(app_engine)}")
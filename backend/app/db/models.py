@@ -10,7 +10,9 @@ from sqlalchemy import (
     String,
     Boolean,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Text,
 )
 from sqlalchemy.orm import relationship
@@ -34,6 +36,9 @@ class CS_Users(Base):
     user_props = relationship("CS_UserProps", back_populates="user")
     created_events = relationship("CS_Events", back_populates="created_by_user")
 
+    # email and username are already indexed through their unique constraints
+    __table_args__ = (Index("ix_cs_users_created_at_id", "created_at", "id"),)
+
 
 class CS_Events(Base):
     """Model to store events"""
@@ -52,6 +57,12 @@ class CS_Events(Base):
     event_props = relationship("CS_EventProps", back_populates="event")
     user_events = relationship("CS_UserEvents", back_populates="event")
 
+    __table_args__ = (
+        Index("ix_cs_events_flags_created_at", "flags", "created_at", "id"),
+        Index("ix_cs_events_created_at_id", "created_at", "id"),
+        Index("ix_cs_events_created_by", "created_by"),
+    )
+
 
 class CS_UserProps(Base):
     """Model to store user properties"""
@@ -68,13 +79,18 @@ class CS_UserProps(Base):
     # Relationships
     user = relationship("CS_Users", back_populates="user_props")
 
+    __table_args__ = (
+        Index("ix_cs_user_props_user_name", "user_id", "attribute_name"),
+        Index("ix_cs_user_props_name_value", "attribute_name", "attribute_value"),
+    )
+
 
 class CS_EventProps(Base):
     """Model to store event properties"""
 
     __tablename__ = "cs_event_props"
     id = Column(Integer, primary_key=True, index=True)
-    event_id = Column(Integer, ForeignKey("cs_events.id"), nullable=False)
+    event_id = Column(Integer, ForeignKey("cs_events.id"), nullable=False, index=True)
     prop_name = Column(String, nullable=False)
     prop_value = Column(Text, nullable=False)
     # Null if valid, timestamp if invalid
@@ -99,3 +115,88 @@ class CS_UserEvents(Base):
     # Relationships
     user = relationship("CS_Users", back_populates="user_events")
     event = relationship("CS_Events", back_populates="user_events")
+
+    __table_args__ = (
+        # A unique index rather than a table constraint so it can be added to
+        # existing SQLite databases, it also serves (user_id, event_id) lookups
+        Index("uq_cs_user_events_user_event", "user_id", "event_id", unique=True),
+        Index("ix_cs_user_events_event_streak", "event_id", "streak_count"),
+        Index("ix_cs_user_events_modified", "modified"),
+    )
+
+
+class CS_EventStats(Base):
+    """Aggregates of an event's memberships, maintained with every membership write"""
+
+    __tablename__ = "cs_event_stats"
+    event_id = Column(Integer, ForeignKey("cs_events.id"), primary_key=True)
+    participants = Column(Integer, nullable=False, default=0)
+    max_streak = Column(Integer, nullable=False, default=0)
+    # Completions counted on `completions_day` (days since 1970-01-01, UTC), the
+    # count is stale once that day is over
+    completions_day = Column(Integer, nullable=False, default=0)
+    completions_today = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CS_Checkins(Base):
+    """Append-only log of daily check-ins, one row per user, event and local day"""
+
+    __tablename__ = "cs_checkins"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    event_id = Column(Integer, nullable=False)
+    # Days since 1970-01-01 in the user's local timezone
+    day = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index(
+            "uq_cs_checkins_user_event_day", "user_id", "event_id", "day", unique=True
+        ),
+        Index("ix_cs_checkins_day", "day"),
+    )
+
+
+class CS_CheckinSegments(Base):
+    """Compacted check-ins, one row per run of consecutive days"""
+
+    __tablename__ = "cs_checkin_segments"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    event_id = Column(Integer, nullable=False)
+    start_day = Column(Integer, nullable=False)
+    end_day = Column(Integer, nullable=False)  # Inclusive
+
+    __table_args__ = (
+        Index(
+            "ix_cs_checkin_segments_user_event_start",
+            "user_id",
+            "event_id",
+            "start_day",
+        ),
+    )
+
+
+class CS_SchedulerLeases(Base):
+    """Lease rows used to elect the replica that runs the scheduled jobs"""
+
+    __tablename__ = "cs_scheduler_leases"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    renewed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CS_JobRuns(Base):
+    """One row per run of a scheduled job, with its duration and outcome"""
+
+    __tablename__ = "cs_job_runs"
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String, nullable=False)
+    holder = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    duration = Column(Float, nullable=False)  # Seconds
+    outcome = Column(String, nullable=False)  # "success" or "failed"
+    detail = Column(Text, nullable=True)
+
+    __table_args__ = (Index("ix_cs_job_runs_job_started", "job_name", "started_at"),)
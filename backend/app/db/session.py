@@ -3,11 +3,30 @@
 """
 
 # app/database.py
+import functools
 import logging
-from sqlalchemy import create_engine
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import (
+    current_request_queries,
+    db_pool_checkout_wait,
+    db_queries,
+    db_query_duration,
+    registry,
+)
+from app.core.sql_profiler import current_sql_profile, log_slow_query
 
 logger = logging.getLogger(__name__)
 logger.info("Database URL: [%s]", settings.database_url)
@@ -15,16 +34,221 @@ logger.info("Database URL: [%s]", settings.database_url)
 if not settings.database_url:
     raise EnvironmentError("DB connection string not set in environment")
 
+
+def apply_sqlite_pragmas(dbapi_connection, _connection_record):
+    """Connect listener applying the configured pragmas to a new SQLite connection."""
+    pragmas = {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+    }
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_sqlite_engine(sync_engine: Engine, writer: bool = False):
+    """
+    Apply the SQLite connection profile to an engine, a no-op for other databases.
+
+    Args:
+        sync_engine (Engine): The engine, `AsyncEngine.sync_engine` for async ones.
+        writer (bool): Start every transaction with BEGIN IMMEDIATE, so a transaction
+            that reads before it writes waits on `busy_timeout` for the write lock
+            instead of failing with "database is locked" when it upgrades.
+    """
+    if sync_engine.dialect.name != "sqlite":
+        return
+    event.listen(sync_engine, "connect", apply_sqlite_pragmas)
+    if not writer:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, _connection_record):
+        # Let the "begin" listener below emit BEGIN instead of the driver
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class _TimedCheckout:
+    """Pool mixin observing how long a checkout waits, labelled by the pool name."""
+
+    def connect(self):
+        """Check out a connection."""
+        if not self.logging_name:
+            return super().connect()
+        started = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            db_pool_checkout_wait.labels(self.logging_name).observe(
+                perf_counter() - started
+            )
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool recording its checkout wait."""
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool recording its checkout wait."""
+
+
+# Pools reported on /metrics: name -> (engine, connections it can hand out)
+_monitored_pools: Dict[str, Tuple[Engine, int]] = {}
+
+
+def instrument_engine(sync_engine: Engine, name: str, capacity: int):
+    """
+    Record the queries of an engine in the metrics, the slow-query log and the
+    SQL profile of the request, and report its pool.
+
+    Args:
+        sync_engine (Engine): The engine, `AsyncEngine.sync_engine` for async ones.
+        name (str): The `engine` label, also the pool name used for checkout waits.
+        capacity (int): pool_size + max_overflow, for the saturation.
+    """
+    queries = db_queries.labels(name)
+    durations = db_query_duration.labels(name)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_query(_conn, _cursor, _statement, _parameters, context, _many):
+        # Timed on the execution context, cheaper than the connection's info dict
+        if context is not None:
+            context.query_started = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_query(_conn, _cursor, statement, parameters, context, _many):
+        if context is None:
+            return
+        duration = perf_counter() - context.query_started
+        queries.inc()
+        durations.observe(duration)
+        request = current_request_queries.get()
+        if request is not None:
+            request.count += 1
+            request.duration += duration
+        slow_query_ms = settings.sql_slow_query_ms
+        if slow_query_ms > 0 and duration * 1000 >= slow_query_ms:
+            log_slow_query(statement, parameters, duration)
+        profile = current_sql_profile.get()
+        if profile is not None:
+            profile.record(statement, parameters, duration)
+
+    _monitored_pools[name] = (sync_engine, capacity)
+
+
+@registry.collector(
+    "db_pool_connections", "gauge", "Pooled connections, checked out or idle."
+)
+def _pool_connections():
+    for name, (sync_engine, _) in _monitored_pools.items():
+        pool = sync_engine.pool
+        yield {"engine": name, "state": "checked_out"}, pool.checkedout()
+        yield {"engine": name, "state": "idle"}, pool.checkedin()
+
+
+@registry.collector(
+    "db_pool_saturation", "gauge", "Share of the pool capacity checked out."
+)
+def _pool_saturation():
+    for name, (sync_engine, capacity) in _monitored_pools.items():
+        yield {"engine": name}, sync_engine.pool.checkedout() / capacity
+
+
 engine = create_engine(
     settings.database_url,
     connect_args={"check_same_thread": False},
+    poolclass=TimedQueuePool,
+    pool_logging_name="sync",
     pool_size=5,  # Maintain up to 5 connections
     max_overflow=10,  # Allow up to 10 connections to be created at once
 )
+# Used by the scheduler jobs and migrations, which mostly write
+configure_sqlite_engine(engine, writer=True)
+instrument_engine(engine, "sync", capacity=15)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async drivers for the sync URLs used by the rest of the application
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Method to derive the async driver URL from a sync database URL"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise EnvironmentError(f"No async driver configured for database [{backend}]")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(
+        hide_password=False
+    )
+
+
+def create_async_engines(
+    database_url: str, names: Optional[Tuple[str, str]] = None
+) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Build the (read, write) async engines for a database URL.
+
+    SQLite allows a single writer at a time, so its write engine has one connection:
+    writers of this process queue on the pool instead of on the database lock, and
+    readers keep their own pool, which WAL lets run alongside the writer.
+    With `names`, the engines are reported on /metrics under these names.
+    """
+    read_name, write_name = names or (None, None)
+    read_engine = create_async_engine(
+        database_url,
+        # aiosqlite defaults to NullPool, keep connections like the sync engine does
+        poolclass=TimedAsyncQueuePool,
+        pool_logging_name=read_name,
+        pool_size=5,
+        max_overflow=10,
+    )
+    is_sqlite = read_engine.dialect.name == "sqlite"
+    write_pool_size, write_max_overflow = (1, 0) if is_sqlite else (5, 10)
+    write_engine = create_async_engine(
+        database_url,
+        poolclass=TimedAsyncQueuePool,
+        pool_logging_name=write_name,
+        pool_size=write_pool_size,
+        max_overflow=write_max_overflow,
+    )
+    configure_sqlite_engine(read_engine.sync_engine)
+    configure_sqlite_engine(write_engine.sync_engine, writer=True)
+    if names:
+        instrument_engine(read_engine.sync_engine, read_name, capacity=15)
+        instrument_engine(
+            write_engine.sync_engine,
+            write_name,
+            capacity=write_pool_size + write_max_overflow,
+        )
+    return read_engine, write_engine
+
+
+async_engine, async_write_engine = create_async_engines(
+    settings.async_database_url or get_async_database_url(settings.database_url),
+    names=("read", "write"),
+)
+
+# Objects stay usable after commit, lazy loads are not possible outside run_sync
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+AsyncWriteSessionLocal = async_sessionmaker(
+    bind=async_write_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def get_db():
     """Method to get a database session"""
@@ -33,3 +257,32 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Method to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_write_db():
+    """Method to get an async database session for routes that write"""
+    async with AsyncWriteSessionLocal() as db:
+        yield db
+
+
+def run_in_async_session(func):
+    """
+    Build the async version of a service method that takes a sync Session first.
+
+    The wrapped method runs through `AsyncSession.run_sync`, so its queries go
+    through the async driver on the event loop instead of a worker thread.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(func, *args, **kwargs)
+
+    wrapper.__name__ = f"{func.__name__}_async"
+    wrapper.__qualname__ = wrapper.__name__
+    return wrapper
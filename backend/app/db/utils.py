@@ -0,0 +1,31 @@
+"""
+    This file contains helpers for building dialect specific statements.
+"""
+
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+# Dialects with an INSERT ... ON CONFLICT DO NOTHING construct
+_INSERT_BY_DIALECT = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def insert_ignore(db: Session, model):
+    """
+    Build an INSERT for a model that skips rows violating a unique constraint.
+
+    Args:
+        db (Session): The session the statement will be executed with.
+        model: The mapped class to insert into.
+
+    Returns:
+        Insert: The statement, to be executed with a list of parameter dicts.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERT_BY_DIALECT:
+        # Fall back to a plain insert, duplicates raise IntegrityError
+        return insert(model)
+    return _INSERT_BY_DIALECT[dialect](model).on_conflict_do_nothing()
@@ -2,57 +2,134 @@
 This module provides authentication-related functionalities for the application, including
 password hashing, JWT token creation and validation, and user retrieval based on tokens.
 Functions:
-    get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    async get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    async get_current_user_id(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> int:
     verify_password(plain_password, hashed_password) -> bool:
     hash_password(password) -> str:
     create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=access_token_expire_minutes)) -> str:
     create_refresh_token(data: dict, expires_delta: timedelta = timedelta(days=refresh_access_token_expire_days)) -> str:
     decode_access_token(token: str) -> dict:
+    decode_refresh_token(token: str) -> dict:
+
+Verified claims are kept in `verified_tokens` until the token expires, so the
+signature of a token is checked once per process instead of on every request.
 """
 
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
 from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
+from app.core.metrics import registry
+from app.db.session import get_async_db
+from app.services.identity_cache import identities
+from app.services.users_svc import get_user_id_async
 
 logger = logging.getLogger("auth")
 
 # Create a password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with another cost are upgraded on login, see PasswordPool.verify_and_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/users/login")
 
 
-# Function to decode the JWT token and get the user data
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
-    """
-    Retrieve the current user based on the provided JWT token.
+class TokenCache:
+    """Bounded LRU of verified token claims, keyed by token digest, kept until `exp`."""
 
-    Args:
-        token (str): The JWT token provided by the user. Defaults to the token from the OAuth2 scheme.
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # (kind, sha256 of the token) -> claims, the token itself is not kept
+        self._entries: "OrderedDict[Tuple[str, bytes], dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
 
-    Returns:
-        str: The username extracted from the token.
+    @staticmethod
+    def key(kind: str, token: str) -> Tuple[str, bytes]:
+        """Cache key of a token, `kind` tells the signing keys apart."""
+        return kind, hashlib.sha256(token.encode()).digest()
 
-    Raises:
-        HTTPException: If the token is invalid, expired, or if there is an error during decoding.
-    """
+    def get(self, key: Tuple[str, bytes]) -> Optional[dict]:
+        """Return a copy of the claims of a verified, unexpired token, or None."""
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None or claims["exp"] <= time.time():
+                if claims is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(claims)
+
+    def put(self, key: Tuple[str, bytes], claims: dict):
+        """Store the claims of a token whose signature was verified."""
+        if self.max_size <= 0 or not isinstance(claims.get("exp"), (int, float)):
+            return
+        with self._lock:
+            self._entries[key] = dict(claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+verified_tokens = TokenCache(settings.token_cache_size)
+
+
+@registry.collector(
+    "token_cache_lookups_total", "counter", "Verified token cache lookups."
+)
+def _token_cache_lookups():
+    stats = verified_tokens.stats()
+    yield {"outcome": "hit"}, stats["hits"]
+    yield {"outcome": "miss"}, stats["misses"]
+
+
+@registry.collector("token_cache_size", "gauge", "Entries in the token cache.")
+def _token_cache_size():
+    yield {}, verified_tokens.stats()["size"]
+
+
+def _verified_claims(token: str, kind: str, key: str) -> dict:
+    """Decode a token, verifying its signature only if it is not cached yet."""
+    cache_key = TokenCache.key(kind, token)
+    claims = verified_tokens.get(cache_key)
+    if claims is None:
+        claims = jwt.decode(token, key, algorithms=[settings.algorithm])
+        verified_tokens.put(cache_key, claims)
+    return claims
+
+
+def _decode_current_token(token: str) -> dict:
+    """Decode a bearer token, raising 401 for invalid or expired tokens."""
     try:
-        # payload = decode_access_token(token, settings.secret_key)
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
-        )
-        username: str = payload.get("sub")
-        logger.info("Decoded token for user %s", username)
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token is invalid",
-            )
-        return username  # Return the username instead of the token
+        payload = _verified_claims(token, "access", settings.secret_key)
     except ExpiredSignatureError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -70,6 +147,59 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
             detail="Internal error Occured while decrypting the token",
         ) from err
 
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is invalid",
+        )
+    return payload
+
+
+# Function to decode the JWT token and get the user data
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    """
+    Retrieve the current user based on the provided JWT token.
+
+    Args:
+        token (str): The JWT token provided by the user. Defaults to the token from the OAuth2 scheme.
+
+    Returns:
+        str: The username extracted from the token.
+
+    Raises:
+        HTTPException: If the token is invalid, expired, or if there is an error during decoding.
+    """
+    username: str = _decode_current_token(token)["sub"]
+    logger.debug("Decoded token for user %s", username)
+    return username  # Return the username instead of the token
+
+
+async def get_current_user_id(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> int:
+    """
+    Retrieve the id of the current user based on the provided JWT token.
+
+    Tokens issued since the `uid` claim was added carry the id, older tokens are
+    resolved from their `sub` through the identity cache.
+
+    Raises:
+        HTTPException: If the token is invalid or expired, or its user does not exist.
+    """
+    payload = _decode_current_token(token)
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        identities.record_token_hit()
+        return user_id
+
+    user_id = await get_user_id_async(payload["sub"], db)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+        )
+    return user_id
+
 
 def verify_password(plain_password, hashed_password) -> bool:
     """
@@ -157,6 +287,23 @@ def decode_access_token(token: str) -> dict:
         None: If the token is invalid or decoding fails.
     """
     try:
-        return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        return _verified_claims(token, "access", settings.secret_key)
+    except JWTError:
+        return None
+
+
+def decode_refresh_token(token: str) -> dict:
+    """
+    Decodes a JWT refresh token, signed with the refresh key.
+
+    Args:
+        token (str): The JWT refresh token to decode.
+
+    Returns:
+        dict: The decoded payload if the token is valid.
+        None: If the token is invalid or decoding fails.
+    """
+    try:
+        return _verified_claims(token, "refresh", settings.token_refresh_key)
     except JWTError:
         return None
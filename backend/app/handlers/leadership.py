@@ -0,0 +1,192 @@
+"""
+This module elects the replica that runs the scheduled jobs.
+
+Every replica starts the scheduler, but a job only runs on the replica holding the
+`cs_scheduler_leases` row. The lease is taken and renewed with a single conditional
+UPDATE, so at most one replica holds it at a time. The leader renews it on every
+heartbeat; when the leader dies, the lease expires after `scheduler_lease_seconds`
+and the next heartbeat of another replica takes over. Each job run by the leader is
+recorded in `cs_job_runs` with its duration and outcome.
+"""
+
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+from time import perf_counter
+from typing import Callable
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.core.metrics import scheduler_job_duration
+from app.db.models import CS_JobRuns, CS_SchedulerLeases
+from app.db.session import SessionLocal
+from app.db.utils import insert_ignore
+
+logger = logging.getLogger(__name__)
+
+# Unique per process, replicas usually share the image but not the hostname
+REPLICA_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def try_acquire_lease(
+    db: Session, name: str, holder: str, lease_seconds: int, now: datetime = None
+) -> bool:
+    """
+    Take or renew a lease, succeeding if it is free, expired or already ours.
+
+    Returns:
+        bool: True if `holder` holds the lease until now + lease_seconds.
+    """
+    now = now or datetime.utcnow()
+    values = {
+        "holder": holder,
+        "expires_at": now + timedelta(seconds=lease_seconds),
+        "renewed_at": now,
+    }
+
+    def claim() -> int:
+        return (
+            db.query(CS_SchedulerLeases)
+            .filter(
+                CS_SchedulerLeases.name == name,
+                or_(
+                    CS_SchedulerLeases.holder == holder,
+                    CS_SchedulerLeases.expires_at <= now,
+                ),
+            )
+            .update(values, synchronize_session=False)
+        )
+
+    acquired = claim()
+    if not acquired:
+        # First run against this database, create the row already expired
+        db.execute(
+            insert_ignore(db, CS_SchedulerLeases),
+            [{"name": name, "holder": holder, "expires_at": now, "renewed_at": now}],
+        )
+        acquired = claim()
+    db.commit()
+    return acquired == 1
+
+
+def release_lease(db: Session, name: str, holder: str):
+    """Expire a lease we hold so another replica can take it right away."""
+    db.query(CS_SchedulerLeases).filter(
+        CS_SchedulerLeases.name == name, CS_SchedulerLeases.holder == holder
+    ).update({"expires_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+def record_job_run(
+    db: Session,
+    job_name: str,
+    holder: str,
+    started_at: datetime,
+    duration: float,
+    outcome: str,
+    detail: str = None,
+):
+    """Method to record a run of a scheduled job."""
+    db.add(
+        CS_JobRuns(
+            job_name=job_name,
+            holder=holder,
+            started_at=started_at,
+            duration=duration,
+            outcome=outcome,
+            detail=detail,
+        )
+    )
+    db.commit()
+
+
+class SchedulerLeader:
+    """Lease-based leadership of this replica over the scheduled jobs."""
+
+    def __init__(
+        self,
+        name: str,
+        holder: str,
+        lease_seconds: int,
+        session_factory: sessionmaker = SessionLocal,
+    ):
+        self.name = name
+        self.holder = holder
+        self.lease_seconds = lease_seconds
+        self.session_factory = session_factory
+        self.is_leader = False
+
+    def heartbeat(self) -> bool:
+        """Take or renew the lease, returns whether this replica is the leader."""
+        try:
+            with self.session_factory() as db:
+                acquired = try_acquire_lease(
+                    db, self.name, self.holder, self.lease_seconds
+                )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Scheduler lease heartbeat failed.")
+            acquired = False
+
+        if acquired != self.is_leader:
+            logger.info(
+                "Replica %s %s scheduler leadership.",
+                self.holder,
+                "acquired" if acquired else "lost",
+            )
+        self.is_leader = acquired
+        return acquired
+
+    def release(self):
+        """Give up the lease, e.g. on shutdown."""
+        if not self.is_leader:
+            return
+        with self.session_factory() as db:
+            release_lease(db, self.name, self.holder)
+        self.is_leader = False
+
+    def leader_only(self, func: Callable) -> Callable:
+        """Decorate a job to run only on the leader and record each run."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Renew right before running, a stale flag must not start a second run
+            if not self.heartbeat():
+                logger.info("Skipping %s, replica is not the leader.", func.__name__)
+                return None
+
+            started_at = datetime.utcnow()
+            started = perf_counter()
+            outcome, detail = "success", None
+            try:
+                result = func(*args, **kwargs)
+                detail = str(result) if result else None
+                return result
+            except Exception as exc:
+                outcome, detail = "failed", repr(exc)
+                raise
+            finally:
+                duration = perf_counter() - started
+                scheduler_job_duration.labels(func.__name__, outcome).observe(duration)
+                logger.info(
+                    "Job %s finished: %s (%.3fs).", func.__name__, outcome, duration
+                )
+                with self.session_factory() as db:
+                    record_job_run(
+                        db,
+                        func.__name__,
+                        self.holder,
+                        started_at,
+                        duration,
+                        outcome,
+                        detail,
+                    )
+
+        return wrapper
+
+
+scheduler_leader = SchedulerLeader(
+    "scheduler", REPLICA_ID, settings.scheduler_lease_seconds
+)
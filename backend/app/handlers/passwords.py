@@ -0,0 +1,89 @@
+"""
+This module runs the password hashing off the event loop.
+
+bcrypt takes hundreds of milliseconds of CPU per call. `PasswordPool` runs it on a
+dedicated set of `password_workers` threads (bcrypt releases the GIL while hashing)
+so logins neither block the event loop nor use up the threads of sync routes. At
+most `password_queue_size` calls may wait for a worker, beyond that requests are
+refused with 503 right away instead of piling up behind minutes of hashing.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.core.metrics import registry
+from app.handlers.auth import pwd_context
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPool:
+    """Bounded thread pool for the bcrypt work, must be used from the event loop."""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password"
+        )
+        # Calls running or waiting, only changed on the event loop thread
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable, *args):
+        """Run a password function on the pool, 503 when too many calls are waiting."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("Password pool full (%s calls), rejecting.", self.pending)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts in progress, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the current cost parameters."""
+        return await self.run(pwd_context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, password_hash: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password against its hash.
+
+        Returns:
+            tuple: (valid, new hash), the new hash is set when the password is valid
+            but was hashed with outdated cost parameters and should be replaced.
+        """
+        return await self.run(pwd_context.verify_and_update, password, password_hash)
+
+    def shutdown(self):
+        """Stop the worker threads once the running calls are done."""
+        self._executor.shutdown(wait=True)
+
+
+password_pool = PasswordPool(settings.password_workers, settings.password_queue_size)
+
+
+@registry.collector(
+    "password_pool_calls", "gauge", "Password hashing calls running or waiting."
+)
+def _password_pool_calls():
+    yield {}, password_pool.pending
+
+
+@registry.collector(
+    "password_pool_rejected_total", "counter", "Password calls refused with 503."
+)
+def _password_pool_rejected():
+    yield {}, password_pool.rejected
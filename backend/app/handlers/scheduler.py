@@ -1,9 +1,20 @@
 """
 This module sets up a scheduler to reset streak counts for user events in the database.
+Streaks expire at the local midnight of each user: every hourly run resets, in one
+pass, the streaks last marked before the local yesterday of their user, so a skipped
+run (misfire, leader failover, a DST gap at midnight) is caught up by the next one.
 It uses the APScheduler library to schedule tasks and SQLAlchemy for database operations.
+Every replica runs the scheduler, but jobs only run on the replica holding the scheduler
+lease, see `app.handlers.leadership`.
 Functions:
-    reset_streak_counts(db: Session):
-    task_at_midnight():
+    reset_streak_counts(db: Session, chunk_size: int = None, now: datetime = None) -> dict:
+    expire_streaks(db: Session, now: datetime = None) -> dict:
+    task_streak_expiry():
+        Task that runs every hour.
+    task_compact_checkins():
+        Task that runs every day.
+    task_reconcile_event_stats():
+        Task that runs every hour.
     task_every_10_minutes():
         Task that runs every 10 minutes.
     start_scheduler():
@@ -11,13 +22,25 @@ Functions:
     stop_scheduler():
         Method to stop the scheduler.
 """
+
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from time import perf_counter
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
+from app.core.config import settings
+from app.core.response_cache import event_tag, response_cache
 from app.db.session import SessionLocal
 from app.db.models import CS_UserEvents
+from app.handlers.leadership import scheduler_leader
+from app.services.checkins import compact_checkins
+from app.services.event_stats import (
+    reconcile_event_stats,
+    refresh_lapsed_max_streaks,
+    refresh_max_streaks,
+)
+from app.services.streaks import streak_cutoff_column
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -26,36 +49,131 @@ logger = logging.getLogger(__name__)
 scheduler = BackgroundScheduler()
 
 
-def reset_streak_counts(db: Session):
-    """
-    Resets streak counts for events not modified in the last 1 day or with NULL modified timestamps.
+def reset_streak_counts(
+    db: Session, chunk_size: int = None, now: datetime = None
+) -> dict:
     """
-    try:
-        now = datetime.utcnow()
-        cutoff = now - timedelta(days=1)
+    Resets streak counts of the users who did not mark an event since their local
+    yesterday, in primary key chunks.
 
-        logger.info("Starting streak reset task at %s.", now)
+    One pass covers every timezone: each row is compared with the cutoff (the start
+    of the local yesterday) of its user, so running more often than once per local
+    day is harmless and the job does not depend on firing at the hour a timezone
+    reaches midnight, which may be missed or may not exist on a DST change.
 
-        # Reset streaks where `modified` is NULL or older than the cutoff
-        affected_rows = (
-            db.query(CS_UserEvents)
-            .filter(or_(CS_UserEvents.modified is None, CS_UserEvents.modified < cutoff))
-            .update({"streak_count": 0}, synchronize_session=False)
-        )
+    Only rows with a non-zero streak and a stale (or NULL) `modified` timestamp are
+    touched. Each chunk is updated and committed in its own short transaction, so
+    check-ins are never blocked behind a whole-table update.
 
-        db.commit()
-        logger.info("Streak counts reset for %s rows.", affected_rows)
+    Returns:
+        dict: Rows reset, chunks processed and total duration in seconds.
+    """
+    chunk_size = chunk_size or settings.streak_reset_chunk_size
+    started = perf_counter()
+    now = now or datetime.utcnow()
+    needs_reset = (
+        CS_UserEvents.streak_count > 0,
+        or_(
+            CS_UserEvents.modified.is_(None),
+            CS_UserEvents.modified < streak_cutoff_column(db, now),
+        ),
+    )
+    summary = {"rows": 0, "chunks": 0, "duration": 0.0}
+
+    logger.info("Starting streak reset task at %s.", now)
+    last_id = 0
+    try:
+        while True:
+            chunk_started = perf_counter()
+            rows = (
+                db.query(CS_UserEvents.id, CS_UserEvents.event_id)
+                .filter(CS_UserEvents.id > last_id, *needs_reset)
+                .order_by(CS_UserEvents.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # Re-check the condition so a check-in since the SELECT is kept
+            affected_rows = (
+                db.query(CS_UserEvents)
+                .filter(CS_UserEvents.id.in_([row.id for row in rows]), *needs_reset)
+                .update({"streak_count": 0}, synchronize_session=False)
+            )
+            refresh_max_streaks(db, (row.event_id for row in rows))
+            db.commit()
+
+            response_cache.invalidate(*{event_tag(row.event_id) for row in rows})
+
+            summary["rows"] += affected_rows
+            summary["chunks"] += 1
+            logger.info(
+                "Streak reset chunk %s: ids up to %s, %s rows in %.3fs.",
+                summary["chunks"],
+                last_id,
+                affected_rows,
+                perf_counter() - chunk_started,
+            )
     except Exception as e:
+        db.rollback()
         logger.error("Error resetting streak counts: %s", e, exc_info=True)
 
+    summary["duration"] = perf_counter() - started
+    logger.info(
+        "Streak counts reset for %s rows in %s chunks (%.3fs).",
+        summary["rows"],
+        summary["chunks"],
+        summary["duration"],
+    )
+    return summary
+
+
+def expire_streaks(db: Session, now: datetime = None) -> dict:
+    """
+    Expires the streaks whose users' local day ended since they last marked.
+
+    Resets them with `reset_streak_counts`, or with lazy streak expiry (streaks
+    computed on read) only refreshes the max streaks of the events.
+
+    Returns:
+        dict: The reset summary, empty with lazy streak expiry.
+    """
+    if settings.lazy_streak_expiry:
+        # Only the max streaks of the events still count the streaks that lapsed
+        # since the last run
+        logger.info("Lazy streak expiry enabled, skipping reset.")
+        refresh_lapsed_max_streaks(db, now=now)
+        return {}
+    return reset_streak_counts(db, now=now)
+
 
-def task_at_midnight():
+@scheduler_leader.leader_only
+def task_streak_expiry():
     """
-    Task that runs at midnight to reset streak counts.
+    Task that runs every hour to reset the streak counts that expired at the
+    local midnight of their users.
     """
-    logger.info("Executing midnight task to reset streak counts.")
+    logger.info("Executing hourly task to reset streak counts.")
     with SessionLocal() as db:  # Using SessionLocal directly
-        reset_streak_counts(db)
+        return expire_streaks(db)
+
+
+@scheduler_leader.leader_only
+def task_compact_checkins():
+    """Task that runs every day to fold old check-ins into run-length segments."""
+    logger.info("Executing daily task to compact check-ins.")
+    with SessionLocal() as db:
+        return compact_checkins(db)
+
+
+@scheduler_leader.leader_only
+def task_reconcile_event_stats():
+    """Task that runs every hour to repair event stats that drifted."""
+    logger.info("Executing hourly task to reconcile event stats.")
+    with SessionLocal() as db:
+        return reconcile_event_stats(db)
 
 
 def task_every_10_minutes():
@@ -65,7 +183,16 @@ def task_every_10_minutes():
 
 # Add jobs to the scheduler
 # scheduler.add_job(task_every_10_minutes, 'interval', minutes=10)
-scheduler.add_job(task_at_midnight, 'cron', hour=0, minute=0)
+scheduler.add_job(task_streak_expiry, "cron", minute=0)
+scheduler.add_job(task_compact_checkins, "cron", hour=3, minute=30)
+scheduler.add_job(task_reconcile_event_stats, "cron", minute=30)
+# Only the replica holding the lease runs the jobs above, see `SchedulerLeader`
+scheduler.add_job(
+    scheduler_leader.heartbeat,
+    "interval",
+    seconds=settings.scheduler_heartbeat_seconds,
+    next_run_time=datetime.now(),
+)
 
 
 def start_scheduler():
@@ -78,3 +205,4 @@ def stop_scheduler():
     """Method to stop the scheduler."""
     logger.info("Stopping scheduler.")
     scheduler.shutdown()
+    scheduler_leader.release()
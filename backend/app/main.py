@@ -4,41 +4,49 @@
 
 # app/main.py
 import logging
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.session import Base, engine
+from app.db.session import engine
+from app.db.migrations import run_migrations
 from app.routes import user_routes, event_routes, websocket
 from app.handlers.scheduler import start_scheduler, stop_scheduler
-from app.core.middlewares import LogRequestsMiddleware
-
-# Configure logging
-logging.basicConfig(
-    level=int(settings.debug_level),  # Minimum log level for the application
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),  # Logs to console
-        logging.FileHandler("app.log"),  # Logs to a file
-    ],
+from app.core.logging_config import setup_logging
+from app.core.metrics import registry
+from app.core.middlewares import (
+    AccessLogMiddleware,
+    MetricsMiddleware,
+    SqlProfileMiddleware,
 )
+from app.core.sql_profiler import SQL_PROFILE_HEADER
+from app.services.checkin_batcher import checkin_batcher
+from app.services.pagination import CURSOR_HEADER
 
-Base.metadata.create_all(bind=engine)
+# Configure logging, records are written to the console and app.log by a thread
+setup_logging()
+
+run_migrations(engine)
 
 app = FastAPI()
 
 
 # Start the scheduler on application startup
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     """Method to start the scheduler when the application starts up."""
     start_scheduler()
     print("Scheduler started.")
+    if settings.checkin_write_behind:
+        checkin_batcher.start()
 
 
 # Shutdown the scheduler on application shutdown
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """Method to stop the scheduler when the application shuts down."""
+    # Write the queued check-ins before the process exits
+    await checkin_batcher.drain()
     stop_scheduler()
     print("Scheduler stopped.")
 
@@ -52,23 +60,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CURSOR_HEADER, SQL_PROFILE_HEADER],
 )
 
 
-@app.middleware("http")
-async def log_blocked_requests(request: Request, call_next):
-    """Middleware to log blocked requests."""
-    response = await call_next(request)
-    if (
-        response.status_code == 403
-    ):  # Assuming 403 is the status code for blocked requests
-        client_host = request.client.host
-        logger.warning("Blocked request from %s", client_host)
-    return response
-
-
-app.add_middleware(LogRequestsMiddleware)
-# app.middleware("http")(log_requests)
+# One access log line per request, blocked (403) requests are logged as warnings
+app.add_middleware(AccessLogMiddleware)
+# Request latency and database queries per route, served on /metrics
+app.add_middleware(MetricsMiddleware)
+# Opt-in SQL profile of a request, see app.core.sql_profiler
+app.add_middleware(SqlProfileMiddleware)
 
 logger = logging.getLogger(__name__)
 
@@ -85,6 +86,14 @@ def read_root():
     return {"Status": "WebService is Running!"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Metrics of this process in the Prometheus text format."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 app.include_router(user_routes.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(event_routes.router, prefix="/api/v1/events", tags=["Events"])
 app.include_router(websocket.router, prefix="/ws", tags=["Websockets"])
@@ -4,32 +4,52 @@ It includes endpoints for creating events, retrieving events, joining and exitin
 and marking events as completed.
 Routes:
     - POST /: Create a new event.
-    - GET /: Retrieve a list of events.
+    - GET /: Retrieve a page of events (keyset pagination, see `X-Next-Cursor`).
     - GET /myevents: Retrieve a list of events created by the current user.
     - GET /joinedevents: Retrieve a list of events joined by the current user.
     - GET /{event_id}: Retrieve details of a specific event.
+    - GET /{event_id}/history: Retrieve the check-in calendar of the current user.
     - POST /{event_id}/join: Join a specific event.
     - POST /{event_id}/exit: Exit a specific event.
     - POST /{event_id}/mark-completed: Mark an event as completed for the current user.
+    - POST /mark-completed: Mark many events as completed for the current user.
+    - POST /join: Join many events for the current user.
+    - POST /exit: Exit many events for the current user.
+    - POST /batch: Create many events with their props.
+    - POST /{event_id}/enroll: Join many users to a specific event.
+GET / and GET /{event_id} are served through the response cache, with an `ETag`
+honoured in `If-None-Match`, see `app.core.response_cache`.
 """
 
 # app/routes/event_routes.py
 import logging
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from app.handlers.auth import get_current_user
-from app.db.session import get_db
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.response_cache import EVENTS_TAG, event_tag, response_cache
+from app.handlers.auth import get_current_user_id
+from app.schemas import EventBatch, EventIds, UserIds
+from app.db.session import get_async_db, get_async_write_db
 from app.services.events_svc import (
-    create_event,
-    get_events_from_db,
-    join_event,
-    exit_event,
-    mark_event_completed,
-    get_user_created_events,
-    get_user_joined_events,
-    get_event_details_from_db,
+    create_event_async,
+    create_events_async,
+    enroll_users_async,
+    exit_events_async,
+    join_events_async,
+    get_events_from_db_async,
+    join_event_async,
+    exit_event_async,
+    mark_event_completed_async,
+    mark_events_completed_async,
+    get_user_created_events_async,
+    get_user_joined_events_async,
+    get_event_details_from_db_async,
 )
-from app.services.users_svc import get_user_id
+from app.services.checkin_batcher import checkin_batcher
+from app.services.checkins import get_checkin_history_async
+from app.services.pagination import CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -37,16 +57,15 @@ logger = logging.getLogger(__name__)
 
 
 @router.post("/", response_model=dict)
-def create_event_api(
+async def create_event_api(
     name: str,
     description: str,
     is_private: bool = True,
     flags: str = "user_created",
-    current_username: str = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_write_db),
 ):
     """Create a new event"""
-    user_id = get_user_id(current_username, db)
 
     event_details = {
         "name": name,
@@ -56,71 +75,173 @@ def create_event_api(
         "flags": flags,
     }
 
-    return create_event(db, event_details)
+    return await create_event_async(db, event_details)
 
 
 @router.get("/", response_model=list[dict])
-def get_events(
-    # is_private: bool = Query(None),
+async def get_events(
+    request: Request,
+    is_private: bool = Query(None),
     flags: str = Query(None),
-    db: Session = Depends(get_db),
+    created_by: int = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Retrieve a list of events"""
-    return get_events_from_db(db, flags)
+    """Retrieve a page of events, the next page cursor is returned in a response header"""
+
+    async def load():
+        events, next_cursor = await get_events_from_db_async(
+            db,
+            flags,
+            is_private=is_private,
+            created_by=created_by,
+            limit=limit,
+            cursor=cursor,
+        )
+        return events, {CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+    return await response_cache.respond(
+        request, (EVENTS_TAG,), settings.response_cache_list_ttl_seconds, load
+    )
+
+
+@router.post("/mark-completed", response_model=list[dict])
+async def mark_events_completed_api(
+    body: EventIds,
+    db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Mark many events as completed for the current user, with a result per event"""
+    return await mark_events_completed_async(db, current_user_id, body.event_ids)
+
+
+@router.post("/join", response_model=list[dict])
+async def join_events_api(
+    body: EventIds,
+    db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Join many events for the current user, with a result per event"""
+    return await join_events_async(db, current_user_id, body.event_ids)
+
+
+@router.post("/exit", response_model=list[dict])
+async def exit_events_api(
+    body: EventIds,
+    db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Exit many events for the current user, with a result per event"""
+    return await exit_events_async(db, current_user_id, body.event_ids)
+
+
+@router.post("/batch", response_model=list[dict])
+async def create_events_api(
+    body: EventBatch,
+    db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Create many events with their props"""
+    return await create_events_async(
+        db, current_user_id, [event.model_dump() for event in body.events]
+    )
 
 
 @router.get("/myevents", response_model=list[dict])
-def get_my_events(
-    current_user: str = Depends(get_current_user), db: Session = Depends(get_db)
+async def get_my_events(
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Retrieve a list of events created by the current user"""
-    current_user_id = get_user_id(current_user, db)
-
-    return get_user_created_events(db, current_user_id)
+    return await get_user_created_events_async(db, current_user_id)
 
 
 @router.get("/joinedevents", response_model=list[dict])
-def get_joined_events(
-    current_user: str = Depends(get_current_user), db: Session = Depends(get_db)
+async def get_joined_events(
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Retrieve a list of events joined by the current user"""
-    current_user_id = get_user_id(current_user, db)
-
-    return get_user_joined_events(db, current_user_id)
+    return await get_user_joined_events_async(db, current_user_id)
 
 
 @router.get("/{event_id}", response_model=dict)
-def get_event_details(
+async def get_event_details(
+    request: Request,
     event_id: int,
     top_x: int = 100,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(get_current_user),
+    neighbours: int = Query(2, ge=0, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     """Retrieve details of a specific event"""
-    current_user_id = get_user_id(current_user, db)
-    return get_event_details_from_db(db, event_id, top_x, current_user_id)
+
+    async def load():
+        details = await get_event_details_from_db_async(
+            db, event_id, top_x, current_user_id, neighbours
+        )
+        return details, {}
+
+    # The details embed the rank and streak of the current user
+    return await response_cache.respond(
+        request,
+        (event_tag(event_id),),
+        settings.response_cache_details_ttl_seconds,
+        load,
+        vary=f"user={current_user_id}",
+    )
+
+
+@router.get("/{event_id}/history", response_model=dict)
+async def get_event_history(
+    event_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Retrieve the check-in calendar of the current user in a specific event"""
+    return await get_checkin_history_async(db, current_user_id, event_id, start, end)
 
 
 @router.post("/{event_id}/join", response_model=dict)
-def join_event_api(event_id: int, user_id: int, db: Session = Depends(get_db)):
+async def join_event_api(
+    event_id: int, user_id: int, db: AsyncSession = Depends(get_async_write_db)
+):
     """Join a specific event"""
-    return join_event(db, user_id, event_id)
+    return await join_event_async(db, user_id, event_id)
+
+
+@router.post("/{event_id}/enroll", response_model=list[dict])
+async def enroll_users_api(
+    event_id: int,
+    body: UserIds,
+    db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """Join many users to a specific event you created, with a result per user"""
+    return await enroll_users_async(db, event_id, body.user_ids, current_user_id)
 
 
 @router.post("/{event_id}/exit", response_model=dict)
-def exit_event_api(event_id: int, user_id: int, db: Session = Depends(get_db)):
+async def exit_event_api(
+    event_id: int, user_id: int, db: AsyncSession = Depends(get_async_write_db)
+):
     """Exit a specific event"""
     # Check if the user is in the event
-    return exit_event(db, user_id, event_id)
+    return await exit_event_async(db, user_id, event_id)
 
 
 @router.post("/{event_id}/mark-completed")
 async def mark_event_completed_api(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    write_db: AsyncSession = Depends(get_async_write_db),
+    current_user_id: int = Depends(get_current_user_id),
 ):
     """Mark an event as completed for the current user"""
-    current_user_id = get_user_id(current_user, db)
-
-    return await mark_event_completed(db, current_user_id, event_id)
+    if settings.checkin_write_behind:
+        # Validated on a read connection, written with the next batch
+        return await checkin_batcher.submit(db, current_user_id, event_id)
+    return await mark_event_completed_async(write_db, current_user_id, event_id)
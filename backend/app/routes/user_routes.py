@@ -5,9 +5,10 @@ It uses FastAPI for creating the API endpoints and SQLAlchemy for database inter
 Routes:
     - POST /signup: Register a new user.
     - POST /login: Authenticate a user and return access and refresh tokens.
-    - GET /users: Retrieve a list of all users.
+    - GET /users: Retrieve a page of users (keyset pagination, see `X-Next-Cursor`).
     - GET /users/{user_id}: Retrieve details of a specific user by user ID.
     - GET /me: Retrieve details of the currently logged-in user.
+    - PUT /me/timezone: Set the timezone used for the current user's streaks.
     - GET /users/{user_id}/events: Retrieve events joined by a specific user.
     - POST /token/refresh: Refresh the access token using a refresh token.
 Dependencies:
@@ -23,21 +24,36 @@ Dependencies:
 # app/routes/user_routes.py
 import logging
 import base64
-from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.db.session import get_db
-from app.db.models import CS_Users, CS_UserEvents, CS_Events
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db, get_async_write_db
 from app.schemas import UserCreate, Token
+from app.services.users_svc import (
+    create_user_async,
+    update_password_hash_async,
+    get_user_by_email_async,
+    get_user_by_id_async,
+    get_user_by_name_or_email_async,
+    get_user_event_memberships_async,
+    get_users_from_db_async,
+    get_user_profile_async,
+)
+from app.services.streaks import effective_streak
+from app.services.timezones import (
+    get_user_timezone_async,
+    local_date,
+    local_today,
+    set_user_timezone_async,
+)
+from app.services.pagination import CURSOR_HEADER, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.handlers.passwords import password_pool
 from app.handlers.auth import (
-    hash_password,
-    verify_password,
     create_access_token,
     create_refresh_token,
     get_current_user,
-    decode_access_token,
+    get_current_user_id,
+    decode_refresh_token,
 )
 
 router = APIRouter()
@@ -46,41 +62,39 @@ logger = logging.getLogger(__name__)
 
 
 @router.post("/signup", response_model=dict)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(
+    user: UserCreate,
+    db: AsyncSession = Depends(get_async_db),
+    write_db: AsyncSession = Depends(get_async_write_db),
+):
     """Signup route to register a new user"""
-    existing_user = db.query(CS_Users).filter(CS_Users.email == user.email).first()
+    existing_user = await get_user_by_email_async(db, user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
-    hashed_password = hash_password(user.password)
-    new_user = CS_Users(
-        username=user.username,
-        email=user.email,
-        password_hash=hashed_password,
+    # Give the connection back to the pool instead of holding it while hashing
+    await db.close()
+    # bcrypt is CPU bound, keep it off the event loop (503 when the pool is full)
+    hashed_password = await password_pool.hash(user.password)
+    # Only the insert takes the write lock, not the lookup or the hashing above
+    new_user = await create_user_async(
+        write_db, user.username, user.email, hashed_password
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
     logger.info("User %s registered successfully", new_user.username)
     return {"message": "User registered successfully"}
 
 
 @router.post("/login", response_model=Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    write_db: AsyncSession = Depends(get_async_write_db),
 ):
     """Login route to authenticate a user and return access and refresh tokens"""
-    db_user = (
-        db.query(CS_Users)
-        .filter(
-            or_(
-                CS_Users.email == form_data.username,
-                CS_Users.username == form_data.username,
-            )
-        )
-        .first()
-    )
+    db_user = await get_user_by_name_or_email_async(db, form_data.username)
+    # Give the connection back to the pool instead of holding it while hashing
+    await db.close()
     try:
         decoded_base64_password = base64.b64decode(form_data.password).decode("utf-8")
     except Exception as exc:
@@ -94,14 +108,31 @@ def login(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         ) from exc
 
-    if not db_user or not verify_password(
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
+        )
+    valid, new_hash = await password_pool.verify_and_update(
         decoded_base64_password, db_user.password_hash
-    ):
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
-    access_token = create_access_token(data={"sub": db_user.email})
-    refresh_token = create_refresh_token(data={"sub": db_user.email})
+    if new_hash:
+        # Hashed with an older cost, the write session is only used in this case.
+        # Best effort, the login succeeds even if the new hash cannot be stored
+        try:
+            await update_password_hash_async(
+                write_db, db_user.id, db_user.password_hash, new_hash
+            )
+            logger.info("Rehashed the password of user %s", db_user.username)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to rehash the password of %s", db_user.username)
+    # The user id lets authenticated routes skip the identity lookup
+    claims = {"sub": db_user.email, "uid": db_user.id}
+    access_token = create_access_token(data=claims)
+    refresh_token = create_refresh_token(data=claims)
     logger.info("User %s logged in successfully", db_user.username)
     return {
         "access_token": access_token,
@@ -112,33 +143,26 @@ def login(
 
 # currently logged in user details
 @router.get("/me", response_model=dict)
-def get_me(
-    current_user: str = Depends(get_current_user), db: Session = Depends(get_db)
+async def get_me(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Route to fetch details of the currently logged-in user"""
     # Fetch user details
     logger.info("Fetching user details for %s", current_user)
-    user = (
-        db.query(CS_Users)
-        .filter(or_(CS_Users.email == current_user, CS_Users.username == current_user))
-        .first()
-    )
+    user = await get_user_profile_async(current_user, db)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Fetch all joined events and streaks
-    user_events = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.user_id == 1)
-        .join(CS_Events, CS_Events.id == CS_UserEvents.event_id)
-        .all()
-    )
+    user_events = await get_user_event_memberships_async(db, user["id"])
+    tz_name = await get_user_timezone_async(db, user["id"])
     events = [
         {
             "id": ue.event_id,
             "name": ue.event.name,
-            "streak_count": ue.streak_count,
+            "streak_count": effective_streak(ue.streak_count, ue.modified, tz_name),
             "is_private": ue.event.is_private,
             "flags": ue.event.flags,
         }
@@ -146,52 +170,63 @@ def get_me(
     ]
 
     response = {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,  # You can exclude email if privacy is needed
-        "flags": user.flags,
-        "created_at": user.created_at,
+        "id": user["id"],
+        "username": user["username"],
+        "email": user["email"],  # You can exclude email if privacy is needed
+        "flags": user["flags"],
+        "created_at": user["created_at"],
+        "timezone": tz_name,
         "joined_events": events,
     }
-    logger.info("User details fetched successfully for %s - %s", current_user, response)
+    logger.debug(
+        "User details fetched for %s (%s joined events)", current_user, len(events)
+    )
     return response
 
 
+@router.put("/me/timezone", response_model=dict)
+async def set_my_timezone(
+    timezone: str,
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_write_db),
+):
+    """Route to set the timezone whose local day is used for the user's streaks"""
+    return {"timezone": await set_user_timezone_async(db, user_id, timezone)}
+
+
 @router.get("/", response_model=list[dict])
-def get_all_users(db: Session = Depends(get_db)):
-    """Route to fetch all users"""
-    users = db.query(CS_Users).all()
-    return [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "flags": user.flags,
-        }
-        for user in users
-    ]
+async def get_all_users(
+    response: Response,
+    flags: str = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Route to fetch a page of users, the next page cursor is returned in a response header"""
+    users, next_cursor = await get_users_from_db_async(
+        db, flags, limit=limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return users
 
 
 @router.get("/{user_id}", response_model=dict)
-def get_user_details(user_id: int, db: Session = Depends(get_db)):
+async def get_user_details(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Route to fetch details of a specific user by user ID"""
     # Fetch user details
-    user = db.query(CS_Users).filter(CS_Users.id == user_id).first()
+    user = await get_user_by_id_async(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Fetch all joined events and streaks
-    user_events = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.user_id == user_id)
-        .join(CS_Events, CS_Events.id == CS_UserEvents.event_id)
-        .all()
-    )
+    user_events = await get_user_event_memberships_async(db, user_id)
+    tz_name = await get_user_timezone_async(db, user_id)
     events = [
         {
             "event_id": ue.event_id,
             "event_name": ue.event.name,
-            "streak_count": ue.streak_count,
+            "streak_count": effective_streak(ue.streak_count, ue.modified, tz_name),
             "is_private": ue.event.is_private,
             "flags": ue.event.flags,
         }
@@ -209,14 +244,11 @@ def get_user_details(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{user_id}/events", response_model=list[dict])
-def get_user_events(user_id: int, db: Session = Depends(get_db)):
+async def get_user_events(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Route to fetch events joined by a specific user"""
-    user_events = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.user_id == user_id)
-        .join(CS_Events, CS_Events.id == CS_UserEvents.event_id)
-        .all()
-    )
+    user_events = await get_user_event_memberships_async(db, user_id)
+    tz_name = await get_user_timezone_async(db, user_id)
+    today = local_today(tz_name)
     events = [
         {
             "id": ue.event_id,
@@ -225,12 +257,10 @@ def get_user_events(user_id: int, db: Session = Depends(get_db)):
             "created_by": ue.event.created_by,
             "is_private": ue.event.is_private,
             "flags": ue.event.flags,
-            "streak_count": ue.streak_count,
-            # check if last modified is today
+            "streak_count": effective_streak(ue.streak_count, ue.modified, tz_name),
+            # check if last modified is today, in the user's local day
             "completed": (
-                ue.modified.date() == datetime.now(timezone.utc).date()
-                if ue.modified
-                else False
+                local_date(ue.modified, tz_name) == today if ue.modified else False
             ),
         }
         for ue in user_events
@@ -239,9 +269,9 @@ def get_user_events(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/token/refresh", response_model=Token)
-def refresh_access_token(refresh_token: str):
+async def refresh_access_token(refresh_token: str):
     """Route to refresh the access token using a refresh token"""
-    payload = decode_access_token(refresh_token)
+    payload = decode_refresh_token(refresh_token)
     if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
@@ -251,7 +281,10 @@ def refresh_access_token(refresh_token: str):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
         )
-    access_token = create_access_token(data={"sub": username})
+    claims = {"sub": username}
+    if "uid" in payload:
+        claims["uid"] = payload["uid"]
+    access_token = create_access_token(data=claims)
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -5,6 +5,7 @@ This module provides a WebSocket endpoint that sends motivational quotes to conn
 import asyncio
 import random
 from fastapi import APIRouter, WebSocket
+from app.core.metrics import websocket_connections
 
 router = APIRouter()
 
@@ -37,6 +38,7 @@ MOTIVATIONAL_QUOTES = [
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint to send motivational quotes every 5 minutes."""
     await websocket.accept()
+    websocket_connections.inc()
 
     try:
         while True:
@@ -48,3 +50,5 @@ async def websocket_endpoint(websocket: WebSocket):
             await asyncio.sleep(300)  # 300 seconds = 5 minutes
     except Exception as e:
         print(f"WebSocket connection closed: {e}")
+    finally:
+        websocket_connections.dec()
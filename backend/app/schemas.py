@@ -3,7 +3,11 @@ This module contains Pydantic schemas for the FastAPI application.
 """
 
 # app/schemas.py
-from pydantic import BaseModel, EmailStr
+from typing import List
+from pydantic import BaseModel, EmailStr, Field
+
+# Upper bound on the number of items of a bulk request
+MAX_BULK_ITEMS = 500
 
 
 class UserCreate(BaseModel):
@@ -24,3 +28,33 @@ class Token(BaseModel):
     access_token: str
     token_type: str
     refresh_token: str
+
+
+class EventIds(BaseModel):
+    """Event ids schema for the bulk event endpoints"""
+    event_ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+class UserIds(BaseModel):
+    """User ids schema for enrolling many users into an event"""
+    user_ids: List[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+class EventProp(BaseModel):
+    """Event prop schema, a name/value pair attached to an event"""
+    name: str
+    value: str
+
+
+class EventCreate(BaseModel):
+    """Event create schema for the batch event creation"""
+    name: str
+    description: str
+    is_private: bool = True
+    flags: str = "user_created"
+    props: List[EventProp] = []
+
+
+class EventBatch(BaseModel):
+    """Event batch schema to create many events at once"""
+    events: List[EventCreate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
@@ -0,0 +1,196 @@
+"""
+This module contains the optional write-behind pipeline for check-ins.
+
+With `checkin_write_behind` enabled, mark-completed requests are validated (and
+checked against the in-process set of check-ins already taken today), queued, and
+written by a background task in one transaction every `checkin_flush_interval_ms`
+or `checkin_flush_max_items`, so a burst of check-ins pays for one commit instead
+of one per request.
+
+`checkin_durability` decides when a request is answered: "flush" waits for the
+batch to be committed (group commit, nothing acknowledged is lost), "enqueue"
+answers as soon as the check-in is queued (a crash loses the current batch).
+The queue is drained on shutdown.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.core.config import settings
+from app.db.session import AsyncWriteSessionLocal
+from app.services.checkins import date_to_day
+from app.services.events_svc import apply_checkins_async, prepare_checkin_async
+from app.services.timezones import local_today
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("flush", "enqueue")
+
+
+class CheckinBatcher:
+    """Queue of validated check-ins, written in batches by a background task."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        interval_ms: int,
+        max_items: int,
+        durability: str = "flush",
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown check-in durability mode [{durability}]")
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.max_items = max_items
+        self.durability = durability
+        # (user_id, event_id) -> (local day, timezone) of check-ins queued or written
+        self._marked: Dict[Tuple[int, int], Tuple[int, str]] = {}
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._pruned_at = time.monotonic()
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the flush task is running."""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the flush task, must be called from the event loop."""
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            "Check-in write-behind started (%sms / %s items, durability %s).",
+            int(self.interval * 1000),
+            self.max_items,
+            self.durability,
+        )
+
+    async def drain(self):
+        """Stop the flush task and write everything still queued."""
+        if self._task is not None:
+            # Let the task finish its current flush instead of cancelling it mid-write
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def submit(self, db: AsyncSession, user_id: int, event_id: int) -> dict:
+        """Validate and queue a check-in, see `checkin_durability` for when it returns."""
+        if self._is_marked(user_id, event_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Streak already updated for today",
+            )
+        checkin = await prepare_checkin_async(db, user_id, event_id)
+        # Another request for the same user event may have been queued meanwhile
+        if self._is_marked(user_id, event_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Streak already updated for today",
+            )
+        self._marked[(user_id, event_id)] = (checkin["day"], checkin["timezone"])
+
+        written = asyncio.get_running_loop().create_future()
+        self._pending.append((checkin, written))
+        if len(self._pending) >= self.max_items and self._wake is not None:
+            self._wake.set()
+        if not self.running:
+            # No background task (e.g. not started), write it right away
+            await self.flush()
+        if self.durability == "flush":
+            await written
+
+        return {
+            "message": "Streak updated successfully",
+            "streak_count": checkin["streak_count"],
+        }
+
+    async def flush(self):
+        """Write the queued check-ins in one transaction."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            async with self.session_factory() as db:
+                applied = await apply_checkins_async(
+                    db, [checkin for checkin, _ in batch]
+                )
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to write a batch of %s check-ins.", len(batch))
+            for checkin, written in batch:
+                self._marked.pop((checkin["user_id"], checkin["event_id"]), None)
+                if not written.done():
+                    written.set_exception(
+                        HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Check-in could not be saved",
+                        )
+                    )
+                    # Nobody awaits the future in "enqueue" mode
+                    written.exception()
+            return
+
+        self.batches += 1
+        logger.debug("Wrote %s of a batch of %s check-ins.", len(applied), len(batch))
+        applied_ids = {checkin["id"] for checkin in applied}
+        for checkin, written in batch:
+            if written.done():
+                continue
+            if checkin["id"] in applied_ids:
+                written.set_result(None)
+            else:
+                # Marked today since it was validated, e.g. by another replica
+                written.set_exception(
+                    HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Streak already updated for today",
+                    )
+                )
+                # Nobody awaits the future in "enqueue" mode
+                written.exception()
+        self._forget_old_days()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _is_marked(self, user_id: int, event_id: int) -> bool:
+        entry = self._marked.get((user_id, event_id))
+        return entry is not None and self._is_today(*entry)
+
+    @staticmethod
+    def _is_today(day: int, tz_name: str) -> bool:
+        return day == date_to_day(local_today(tz_name))
+
+    def _forget_old_days(self):
+        """Drop entries whose day is over in the user's timezone, at most hourly."""
+        if time.monotonic() - self._pruned_at < 3600:
+            return
+        self._pruned_at = time.monotonic()
+        for key in [
+            key for key, entry in self._marked.items() if not self._is_today(*entry)
+        ]:
+            del self._marked[key]
+
+
+checkin_batcher = CheckinBatcher(
+    AsyncWriteSessionLocal,
+    settings.checkin_flush_interval_ms,
+    settings.checkin_flush_max_items,
+    settings.checkin_durability,
+)
@@ -0,0 +1,206 @@
+"""
+This module contains the service methods for the check-in history.
+
+Every check-in is appended to `cs_checkins` as (user_id, event_id, day), where day is
+the number of days since 1970-01-01 in the user's local timezone. A compaction job
+folds days older than `checkin_compaction_days` into `cs_checkin_segments`, one row
+per run of consecutive days, so history queries read a handful of segments plus the
+recent raw rows instead of one row per day.
+"""
+
+import logging
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Iterable, List, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import CS_Checkins, CS_CheckinSegments
+from app.db.session import run_in_async_session
+from app.db.utils import insert_ignore
+from app.services.timezones import get_user_timezone, local_today
+
+logger = logging.getLogger(__name__)
+
+EPOCH = date(1970, 1, 1)
+
+
+def date_to_day(value: date) -> int:
+    """Method to convert a date to its day number."""
+    return (value - EPOCH).days
+
+
+def day_to_date(day: int) -> date:
+    """Method to convert a day number back to a date."""
+    return EPOCH + timedelta(days=day)
+
+
+def merge_runs(runs: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Method to merge (start_day, end_day) runs that overlap or touch."""
+    merged = []
+    for start, end in sorted(runs):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def record_checkins(db: Session, checkins: Iterable[Tuple[int, int, int]]) -> None:
+    """
+    Append (user_id, event_id, day) check-ins in a single multi-row INSERT.
+
+    Check-ins already logged for the same day are skipped. The caller commits, so the
+    log is written in the same transaction as the streak update.
+    """
+    rows = [
+        {"user_id": user_id, "event_id": event_id, "day": day}
+        for user_id, event_id, day in checkins
+    ]
+    if rows:
+        db.execute(insert_ignore(db, CS_Checkins), rows)
+
+
+def compact_checkins(
+    db: Session, before_day: int = None, chunk_size: int = 500
+) -> dict:
+    """
+    Fold check-ins older than `before_day` into run-length segments.
+
+    Works through chunks of (user_id, event_id) pairs, each chunk in its own short
+    transaction, merging the old days with the existing segments of the pair.
+
+    Returns:
+        dict: Pairs processed, check-in rows folded and segments written.
+    """
+    if before_day is None:
+        before_day = date_to_day(date.today()) - settings.checkin_compaction_days
+    started = perf_counter()
+    summary = {"pairs": 0, "rows": 0, "segments": 0, "duration": 0.0}
+
+    while True:
+        pairs = (
+            db.query(CS_Checkins.user_id, CS_Checkins.event_id)
+            .filter(CS_Checkins.day < before_day)
+            .distinct()
+            .limit(chunk_size)
+            .all()
+        )
+        if not pairs:
+            break
+        pair_filter = tuple_(CS_Checkins.user_id, CS_Checkins.event_id).in_(pairs)
+        segment_filter = tuple_(
+            CS_CheckinSegments.user_id, CS_CheckinSegments.event_id
+        ).in_(pairs)
+
+        runs = {tuple(pair): [] for pair in pairs}
+        for user_id, event_id, day in db.query(
+            CS_Checkins.user_id, CS_Checkins.event_id, CS_Checkins.day
+        ).filter(pair_filter, CS_Checkins.day < before_day):
+            runs[(user_id, event_id)].append((day, day))
+            summary["rows"] += 1
+        for user_id, event_id, start_day, end_day in db.query(
+            CS_CheckinSegments.user_id,
+            CS_CheckinSegments.event_id,
+            CS_CheckinSegments.start_day,
+            CS_CheckinSegments.end_day,
+        ).filter(segment_filter):
+            runs[(user_id, event_id)].append((start_day, end_day))
+
+        segments = [
+            {
+                "user_id": user_id,
+                "event_id": event_id,
+                "start_day": start,
+                "end_day": end,
+            }
+            for (user_id, event_id), pair_runs in runs.items()
+            for start, end in merge_runs(pair_runs)
+        ]
+        db.query(CS_CheckinSegments).filter(segment_filter).delete(
+            synchronize_session=False
+        )
+        db.bulk_insert_mappings(CS_CheckinSegments, segments)
+        db.query(CS_Checkins).filter(pair_filter, CS_Checkins.day < before_day).delete(
+            synchronize_session=False
+        )
+        db.commit()
+
+        summary["pairs"] += len(pairs)
+        summary["segments"] += len(segments)
+
+    summary["duration"] = perf_counter() - started
+    logger.info(
+        "Compacted %s check-ins of %s user events into %s segments (%.3fs).",
+        summary["rows"],
+        summary["pairs"],
+        summary["segments"],
+        summary["duration"],
+    )
+    return summary
+
+
+def get_checkin_runs(
+    db: Session, user_id: int, event_id: int, start_day: int, end_day: int
+) -> List[Tuple[int, int]]:
+    """Method to get the runs of consecutive check-in days within a day range."""
+    runs = [
+        (max(segment_start, start_day), min(segment_end, end_day))
+        for segment_start, segment_end in db.query(
+            CS_CheckinSegments.start_day, CS_CheckinSegments.end_day
+        ).filter(
+            CS_CheckinSegments.user_id == user_id,
+            CS_CheckinSegments.event_id == event_id,
+            CS_CheckinSegments.start_day <= end_day,
+            CS_CheckinSegments.end_day >= start_day,
+        )
+    ]
+    runs.extend(
+        (day, day)
+        for (day,) in db.query(CS_Checkins.day).filter(
+            CS_Checkins.user_id == user_id,
+            CS_Checkins.event_id == event_id,
+            CS_Checkins.day.between(start_day, end_day),
+        )
+    )
+    return merge_runs(runs)
+
+
+def get_checkin_history(
+    db: Session, user_id: int, event_id: int, start: date = None, end: date = None
+) -> dict:
+    """
+    Retrieve the check-in calendar of a user in an event.
+
+    Args:
+        start (date, optional): First day of the calendar. Defaults to a year before `end`.
+        end (date, optional): Last day of the calendar. Defaults to the user's today.
+
+    Returns:
+        dict: The runs of consecutive days within the range, the number of days
+        checked in and the longest streak over the whole history.
+    """
+    end = end or local_today(get_user_timezone(db, user_id))
+    start = start or end - timedelta(days=364)
+    runs = get_checkin_runs(db, user_id, event_id, date_to_day(start), date_to_day(end))
+    all_runs = get_checkin_runs(
+        db, user_id, event_id, date_to_day(EPOCH), date_to_day(date.max)
+    )
+
+    return {
+        "event_id": event_id,
+        "start": start,
+        "end": end,
+        "runs": [
+            {"start": day_to_date(run_start), "end": day_to_date(run_end)}
+            for run_start, run_end in runs
+        ],
+        "days_checked_in": sum(run_end - run_start + 1 for run_start, run_end in runs),
+        "longest_streak": max(
+            (run_end - run_start + 1 for run_start, run_end in all_runs), default=0
+        ),
+    }
+
+
+# Async versions for the route handlers, see `run_in_async_session`
+get_checkin_history_async = run_in_async_session(get_checkin_history)
@@ -0,0 +1,279 @@
+"""
+This module maintains `cs_event_stats`, the per-event aggregates shown by the event
+listings: participant count, completions of the current (UTC) day and max streak.
+
+Counting them on read would scan every membership of every listed event. Instead the
+service methods that join, exit, mark or reset update the stats row in the same
+transaction as the membership change: participants and completions are adjusted by
+their delta, the max streak is re-read through the (event_id, streak_count) index,
+so every write costs a single-row update. The caller commits, like
+`record_checkins`.
+
+The max streak is the highest effective streak: with lazy expiry the stored
+`streak_count` of a lapsed streak is never reset, so those rows count as 0, and
+`refresh_lapsed_max_streaks` re-reads the max streaks that lapsed without a write.
+
+The stats can still drift (a membership insert skipped by a concurrent request, rows
+changed by hand), so `reconcile_event_stats` recounts them from `cs_user_events`
+and repairs the rows that differ. It counts the members marked since UTC midnight,
+a user far from UTC who marks twice in one UTC day is counted once after a repair.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, time
+from time import perf_counter
+from typing import Dict, Iterable, Optional
+from sqlalchemy import bindparam, case, func, literal, select, update
+from sqlalchemy.orm import Session
+from app.db.models import CS_Events, CS_EventStats, CS_UserEvents
+from app.services.checkins import date_to_day
+from app.services.streaks import effective_streak_column
+
+logger = logging.getLogger(__name__)
+
+stats_table = CS_EventStats.__table__
+
+
+def stats_day(now: datetime = None) -> int:
+    """Method to get the UTC day number the completions are counted on."""
+    return date_to_day((now or datetime.utcnow()).date())
+
+
+def completions_on(completions_day: int, completions_today: int, day: int) -> int:
+    """Method to read the completion count of a stats row for a given day."""
+    return completions_today if completions_day == day else 0
+
+
+def _recount(db, event_id, now: datetime) -> dict:
+    """Column values of a stats row recounted from the memberships of `event_id`."""
+    midnight = datetime.combine(now.date(), time.min)
+    of_event = CS_UserEvents.event_id == event_id
+    streak_count = effective_streak_column(db, now)
+    return {
+        "participants": select(func.count(CS_UserEvents.id))
+        .where(of_event)
+        .scalar_subquery(),
+        "max_streak": select(func.coalesce(func.max(streak_count), 0))
+        .where(of_event)
+        .scalar_subquery(),
+        "completions_day": literal(stats_day(now)),
+        "completions_today": select(func.count(CS_UserEvents.id))
+        .where(of_event, CS_UserEvents.modified >= midnight)
+        .scalar_subquery(),
+        "updated_at": literal(now),
+    }
+
+
+def add_event_stats(
+    db, event_ids: Optional[Iterable[int]] = None, now: datetime = None
+):
+    """
+    Insert the missing stats rows, counted from the current memberships.
+
+    Args:
+        db: A Session or a Connection (migrations).
+        event_ids (Iterable[int], optional): Events to add. Defaults to every event.
+    """
+    now = now or datetime.utcnow()
+    values = _recount(db, CS_Events.id, now)
+    query = select(CS_Events.id, *values.values()).where(
+        CS_Events.id.not_in(select(stats_table.c.event_id))
+    )
+    if event_ids is not None:
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        query = query.where(CS_Events.id.in_(event_ids))
+    db.execute(stats_table.insert().from_select(["event_id", *values], query))
+
+
+def record_membership_changes(db: Session, deltas: Dict[int, int]):
+    """Method to add participant deltas, by event id, to the stats of the events."""
+    deltas = {event_id: delta for event_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    now = datetime.utcnow()
+    # The max streak is re-read, so the membership rows must be written first
+    db.flush()
+    db.execute(
+        update(stats_table)
+        .where(stats_table.c.event_id == bindparam("b_event_id"))
+        .values(
+            participants=stats_table.c.participants + bindparam("b_delta"),
+            max_streak=_recount(db, stats_table.c.event_id, now)["max_streak"],
+            updated_at=now,
+        ),
+        [
+            {"b_event_id": event_id, "b_delta": delta}
+            for event_id, delta in deltas.items()
+        ],
+    )
+
+
+def record_completions(db: Session, event_ids: Iterable[int], now: datetime = None):
+    """Method to count completions (an event id per completion) in the stats."""
+    counts = Counter(event_ids)
+    if not counts:
+        return
+    now = now or datetime.utcnow()
+    day = stats_day(now)
+    db.flush()
+    db.execute(
+        update(stats_table)
+        .where(stats_table.c.event_id == bindparam("b_event_id"))
+        .values(
+            # The count restarts on the first completion of a new day
+            completions_today=case(
+                (
+                    stats_table.c.completions_day == day,
+                    stats_table.c.completions_today + bindparam("b_count"),
+                ),
+                else_=bindparam("b_count"),
+            ),
+            completions_day=day,
+            max_streak=_recount(db, stats_table.c.event_id, now)["max_streak"],
+            updated_at=now,
+        ),
+        [
+            {"b_event_id": event_id, "b_count": count}
+            for event_id, count in counts.items()
+        ],
+    )
+
+
+def refresh_max_streaks(db: Session, event_ids: Iterable[int], now: datetime = None):
+    """Method to re-read the max streak of events whose streaks were lowered."""
+    event_ids = list(set(event_ids))
+    if not event_ids:
+        return
+    now = now or datetime.utcnow()
+    db.flush()
+    db.execute(
+        update(stats_table)
+        .where(stats_table.c.event_id.in_(event_ids))
+        .values(
+            max_streak=_recount(db, stats_table.c.event_id, now)["max_streak"],
+            updated_at=now,
+        )
+    )
+
+
+def refresh_lapsed_max_streaks(
+    db: Session, chunk_size: int = 500, now: datetime = None
+) -> int:
+    """
+    Re-read the max streak of every event that has one, for lazy streak expiry.
+
+    Lapsed streaks stop counting at the local midnight of their users, without
+    any write to their event. Events are processed in primary key chunks, each in
+    its own short transaction.
+
+    Returns:
+        int: The number of events refreshed.
+    """
+    now = now or datetime.utcnow()
+    refreshed = 0
+    last_id = 0
+    while True:
+        event_ids = [
+            event_id
+            for (event_id,) in db.query(CS_EventStats.event_id)
+            .filter(CS_EventStats.event_id > last_id, CS_EventStats.max_streak > 0)
+            .order_by(CS_EventStats.event_id)
+            .limit(chunk_size)
+        ]
+        if not event_ids:
+            break
+        last_id = event_ids[-1]
+        refresh_max_streaks(db, event_ids, now)
+        db.commit()
+        refreshed += len(event_ids)
+    return refreshed
+
+
+def reconcile_event_stats(
+    db: Session, chunk_size: int = 500, now: datetime = None
+) -> dict:
+    """
+    Recount the stats of every event and repair the rows that drifted.
+
+    Events are processed in primary key chunks, each in its own short transaction.
+    Drifted rows are rewritten by a single UPDATE recounting them, so a membership
+    change committed since the comparison is not overwritten with a stale count.
+
+    Returns:
+        dict: Events checked, rows added, rows repaired and duration in seconds.
+    """
+    started = perf_counter()
+    now = now or datetime.utcnow()
+    day = stats_day(now)
+    midnight = datetime.combine(now.date(), time.min)
+    summary = {"events": 0, "added": 0, "repaired": 0, "duration": 0.0}
+
+    last_id = 0
+    while True:
+        event_ids = [
+            event_id
+            for (event_id,) in db.query(CS_Events.id)
+            .filter(CS_Events.id > last_id)
+            .order_by(CS_Events.id)
+            .limit(chunk_size)
+        ]
+        if not event_ids:
+            break
+        last_id = event_ids[-1]
+
+        actual = {event_id: (0, 0, 0) for event_id in event_ids}
+        for event_id, participants, max_streak, completions in (
+            db.query(
+                CS_UserEvents.event_id,
+                func.count(CS_UserEvents.id),
+                func.coalesce(func.max(effective_streak_column(db, now)), 0),
+                func.sum(case((CS_UserEvents.modified >= midnight, 1), else_=0)),
+            )
+            .filter(CS_UserEvents.event_id.in_(event_ids))
+            .group_by(CS_UserEvents.event_id)
+        ):
+            actual[event_id] = (participants, max_streak, completions or 0)
+
+        stored = {
+            row.event_id: (
+                row.participants,
+                row.max_streak,
+                completions_on(row.completions_day, row.completions_today, day),
+            )
+            for row in db.query(CS_EventStats).filter(
+                CS_EventStats.event_id.in_(event_ids)
+            )
+        }
+        missing = [event_id for event_id in event_ids if event_id not in stored]
+        drifted = [
+            event_id
+            for event_id, values in stored.items()
+            if values != actual[event_id]
+        ]
+
+        add_event_stats(db, missing, now)
+        if drifted:
+            db.execute(
+                update(stats_table)
+                .where(stats_table.c.event_id.in_(drifted))
+                .values(**_recount(db, stats_table.c.event_id, now))
+            )
+        db.commit()
+
+        summary["events"] += len(event_ids)
+        summary["added"] += len(missing)
+        summary["repaired"] += len(drifted)
+
+    summary["duration"] = perf_counter() - started
+    log = logger.warning if summary["added"] or summary["repaired"] else logger.info
+    log(
+        "Event stats reconciled: %s events, %s added, %s repaired (%.3fs).",
+        summary["events"],
+        summary["added"],
+        summary["repaired"],
+        summary["duration"],
+    )
+    return summary
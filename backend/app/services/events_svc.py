@@ -1,18 +1,63 @@
 """This module contains the service methods for the events."""
 
-from typing import List
+from typing import List, Optional, Set, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, case, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from app.db.models import CS_Events, CS_Users, CS_EventProps, CS_UserEvents
+from app.core.response_cache import EVENTS_TAG, event_tag, response_cache
+from app.db.models import (
+    CS_Events,
+    CS_EventProps,
+    CS_EventStats,
+    CS_UserEvents,
+    CS_Users,
+)
+from app.db.session import run_in_async_session
+from app.db.utils import insert_ignore
+from app.services.checkins import date_to_day, record_checkins
+from app.services.event_stats import (
+    add_event_stats,
+    completions_on,
+    record_completions,
+    record_membership_changes,
+    stats_day,
+)
+from app.services.loaders import (
+    load_events_with_props,
+    load_events_with_streaks,
+    serialize_event,
+)
+from app.services.pagination import DEFAULT_PAGE_SIZE, paginate
+from app.services.streaks import (
+    effective_streak,
+    effective_streak_column,
+    is_streak_alive,
+    user_timezone_column,
+)
+from app.services.timezones import (
+    DEFAULT_TIMEZONE,
+    get_user_timezone,
+    local_date,
+    local_midnight_utc,
+    local_today,
+    streak_cutoff_utc,
+)
+
+# `CS_Users.flags` of the users allowed to manage any event
+ADMIN_FLAG = "admin"
 
 
 def create_event(db: Session, event_details: dict) -> CS_Events:
     """Method to create an event."""
     event = CS_Events(**event_details)
     db.add(event)
+    db.flush()
+    add_event_stats(db, [event.id])
     db.commit()
     db.refresh(event)
+    response_cache.invalidate(EVENTS_TAG)
 
     return {
         "message": "Event created successfully",
@@ -38,111 +83,43 @@ def fetch_joined_events_for_user(db: Session, user_id: int) -> List[CS_Events]:
     )
 
 
-def get_streak_count(db: Session, user_id: int, event_id: int) -> int:
-    """Method to get the streak count for a user in an event."""
-    return (
-        db.query(CS_UserEvents)
-        .filter(
-            CS_UserEvents.event_id == event_id,
-            CS_UserEvents.user_id == user_id,
-        )
-        .first()
-    )
-
-
-def get_events_from_db(db: Session, flags: str) -> List[dict]:
-    """Method to get all events from the database."""
+def get_events_from_db(
+    db: Session,
+    flags: Optional[str] = None,
+    is_private: Optional[bool] = None,
+    created_by: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Method to get a page of events from the database and the cursor of the next page."""
     query = db.query(CS_Events)
 
     if flags:
         query = query.filter(CS_Events.flags == flags)
+    if is_private is not None:
+        query = query.filter(CS_Events.is_private == is_private)
+    if created_by is not None:
+        query = query.filter(CS_Events.created_by == created_by)
 
-    events = query.all()
-    result = []
-    for event in events:
-        # Get event props
-        props = db.query(CS_EventProps).filter(CS_EventProps.event_id == event.id).all()
-        event_props = [
-            {"name": prop.prop_name, "value": prop.prop_value} for prop in props
-        ]
-        result.append(
-            {
-                "id": event.id,
-                "name": event.name,
-                "description": event.description,
-                "created_by": event.created_by,
-                "is_private": event.is_private,
-                "flags": event.flags,
-                "created_at": event.created_at,
-                "props": event_props,
-            }
-        )
-
-    return result
+    events, next_cursor = paginate(query, CS_Events, limit, cursor)
+    return load_events_with_props(db, events), next_cursor
 
 
 def get_user_created_events(db: Session, user_id: int) -> List[CS_Events]:
     """Method to get all events created by a user."""
-    # Fetch all joined events and streaks
     user_events = (
         db.query(CS_Events)
         .join(CS_Users, CS_Users.id == CS_Events.created_by)
         .filter(CS_Users.id == user_id)
         .all()
     )
-    events = []
-    for ue in user_events:
-        # Get event props
-        props = db.query(CS_EventProps).filter(CS_EventProps.event_id == ue.id).all()
-        event_props = [
-            {"name": prop.prop_name, "value": prop.prop_value} for prop in props
-        ]
-
-        streak_count = get_streak_count(db, user_id, ue.id)
-
-        events.append(
-            {
-                "id": ue.id,
-                "name": ue.name,
-                "description": ue.description,
-                "created_by": ue.created_by,
-                "is_private": ue.is_private,
-                "flags": ue.flags,
-                "created_at": ue.created_at,
-                "props": event_props,
-                "streak_count": streak_count.streak_count if streak_count else 0,
-            }
-        )
-    return events
+    return load_events_with_streaks(db, user_events, user_id)
 
 
 def get_user_joined_events(db: Session, user_id: int) -> List[CS_Events]:
     """Method to get all events joined by a user."""
-    # Fetch all joined events and streaks
     user_events = fetch_joined_events_for_user(db, user_id)
-    events = []
-    for ue in user_events:
-        # Get event props
-        props = db.query(CS_EventProps).filter(CS_EventProps.event_id == ue.id).all()
-        event_props = [
-            {"name": prop.prop_name, "value": prop.prop_value} for prop in props
-        ]
-
-        streak_count = get_streak_count(db, user_id, ue.id)
-        events.append(
-            {
-                "id": ue.id,
-                "name": ue.name,
-                "description": ue.description,
-                "created_by": ue.created_by,
-                "is_private": ue.is_private,
-                "flags": ue.flags,
-                "created_at": ue.created_at,
-                "props": event_props,
-                "streak_count": streak_count.streak_count if streak_count else 0,
-            }
-        )
-    return events
+    return load_events_with_streaks(db, user_events, user_id)
 
 
 def join_event(db: Session, user_id: int, event_id: int) -> bool:
@@ -152,19 +129,13 @@ def join_event(db: Session, user_id: int, event_id: int) -> bool:
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    # Check if user is already in the event
-    existing = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.event_id == event_id, CS_UserEvents.user_id == user_id)
-        .first()
-    )
-    if existing:
+    # Add user to event, unless they already joined it
+    if not _add_memberships(db, [(user_id, event_id)]):
+        db.rollback()
         return {"message": "User already joined the event"}
-
-    # Add user to event
-    new_user_event = CS_UserEvents(event_id=event_id, user_id=user_id)
-    db.add(new_user_event)
+    record_membership_changes(db, {event_id: 1})
     db.commit()
+    response_cache.invalidate(event_tag(event_id))
     return {"message": "User successfully joined the event"}
 
 
@@ -175,24 +146,228 @@ def exit_event(db: Session, user_id: int, event_id: int) -> bool:
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    # Check if user is in the event
-    existing = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.event_id == event_id, CS_UserEvents.user_id == user_id)
-        .first()
+    # Remove user from event, if they are part of it
+    if not _remove_memberships(db, user_id, [event_id]):
+        db.rollback()
+        return {"message": "User is not part of the event"}
+    record_membership_changes(db, {event_id: -1})
+    db.commit()
+    response_cache.invalidate(event_tag(event_id))
+    return {"message": "User successfully exited the event"}
+
+
+def _existing_ids(db: Session, column, ids: List[int]) -> set:
+    """Method to select which of the given ids exist in an id column."""
+    if not ids:
+        return set()
+    return {value for (value,) in db.query(column).filter(column.in_(ids))}
+
+
+def _is_admin(db: Session, user_id: int) -> bool:
+    """Method to check whether a user has the admin flag."""
+    flags = db.query(CS_Users.flags).filter(CS_Users.id == user_id).scalar()
+    return flags == ADMIN_FLAG
+
+
+def _add_memberships(db: Session, pairs: List[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """
+    Method to insert (user_id, event_id) memberships, skipping existing ones.
+
+    Returns:
+        set: The pairs actually inserted, a concurrent request may have inserted
+        some of the others since they were checked.
+    """
+    if not pairs:
+        return set()
+    memberships = CS_UserEvents.__table__
+    statement = insert_ignore(db, memberships)
+    rows = [{"user_id": user_id, "event_id": event_id} for user_id, event_id in pairs]
+    if db.get_bind().dialect.insert_executemany_returning:
+        returning = statement.returning(memberships.c.user_id, memberships.c.event_id)
+        return set(db.execute(returning, rows).tuples())
+    # No RETURNING for many rows, insert them one by one. Without ON CONFLICT a
+    # duplicate raises, only its savepoint is rolled back
+    inserted = set()
+    for row in rows:
+        try:
+            with db.begin_nested():
+                if db.execute(statement, row).rowcount:
+                    inserted.add((row["user_id"], row["event_id"]))
+        except IntegrityError:
+            pass
+    return inserted
+
+
+def _remove_memberships(db: Session, user_id: int, event_ids: List[int]) -> Set[int]:
+    """
+    Method to delete the memberships of a user in events.
+
+    Returns:
+        set: The ids of the events the user actually left.
+    """
+    if not event_ids:
+        return set()
+    statement = (
+        delete(CS_UserEvents)
+        .where(CS_UserEvents.user_id == user_id)
+        .execution_options(synchronize_session=False)
     )
+    if db.get_bind().dialect.delete_returning:
+        removed = statement.where(CS_UserEvents.event_id.in_(event_ids))
+        return set(db.execute(removed.returning(CS_UserEvents.event_id)).scalars())
+    return {
+        event_id
+        for event_id in event_ids
+        if db.execute(statement.where(CS_UserEvents.event_id == event_id)).rowcount
+    }
 
-    if not existing:
-        return {"message": "User is not part of the event"}
 
-    # Remove user from event
-    db.delete(existing)
+def join_events(db: Session, user_id: int, event_ids: List[int]) -> List[dict]:
+    """
+    Method to join a user to many events in one transaction.
+
+    Returns:
+        list: One result per distinct event id, in request order, with a status of
+        "joined", "already_joined" or "not_found".
+    """
+    event_ids = list(dict.fromkeys(event_ids))
+    found = _existing_ids(db, CS_Events.id, event_ids)
+    # Only the rows actually inserted count, the others were already there
+    new = {
+        event_id
+        for _, event_id in _add_memberships(
+            db, [(user_id, event_id) for event_id in event_ids if event_id in found]
+        )
+    }
+    record_membership_changes(db, {event_id: 1 for event_id in new})
     db.commit()
-    return {"message": "User successfully exited the event"}
+    response_cache.invalidate(*map(event_tag, new))
 
+    return [
+        {
+            "event_id": event_id,
+            "status": (
+                "joined"
+                if event_id in new
+                else "already_joined" if event_id in found else "not_found"
+            ),
+        }
+        for event_id in event_ids
+    ]
 
-async def mark_event_completed(db: Session, user_id: int, event_id: int) -> bool:
-    """Method to mark an event as completed for a user."""
+
+def exit_events(db: Session, user_id: int, event_ids: List[int]) -> List[dict]:
+    """
+    Method to exit a user from many events in one transaction.
+
+    Returns:
+        list: One result per distinct event id, in request order, with a status of
+        "exited", "not_joined" or "not_found".
+    """
+    event_ids = list(dict.fromkeys(event_ids))
+    found = _existing_ids(db, CS_Events.id, event_ids)
+    leaving = _remove_memberships(
+        db, user_id, [event_id for event_id in event_ids if event_id in found]
+    )
+    record_membership_changes(db, {event_id: -1 for event_id in leaving})
+    db.commit()
+    response_cache.invalidate(*map(event_tag, leaving))
+
+    return [
+        {
+            "event_id": event_id,
+            "status": (
+                "exited"
+                if event_id in leaving
+                else "not_joined" if event_id in found else "not_found"
+            ),
+        }
+        for event_id in event_ids
+    ]
+
+
+def enroll_users(
+    db: Session, event_id: int, user_ids: List[int], enrolled_by: int
+) -> List[dict]:
+    """
+    Method to join many users to an event in one transaction.
+
+    Only the creator of the event, or an admin, may enroll other users.
+
+    Returns:
+        list: One result per distinct user id, in request order, with a status of
+        "joined", "already_joined" or "not_found".
+    """
+    created_by = (
+        db.query(CS_Events.created_by).filter(CS_Events.id == event_id).scalar()
+    )
+    if created_by is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if created_by != enrolled_by and not _is_admin(db, enrolled_by):
+        raise HTTPException(
+            status_code=403, detail="Only the creator of the event can enroll users"
+        )
+
+    user_ids = list(dict.fromkeys(user_ids))
+    found = _existing_ids(db, CS_Users.id, user_ids)
+    new = {
+        user_id
+        for user_id, _ in _add_memberships(
+            db, [(user_id, event_id) for user_id in user_ids if user_id in found]
+        )
+    }
+    record_membership_changes(db, {event_id: len(new)})
+    db.commit()
+    if new:
+        response_cache.invalidate(event_tag(event_id))
+
+    return [
+        {
+            "user_id": user_id,
+            "status": (
+                "joined"
+                if user_id in new
+                else "already_joined" if user_id in found else "not_found"
+            ),
+        }
+        for user_id in user_ids
+    ]
+
+
+def create_events(db: Session, created_by: int, events: List[dict]) -> List[dict]:
+    """
+    Method to create many events with their props in one transaction.
+
+    Each event dict holds the `CS_Events` columns and a list of {"name", "value"} props.
+    """
+    rows = [
+        CS_Events(
+            created_by=created_by,
+            **{key: value for key, value in details.items() if key != "props"},
+        )
+        for details in events
+    ]
+    # One flush inserts all the events as a batch and fetches their ids
+    db.add_all(rows)
+    db.flush()
+    add_event_stats(db, [row.id for row in rows])
+    db.add_all(
+        CS_EventProps(event_id=row.id, prop_name=prop["name"], prop_value=prop["value"])
+        for row, details in zip(rows, events)
+        for prop in details.get("props", [])
+    )
+    # Serialize before the commit expires the rows
+    created = [
+        serialize_event(row, list(details.get("props", [])))
+        for row, details in zip(rows, events)
+    ]
+    db.commit()
+    response_cache.invalidate(EVENTS_TAG)
+    return created
+
+
+def prepare_checkin(db: Session, user_id: int, event_id: int) -> dict:
+    """Method to validate a check-in and compute the streak it results in."""
     # Fetch user-event record
     user_event = (
         db.query(CS_UserEvents)
@@ -203,50 +378,289 @@ async def mark_event_completed(db: Session, user_id: int, event_id: int) -> bool
     if not user_event:
         raise HTTPException(status_code=404, detail="Event not found for the user")
 
-    # Check if already marked for today
+    # Check if already marked for today, in the user's local day
+    tz_name = get_user_timezone(db, user_id)
     last_modified = user_event.modified
-    today = datetime.utcnow().date()
 
-    if last_modified and last_modified.date() == today:
+    today = local_today(tz_name)
+    if last_modified and local_date(last_modified, tz_name) == today:
         raise HTTPException(status_code=400, detail="Streak already updated for today")
 
-    # Update streak and modified timestamp
-    user_event.streak_count += 1
-    user_event.modified = datetime.utcnow()
+    # A streak that already expired (and was not reset yet, or is never reset with
+    # lazy expiry) starts over
+    if is_streak_alive(last_modified, tz_name):
+        streak_count = (user_event.streak_count or 0) + 1
+    else:
+        streak_count = 1
+    return {
+        "id": user_event.id,
+        "user_id": user_id,
+        "event_id": event_id,
+        "day": date_to_day(today),
+        "day_start": local_midnight_utc(tz_name, today),
+        "timezone": tz_name,
+        "streak_count": streak_count,
+        "modified": datetime.utcnow(),
+    }
+
+
+def apply_checkins(db: Session, checkins: List[dict]) -> List[dict]:
+    """
+    Method to write prepared check-ins, all of them in one transaction.
+
+    A single conditional UPDATE covers the whole batch, with the same guard as
+    `mark_events_completed`: a membership already marked today (e.g. by another
+    replica since it was validated) is left alone. The check-in log, the stats
+    and the cached responses only follow the rows actually updated.
+
+    Returns:
+        list: The check-ins that were written.
+    """
+    if not checkins:
+        return []
+    by_id = {checkin["id"]: checkin for checkin in checkins}
+    membership_id = CS_UserEvents.id
+
+    def per_row(key: str):
+        return case(
+            {row_id: checkin[key] for row_id, checkin in by_id.items()},
+            value=membership_id,
+        )
+
+    unmarked = [
+        membership_id.in_(by_id),
+        or_(
+            CS_UserEvents.modified.is_(None),
+            CS_UserEvents.modified < per_row("day_start"),
+        ),
+    ]
+    statement = (
+        update(CS_UserEvents)
+        .where(*unmarked)
+        .values(streak_count=per_row("streak_count"), modified=per_row("modified"))
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        updated = set(db.execute(statement.returning(membership_id)).scalars())
+    else:
+        # No RETURNING, find the matching rows first, in the same transaction
+        updated = {row_id for (row_id,) in db.query(membership_id).filter(*unmarked)}
+        db.execute(statement.where(membership_id.in_(updated)))
+
+    applied = [checkin for checkin in checkins if checkin["id"] in updated]
+    record_checkins(
+        db,
+        [
+            (checkin["user_id"], checkin["event_id"], checkin["day"])
+            for checkin in applied
+        ],
+    )
+    record_completions(db, [checkin["event_id"] for checkin in applied])
     db.commit()
+    response_cache.invalidate(*{event_tag(checkin["event_id"]) for checkin in applied})
+    return applied
+
+
+def mark_events_completed(
+    db: Session, user_id: int, event_ids: List[int]
+) -> List[dict]:
+    """
+    Method to mark many events as completed for a user in one transaction.
+
+    The check and the increment are a single conditional UPDATE over all the events,
+    matching the memberships not marked yet in the user's local today, so two
+    concurrent requests cannot both increment a streak.
+
+    Returns:
+        list: One result per distinct event id, in request order, with a status of
+        "completed", "already_completed" or "not_found" and the new streak count.
+    """
+    event_ids = list(dict.fromkeys(event_ids))
+    tz_name = get_user_timezone(db, user_id)
+    now = datetime.utcnow()
+    today = local_today(tz_name, now)
+    streak_count = CS_UserEvents.streak_count
+    unmarked = [
+        CS_UserEvents.user_id == user_id,
+        CS_UserEvents.event_id.in_(event_ids),
+        or_(
+            CS_UserEvents.modified.is_(None),
+            CS_UserEvents.modified < local_midnight_utc(tz_name, today),
+        ),
+    ]
+    statement = (
+        update(CS_UserEvents)
+        .where(*unmarked)
+        .values(
+            # A streak last marked before yesterday expired (and was not reset yet,
+            # or is never reset with lazy expiry), it starts over
+            streak_count=case(
+                (
+                    CS_UserEvents.modified >= streak_cutoff_utc(tz_name, now),
+                    func.coalesce(streak_count, 0) + 1,
+                ),
+                else_=1,
+            ),
+            modified=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if db.get_bind().dialect.update_returning:
+        rows = db.execute(statement.returning(CS_UserEvents.event_id, streak_count))
+        new_streaks = dict(rows.all())
+    else:
+        # No RETURNING, find the matching rows first, in the same transaction
+        matched = [
+            event_id
+            for (event_id,) in db.query(CS_UserEvents.event_id).filter(*unmarked)
+        ]
+        db.execute(statement.where(CS_UserEvents.event_id.in_(matched)))
+        new_streaks = dict(
+            db.query(CS_UserEvents.event_id, streak_count).filter(
+                CS_UserEvents.user_id == user_id, CS_UserEvents.event_id.in_(matched)
+            )
+        )
+
+    # Only events that were not updated pay for finding out why
+    missed = [event_id for event_id in event_ids if event_id not in new_streaks]
+    joined = set()
+    if missed:
+        joined = {
+            event_id
+            for (event_id,) in db.query(CS_UserEvents.event_id).filter(
+                CS_UserEvents.user_id == user_id, CS_UserEvents.event_id.in_(missed)
+            )
+        }
+
+    day = date_to_day(today)
+    record_checkins(db, [(user_id, event_id, day) for event_id in new_streaks])
+    record_completions(db, new_streaks, now)
+    db.commit()
+    response_cache.invalidate(*map(event_tag, new_streaks))
+
+    results = []
+    for event_id in event_ids:
+        if event_id in new_streaks:
+            status = "completed"
+        elif event_id in joined:
+            status = "already_completed"
+        else:
+            status = "not_found"
+        results.append(
+            {
+                "event_id": event_id,
+                "status": status,
+                "streak_count": new_streaks.get(event_id),
+            }
+        )
+    return results
+
+
+def mark_event_completed(db: Session, user_id: int, event_id: int) -> bool:
+    """Method to mark an event as completed for a user."""
+    result = mark_events_completed(db, user_id, [event_id])[0]
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Event not found for the user")
+    if result["status"] == "already_completed":
+        raise HTTPException(status_code=400, detail="Streak already updated for today")
 
     return {
         "message": "Streak updated successfully",
-        "streak_count": user_event.streak_count,
+        "streak_count": result["streak_count"],
     }
 
 
 def get_event_details_from_db(
-    db: Session, event_id: int, top_x: int, user_id: int
+    db: Session, event_id: int, top_x: int, user_id: int, neighbours: int = 2
 ) -> dict:
-    """Retrieve details of a specific event"""
-    # Get event details
-    event = db.query(CS_Events).filter(CS_Events.id == event_id).first()
+    """
+    Retrieve details of a specific event.
+
+    The event, its stats, the membership of the user and their timezone come from
+    one statement. The ranks, the participant count and the usernames of everyone
+    shown come from a second one: a CTE ranks the members of the event with
+    ROW_NUMBER() (ties broken by user id) and COUNT(*) OVER (), and only the top X
+    rows and the rows around the user are returned.
+    """
+    # Current timezone of the user, the latest one that is not invalidated
+    timezone = user_timezone_column(user_id)
+    event = (
+        db.query(
+            CS_Events.id,
+            CS_Events.name,
+            CS_Events.description,
+            CS_Events.created_by,
+            CS_Events.is_private,
+            CS_Events.flags,
+            CS_Events.created_at,
+            CS_UserEvents.id.label("membership_id"),
+            CS_UserEvents.streak_count,
+            CS_UserEvents.modified,
+            timezone.label("timezone"),
+            CS_EventStats.max_streak,
+            CS_EventStats.completions_day,
+            CS_EventStats.completions_today,
+        )
+        .outerjoin(
+            CS_UserEvents,
+            and_(
+                CS_UserEvents.event_id == CS_Events.id,
+                CS_UserEvents.user_id == user_id,
+            ),
+        )
+        .outerjoin(CS_EventStats, CS_EventStats.event_id == CS_Events.id)
+        .filter(CS_Events.id == event_id)
+        .first()
+    )
     if not event:
         return {"error": "Event not found"}
 
-    # Get top X users by streak count
-    top_users = (
-        db.query(CS_UserEvents)
-        .options(joinedload(CS_UserEvents.user))
-        .filter(CS_UserEvents.event_id == event_id)
-        .order_by(CS_UserEvents.streak_count.desc())
-        .limit(top_x)
-        .all()
+    streak_count = effective_streak_column(db)
+    ranked = (
+        select(
+            CS_UserEvents.user_id,
+            streak_count.label("streak_count"),
+            func.row_number()
+            .over(order_by=(streak_count.desc(), CS_UserEvents.user_id))
+            .label("rank"),
+            func.count().over().label("user_counts"),
+        )
+        .where(CS_UserEvents.event_id == event_id)
+        .cte("ranked")
+    )
+    user_rank = (
+        select(ranked.c.rank).where(ranked.c.user_id == user_id).scalar_subquery()
     )
+    shown = db.execute(
+        select(
+            ranked.c.rank,
+            ranked.c.user_id,
+            ranked.c.streak_count,
+            ranked.c.user_counts,
+            CS_Users.username,
+            user_rank.label("user_rank"),
+        )
+        .join(CS_Users, CS_Users.id == ranked.c.user_id)
+        .where(
+            or_(
+                ranked.c.rank <= top_x,
+                ranked.c.rank.between(user_rank - neighbours, user_rank + neighbours),
+            )
+        )
+        .order_by(ranked.c.rank)
+    ).all()
+    user_counts = shown[0].user_counts if shown else 0
+    rank = shown[0].user_rank if shown else None
 
     users = [
         {
-            "userid": user_event.user_id,
-            "username": user_event.user.username,
-            "streak_count": user_event.streak_count,
+            "userid": row.user_id,
+            "username": row.username,
+            "streak_count": row.streak_count,
         }
-        for user_event in top_users
+        for row in shown
+        if row.rank <= top_x
     ]
 
     # Get user's details for the event
@@ -254,36 +668,34 @@ def get_event_details_from_db(
     #     #2. If yes, get the streak count, last modified timestamp and rank
     #     #3. If no, add status as "Not part of the event"
     #     #4. If not modified today, set param to update streak
-
-    # current_user_id = get_user_id(current_user, db)
-
-    user_event = (
-        db.query(CS_UserEvents)
-        .filter(CS_UserEvents.event_id == event_id, CS_UserEvents.user_id == user_id)
-        .first()
-    )
-
-    if user_event:
+    if event.membership_id is not None:
+        tz_name = event.timezone or DEFAULT_TIMEZONE
         user_details = {
-            "streak_count": user_event.streak_count,
-            "last_modified": user_event.modified,
-            "rank": next((i for i, x in enumerate(users) if x["userid"] == user_id), -1)
-            + 1,
+            "streak_count": effective_streak(
+                event.streak_count, event.modified, tz_name
+            ),
+            "last_modified": event.modified,
+            "rank": rank or 0,
             "status": "Part of the event",
             "request_update_streak": (
-                user_event.modified.date() != datetime.utcnow().date()
-                if user_event.modified
+                local_date(event.modified, tz_name) != local_today(tz_name)
+                if event.modified
                 else True
             ),
+            "nearby_users": [
+                {
+                    "rank": row.rank,
+                    "userid": row.user_id,
+                    "username": row.username,
+                    "streak_count": row.streak_count,
+                }
+                for row in shown
+                if abs(row.rank - rank) <= neighbours
+            ],
         }
     else:
         user_details = {"status": "Not part of the event"}
 
-    # check user counts in event
-    user_counts = (
-        db.query(CS_UserEvents).filter(CS_UserEvents.event_id == event_id).count()
-    )
-
     return {
         "event_id": event.id,
         "name": event.name,
@@ -295,4 +707,26 @@ def get_event_details_from_db(
         "top_users": users,
         "user_details": user_details,
         "user_counts": user_counts,
+        "max_streak": event.max_streak or 0,
+        "completions_today": completions_on(
+            event.completions_day, event.completions_today or 0, stats_day()
+        ),
     }
+
+
+# Async versions for the route handlers, see `run_in_async_session`
+create_event_async = run_in_async_session(create_event)
+get_events_from_db_async = run_in_async_session(get_events_from_db)
+get_user_created_events_async = run_in_async_session(get_user_created_events)
+get_user_joined_events_async = run_in_async_session(get_user_joined_events)
+join_event_async = run_in_async_session(join_event)
+exit_event_async = run_in_async_session(exit_event)
+join_events_async = run_in_async_session(join_events)
+exit_events_async = run_in_async_session(exit_events)
+enroll_users_async = run_in_async_session(enroll_users)
+create_events_async = run_in_async_session(create_events)
+mark_event_completed_async = run_in_async_session(mark_event_completed)
+mark_events_completed_async = run_in_async_session(mark_events_completed)
+prepare_checkin_async = run_in_async_session(prepare_checkin)
+apply_checkins_async = run_in_async_session(apply_checkins)
+get_event_details_from_db_async = run_in_async_session(get_event_details_from_db)
@@ -0,0 +1,123 @@
+"""
+This module contains the process-wide cache of user identities.
+
+Authenticated routes turn the JWT `sub` (a username or email) into a user on every
+request. `IdentityCache` keeps the resolved profile, or the fact that no user has
+that identity, in a bounded LRU with a TTL so repeated requests skip the `cs_users`
+lookup. Entries are dropped on signup (`create_user`) and whenever a `cs_users` row
+is updated (`update_password_hash`), the TTL bounds how long other replicas can
+serve a stale profile.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.metrics import registry
+
+
+class IdentityCache:
+    """Bounded LRU+TTL map from a username or email to a user profile dict."""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # identity -> (expires_at, profile), profile is None for unknown identities
+        self._entries: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._identities_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Requests whose token carried the user id, so no lookup was needed at all
+        self.token_hits = 0
+
+    def get(self, identity: str) -> Tuple[bool, Optional[dict]]:
+        """Return (found, profile) for an identity, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(identity)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._discard(identity)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(identity)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, identity: str, profile: Optional[dict]):
+        """Store the profile (or None) resolved for an identity."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._discard(identity)
+            self._entries[identity] = (time.monotonic() + self.ttl_seconds, profile)
+            if profile is not None:
+                self._identities_by_user.setdefault(profile["id"], set()).add(identity)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def record_token_hit(self):
+        """Count a request that was resolved from the user id in its token."""
+        with self._lock:
+            self.token_hits += 1
+
+    def invalidate(self, *identities: str):
+        """Drop the entries of some identities, e.g. the username and email of a signup."""
+        with self._lock:
+            for identity in identities:
+                self._discard(identity)
+
+    def invalidate_user(self, user_id: int):
+        """Drop every entry that resolved to a user, after the user was updated."""
+        with self._lock:
+            for identity in self._identities_by_user.pop(user_id, set()):
+                self._entries.pop(identity, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._identities_by_user.clear()
+            self.hits = self.misses = self.evictions = self.token_hits = 0
+
+    def stats(self) -> dict:
+        """Return the hit/miss counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "token_hits": self.token_hits,
+                "size": len(self._entries),
+            }
+
+    def _discard(self, identity: str):
+        entry = self._entries.pop(identity, None)
+        if entry is not None and entry[1] is not None:
+            identities = self._identities_by_user.get(entry[1]["id"])
+            if identities is not None:
+                identities.discard(identity)
+                if not identities:
+                    del self._identities_by_user[entry[1]["id"]]
+
+
+identities = IdentityCache(
+    settings.identity_cache_size, settings.identity_cache_ttl_seconds
+)
+
+
+@registry.collector(
+    "identity_cache_events_total", "counter", "Identity cache lookups by outcome."
+)
+def _identity_cache_events():
+    stats = identities.stats()
+    for outcome in ("hits", "misses", "evictions", "token_hits"):
+        yield {"outcome": outcome}, stats[outcome]
+
+
+@registry.collector("identity_cache_size", "gauge", "Entries in the identity cache.")
+def _identity_cache_size():
+    yield {}, identities.stats()["size"]
@@ -0,0 +1,128 @@
+"""
+This module contains batched loaders used by the service layer.
+
+Each loader takes a list of ids and fetches the related rows for all of them in a
+single query, so listing endpoints issue a fixed number of queries regardless of
+how many events they return.
+"""
+
+from typing import Dict, Iterable, List
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import CS_Events, CS_EventProps, CS_EventStats, CS_UserEvents
+from app.services.event_stats import completions_on, stats_day
+from app.services.streaks import effective_streak
+from app.services.timezones import DEFAULT_TIMEZONE, get_user_timezone
+
+
+def load_event_props(db: Session, event_ids: Iterable[int]) -> Dict[int, List[dict]]:
+    """Method to fetch the props of many events, grouped by event id."""
+    event_ids = list(event_ids)
+    props_by_event = {event_id: [] for event_id in event_ids}
+    if not event_ids:
+        return props_by_event
+
+    rows = (
+        db.query(CS_EventProps.event_id, CS_EventProps.prop_name, CS_EventProps.prop_value)
+        .filter(CS_EventProps.event_id.in_(event_ids))
+        .order_by(CS_EventProps.id)
+        .all()
+    )
+    for event_id, prop_name, prop_value in rows:
+        props_by_event[event_id].append({"name": prop_name, "value": prop_value})
+
+    return props_by_event
+
+
+def load_user_events(
+    db: Session, user_id: int, event_ids: Iterable[int]
+) -> Dict[int, CS_UserEvents]:
+    """Method to fetch the user's membership rows for many events, keyed by event id."""
+    event_ids = list(event_ids)
+    if not event_ids:
+        return {}
+
+    rows = (
+        db.query(CS_UserEvents)
+        .filter(
+            CS_UserEvents.user_id == user_id,
+            CS_UserEvents.event_id.in_(event_ids),
+        )
+        .all()
+    )
+    return {row.event_id: row for row in rows}
+
+
+def load_event_stats(db: Session, event_ids: Iterable[int]) -> Dict[int, dict]:
+    """Method to fetch the stats of many events, keyed by event id."""
+    event_ids = list(event_ids)
+    stats_by_event = {
+        event_id: {"participants": 0, "completions_today": 0, "max_streak": 0}
+        for event_id in event_ids
+    }
+    if not event_ids:
+        return stats_by_event
+
+    day = stats_day()
+    for row in db.query(CS_EventStats).filter(CS_EventStats.event_id.in_(event_ids)):
+        stats_by_event[row.event_id] = {
+            "participants": row.participants,
+            "completions_today": completions_on(
+                row.completions_day, row.completions_today, day
+            ),
+            "max_streak": row.max_streak,
+        }
+    return stats_by_event
+
+
+def serialize_event(event: CS_Events, props: List[dict]) -> dict:
+    """Method to build the response dict shared by the event listing endpoints."""
+    return {
+        "id": event.id,
+        "name": event.name,
+        "description": event.description,
+        "created_by": event.created_by,
+        "is_private": event.is_private,
+        "flags": event.flags,
+        "created_at": event.created_at,
+        "props": props,
+    }
+
+
+def load_events_with_props(db: Session, events: List[CS_Events]) -> List[dict]:
+    """Method to serialize events with their props and stats using two extra queries."""
+    event_ids = [event.id for event in events]
+    props_by_event = load_event_props(db, event_ids)
+    stats_by_event = load_event_stats(db, event_ids)
+    return [
+        {**serialize_event(event, props_by_event[event.id]), **stats_by_event[event.id]}
+        for event in events
+    ]
+
+
+def load_events_with_streaks(
+    db: Session, events: List[CS_Events], user_id: int
+) -> List[dict]:
+    """Method to serialize events with their props, stats and the user's streak count."""
+    event_ids = [event.id for event in events]
+    props_by_event = load_event_props(db, event_ids)
+    stats_by_event = load_event_stats(db, event_ids)
+    user_events = load_user_events(db, user_id, event_ids)
+    tz_name = (
+        get_user_timezone(db, user_id)
+        if settings.lazy_streak_expiry and user_events
+        else DEFAULT_TIMEZONE
+    )
+
+    result = []
+    for event in events:
+        item = serialize_event(event, props_by_event[event.id])
+        item.update(stats_by_event[event.id])
+        user_event = user_events.get(event.id)
+        item["streak_count"] = (
+            effective_streak(user_event.streak_count, user_event.modified, tz_name)
+            if user_event
+            else 0
+        )
+        result.append(item)
+    return result
@@ -0,0 +1,75 @@
+"""
+This module contains helpers for keyset (cursor) pagination.
+
+Pages are ordered newest first by (created_at, id), so clients that only read the
+first page still see the latest rows. The cursor handed to clients is an opaque
+url-safe token that encodes the sort key of the last row of the previous page, so
+fetching any page is a backward range scan of the (created_at, id) index instead of
+an OFFSET over the whole table.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Method to encode the sort key of a row into an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Method to decode a cursor produced by `encode_cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, ValueError, TypeError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        ) from exc
+
+
+def paginate(
+    query: Query, model: Any, limit: int, cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Apply keyset pagination on (created_at, id), newest first, to a query.
+
+    Args:
+        query (Query): The filtered query to paginate.
+        model: The mapped class (or aliased entity) exposing `created_at` and `id` columns.
+        limit (int): The page size.
+        cursor (str, optional): The cursor returned with the previous page.
+
+    Returns:
+        tuple: The rows of the page and the cursor for the next page (None on the last page).
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(
+            or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < row_id),
+            )
+        )
+
+    rows = (
+        query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    )
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,116 @@
+"""
+This module contains the streak validity rules shared by the read and write paths.
+
+A streak is alive while it was last marked yesterday or today in the user's local
+day. With `lazy_streak_expiry` enabled the stored `streak_count` is never reset in
+bulk, the read paths report the effective streak computed from `modified` instead,
+in Python (`effective_streak`) or in SQL (`effective_streak_column`).
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.models import CS_UserEvents, CS_UserProps
+from app.services.timezones import (
+    DEFAULT_TIMEZONE,
+    TIMEZONE_PROP,
+    local_date,
+    local_today,
+    streak_cutoff_utc,
+)
+
+
+def is_streak_alive(modified: datetime, tz_name: str, now: datetime = None) -> bool:
+    """Method to check if a streak last marked at `modified` (naive UTC) is alive."""
+    if modified is None:
+        return False
+    yesterday = local_today(tz_name, now) - timedelta(days=1)
+    return local_date(modified, tz_name) >= yesterday
+
+
+def effective_streak(
+    streak_count: int, modified: datetime, tz_name: str, now: datetime = None
+) -> int:
+    """Method to get the streak to report for a stored streak count."""
+    streak_count = streak_count or 0
+    if not settings.lazy_streak_expiry or not streak_count:
+        return streak_count
+    return streak_count if is_streak_alive(modified, tz_name, now) else 0
+
+
+def user_timezone_column(user_id_column):
+    """Method to get a SQL expression of a user's timezone, NULL for UTC."""
+    return (
+        select(CS_UserProps.attribute_value)
+        .where(
+            CS_UserProps.user_id == user_id_column,
+            CS_UserProps.attribute_name == TIMEZONE_PROP,
+            CS_UserProps.modified.is_(None),
+        )
+        .order_by(CS_UserProps.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def streak_cutoff_column(db, now: datetime = None):
+    """
+    Method to get a SQL expression of the cutoff of the user of a `cs_user_events`
+    row, the oldest `modified` that keeps their streak alive.
+
+    The cutoff of every timezone in use is computed here and picked by the
+    timezone of the member. `db` is a Session or a Connection (migrations).
+    """
+    now = now or datetime.utcnow()
+    tz_names = db.execute(
+        select(CS_UserProps.attribute_value)
+        .where(
+            CS_UserProps.attribute_name == TIMEZONE_PROP,
+            CS_UserProps.modified.is_(None),
+        )
+        .distinct()
+    ).scalars()
+    cutoffs = {tz_name: streak_cutoff_utc(tz_name, now) for tz_name in tz_names}
+    cutoff = literal(streak_cutoff_utc(DEFAULT_TIMEZONE, now))
+    if not cutoffs:
+        return cutoff
+    return case(
+        cutoffs, value=user_timezone_column(CS_UserEvents.user_id), else_=cutoff
+    )
+
+
+def effective_streak_column(db, now: datetime = None):
+    """
+    Method to get a SQL expression of the effective streak of a `cs_user_events` row.
+
+    Without lazy expiry it is the stored streak. With it, a streak marked before
+    the start of the local yesterday of its user counts as 0.
+    """
+    streak_count = func.coalesce(CS_UserEvents.streak_count, 0)
+    if not settings.lazy_streak_expiry:
+        return streak_count
+    cutoff = streak_cutoff_column(db, now)
+    return case((CS_UserEvents.modified >= cutoff, streak_count), else_=0)
+
+
+def get_user_timezones(db: Session, user_ids: Iterable[int]) -> Dict[int, str]:
+    """Method to get the timezone of many users, users without one map to UTC."""
+    user_ids = list(user_ids)
+    timezones = dict.fromkeys(user_ids, DEFAULT_TIMEZONE)
+    if not user_ids:
+        return timezones
+
+    rows = (
+        db.query(CS_UserProps.user_id, CS_UserProps.attribute_value)
+        .filter(
+            CS_UserProps.user_id.in_(user_ids),
+            CS_UserProps.attribute_name == TIMEZONE_PROP,
+            CS_UserProps.modified.is_(None),
+        )
+        .order_by(CS_UserProps.id)
+        .all()
+    )
+    timezones.update(rows)
+    return timezones
@@ -0,0 +1,115 @@
+"""
+This module contains the helpers for evaluating streaks in each user's local day.
+
+A user's timezone is stored as a `timezone` row in `cs_user_props` (users without
+one are on UTC). `modified` timestamps stay naive UTC in the database, they are only
+converted when deciding which local day a check-in belongs to.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.response_cache import event_tag, response_cache
+from app.db.models import CS_UserEvents, CS_UserProps
+from app.db.session import run_in_async_session
+
+TIMEZONE_PROP = "timezone"
+DEFAULT_TIMEZONE = "UTC"
+
+
+def get_zone(name: str) -> ZoneInfo:
+    """Method to resolve an IANA timezone name, falling back to UTC."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def validate_timezone(name: str) -> str:
+    """Method to check a timezone name supplied by a client."""
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown timezone"
+        ) from exc
+    return name
+
+
+def get_user_timezone(db: Session, user_id: int) -> str:
+    """Method to get the timezone name of a user."""
+    value = (
+        db.query(CS_UserProps.attribute_value)
+        .filter(
+            CS_UserProps.user_id == user_id,
+            CS_UserProps.attribute_name == TIMEZONE_PROP,
+            CS_UserProps.modified.is_(None),
+        )
+        .order_by(CS_UserProps.id.desc())
+        .limit(1)
+        .scalar()
+    )
+    return value or DEFAULT_TIMEZONE
+
+
+def set_user_timezone(db: Session, user_id: int, name: str) -> str:
+    """
+    Method to store the timezone of a user, invalidating the previous one.
+
+    The effective streaks of the user change with their local day, so the cached
+    details of every event they joined are invalidated too.
+    """
+    name = validate_timezone(name)
+    now = datetime.utcnow()
+    db.query(CS_UserProps).filter(
+        CS_UserProps.user_id == user_id,
+        CS_UserProps.attribute_name == TIMEZONE_PROP,
+        CS_UserProps.modified.is_(None),
+    ).update({"modified": now}, synchronize_session=False)
+    db.add(
+        CS_UserProps(
+            user_id=user_id,
+            attribute_name=TIMEZONE_PROP,
+            attribute_value=name,
+            timestamp=now,
+        )
+    )
+    db.commit()
+    event_ids = db.query(CS_UserEvents.event_id).filter(
+        CS_UserEvents.user_id == user_id
+    )
+    response_cache.invalidate(*{event_tag(event_id) for (event_id,) in event_ids})
+    return name
+
+
+def local_date(utc_naive: datetime, tz_name: str) -> date:
+    """Method to get the local date of a naive UTC timestamp."""
+    return utc_naive.replace(tzinfo=timezone.utc).astimezone(get_zone(tz_name)).date()
+
+
+def local_today(tz_name: str, now: datetime = None) -> date:
+    """Method to get the current date in a timezone."""
+    return local_date(now or datetime.utcnow(), tz_name)
+
+
+def local_midnight_utc(tz_name: str, day: date) -> datetime:
+    """Method to get the naive UTC timestamp at which a local day starts."""
+    local_midnight = datetime.combine(day, time.min, tzinfo=get_zone(tz_name))
+    return local_midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def streak_cutoff_utc(tz_name: str, now: datetime = None) -> datetime:
+    """
+    Method to get the oldest naive UTC `modified` that keeps a streak alive.
+
+    A streak survives if it was marked yesterday or today in the user's local day,
+    so the cutoff is the start of yesterday in that timezone.
+    """
+    yesterday = local_today(tz_name, now) - timedelta(days=1)
+    return local_midnight_utc(tz_name, yesterday)
+
+
+# Async versions for the route handlers, see `run_in_async_session`
+get_user_timezone_async = run_in_async_session(get_user_timezone)
+set_user_timezone_async = run_in_async_session(set_user_timezone)
@@ -1,14 +1,112 @@
 """This module contains the service methods for the users."""
 
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
-from app.db.models import CS_Users
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import CS_Users, CS_UserEvents
+from app.db.session import run_in_async_session
+from app.services.identity_cache import identities
+from app.services.pagination import DEFAULT_PAGE_SIZE, paginate
 
 
 def get_user_by_username(db: Session, username: str) -> CS_Users:
     """Method to get a user by their username."""
     return db.query(CS_Users).filter(CS_Users.username == username).first()
 
+def get_user_by_email(db: Session, email: str) -> CS_Users:
+    """Method to get a user by their email."""
+    return db.query(CS_Users).filter(CS_Users.email == email).first()
+
+
+def get_user_by_name_or_email(db: Session, name_or_email: str) -> CS_Users:
+    """Method to get a user by either their username or their email."""
+    return (
+        db.query(CS_Users)
+        .filter(
+            or_(
+                CS_Users.email == name_or_email,
+                CS_Users.username == name_or_email,
+            )
+        )
+        .first()
+    )
+
+
+def get_user_by_id(db: Session, user_id: int) -> CS_Users:
+    """Method to get a user by their id."""
+    return db.query(CS_Users).filter(CS_Users.id == user_id).first()
+
+
+def create_user(db: Session, username: str, email: str, password_hash: str) -> CS_Users:
+    """Method to create a user."""
+    new_user = CS_Users(username=username, email=email, password_hash=password_hash)
+    db.add(new_user)
+    db.commit()
+    db.refresh(new_user)
+    # Either identity may be cached as unknown from an earlier lookup
+    identities.invalidate(username, email)
+    return new_user
+
+
+def update_password_hash(
+    db: Session, user_id: int, old_hash: str, new_hash: str
+) -> bool:
+    """Method to replace a password hash, unless it was changed meanwhile."""
+    updated = (
+        db.query(CS_Users)
+        .filter(CS_Users.id == user_id, CS_Users.password_hash == old_hash)
+        .update({"password_hash": new_hash}, synchronize_session=False)
+    )
+    db.commit()
+    if updated:
+        identities.invalidate_user(user_id)
+    return updated == 1
+
+
+def get_user_event_memberships(db: Session, user_id: int) -> List[CS_UserEvents]:
+    """Method to get the events joined by a user, with the events loaded."""
+    return (
+        db.query(CS_UserEvents)
+        .options(joinedload(CS_UserEvents.event))
+        .filter(CS_UserEvents.user_id == user_id)
+        .all()
+    )
+
+
+def _load_user_profile(db: Session, name_or_email: str) -> Optional[dict]:
+    """Method to read a user profile from the database and cache it."""
+    user = get_user_by_name_or_email(db, name_or_email)
+    profile = None
+    if user:
+        profile = {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "flags": user.flags,
+            "created_at": user.created_at,
+        }
+    identities.put(name_or_email, profile)
+    return profile
+
+
+def get_user_profile(name_or_email: str, db: Session) -> Optional[dict]:
+    """
+    Retrieve the profile of a user by username or email, through the identity cache.
+
+    Args:
+        name_or_email (str): The username or email of the user.
+        db (Session): The database session to use on a cache miss.
+
+    Returns:
+        dict: The id, username, email, flags and created_at of the user, otherwise None.
+    """
+    found, profile = identities.get(name_or_email)
+    if found:
+        return profile
+    return _load_user_profile(db, name_or_email)
+
+
 def get_user_id(name_or_email: str, db: Session) -> int:
     """
     Retrieve the user ID based on the provided username or email.
@@ -20,19 +118,67 @@ def get_user_id(name_or_email: str, db: Session) -> int:
     Returns:
         int: The ID of the user if found, otherwise None.
     """
-    if user := (
-        db.query(CS_Users)
-        .filter(
-            or_(
-                CS_Users.email == name_or_email,
-                CS_Users.username == name_or_email,
-            )
-        )
-        .first()
-    ):
-        return user.id
+    if profile := get_user_profile(name_or_email, db):
+        return profile["id"]
     return None
 
 def is_user_valid(db: Session, user_id: int) -> bool:
     """Method to check if a user is valid."""
     return db.query(CS_Users).filter(CS_Users.id == user_id).first() is not None
+
+
+def get_users_from_db(
+    db: Session,
+    flags: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Method to get a page of users and the cursor of the next page."""
+    # Select only the listed columns, no need to build full ORM objects
+    query = db.query(
+        CS_Users.id,
+        CS_Users.username,
+        CS_Users.email,
+        CS_Users.flags,
+        CS_Users.created_at,
+    )
+    if flags:
+        query = query.filter(CS_Users.flags == flags)
+
+    users, next_cursor = paginate(query, CS_Users, limit, cursor)
+    return [
+        {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "flags": user.flags,
+        }
+        for user in users
+    ], next_cursor
+
+
+# Async versions for the route handlers, see `run_in_async_session`
+get_user_by_username_async = run_in_async_session(get_user_by_username)
+get_user_by_email_async = run_in_async_session(get_user_by_email)
+get_user_by_name_or_email_async = run_in_async_session(get_user_by_name_or_email)
+get_user_by_id_async = run_in_async_session(get_user_by_id)
+create_user_async = run_in_async_session(create_user)
+update_password_hash_async = run_in_async_session(update_password_hash)
+get_user_event_memberships_async = run_in_async_session(get_user_event_memberships)
+get_users_from_db_async = run_in_async_session(get_users_from_db)
+is_user_valid_async = run_in_async_session(is_user_valid)
+
+
+async def get_user_profile_async(name_or_email: str, db: AsyncSession) -> Optional[dict]:
+    """Async version of `get_user_profile`, a cache hit does not touch the session."""
+    found, profile = identities.get(name_or_email)
+    if found:
+        return profile
+    return await db.run_sync(lambda session: _load_user_profile(session, name_or_email))
+
+
+async def get_user_id_async(name_or_email: str, db: AsyncSession) -> int:
+    """Async version of `get_user_id`."""
+    if profile := await get_user_profile_async(name_or_email, db):
+        return profile["id"]
+    return None
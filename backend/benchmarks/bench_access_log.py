@@ -0,0 +1,142 @@
+"""
+Latency benchmark of the request logging middleware.
+
+Sends sequential requests through httpx's ASGI transport to a small app (a GET and
+a JSON POST) wrapped in one of two stacks, with the log records formatted and
+written to os.devnull at INFO:
+
+    legacy: the previous LogRequestsMiddleware (BaseHTTPMiddleware, parses the JSON
+            body and dumps headers) plus the `log_blocked_requests` http middleware
+    asgi:   `AccessLogMiddleware`
+
+For each stack it prints the mean and p50/p99 latency per request.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_access_log --requests 3000
+"""
+
+import os
+
+os.environ.setdefault("SECRET_KEY", "benchmark_secret_key")
+os.environ.setdefault("TOKEN_REFRESH_KEY", "benchmark_refresh_key")
+os.environ.setdefault("DATABASE_URL", "sqlite:///./database/community_streak.db")
+os.environ.setdefault("DEBUG_LEVEL", "30")
+
+# pylint: disable=wrong-import-position
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from app.core.middlewares import AccessLogMiddleware, access_logger
+
+STACKS = ("legacy", "asgi")
+
+legacy_logger = logging.getLogger("bench.middleware")
+
+
+class LegacyLogRequestsMiddleware(BaseHTTPMiddleware):
+    """Copy of the previous request logging middleware"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        client_ip = request.client.host if request.client else "Unknown"
+        headers = dict(request.headers)
+        query_params = dict(request.query_params)
+        try:
+            body = await request.json()
+        except Exception:  # pylint: disable=broad-except
+            body = None
+        legacy_logger.info(
+            "Received request: %s %s\nClient IP: %s\nHeaders: %s\nQuery Params: %s"
+            "\nPayload: %s",
+            request.method,
+            request.url,
+            client_ip,
+            headers,
+            query_params,
+            body,
+        )
+        response = await call_next(request)
+        legacy_logger.info(
+            "Response: %s - %s\nProcessing Time: %.2fs",
+            response.status_code,
+            response.headers.get("content-type", "Unknown"),
+            time.time() - start_time,
+        )
+        return response
+
+
+def build_app(stack: str) -> FastAPI:
+    """Small app wrapped in the middleware of a stack"""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    @app.post("/items")
+    async def create_item(request: Request):
+        return await request.json()
+
+    if stack == "legacy":
+
+        @app.middleware("http")
+        async def log_blocked_requests(request: Request, call_next):
+            response = await call_next(request)
+            if response.status_code == 403:
+                legacy_logger.warning("Blocked request from %s", request.client.host)
+            return response
+
+        app.add_middleware(LegacyLogRequestsMiddleware)
+    else:
+        app.add_middleware(AccessLogMiddleware)
+    return app
+
+
+async def run_stack(stack: str, requests: int) -> list:
+    """Return the latency of each request, in milliseconds"""
+    transport = httpx.ASGITransport(app=build_app(stack))
+    payload = {"name": "Morning run", "description": "x" * 200}
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://b") as client:
+        for i in range(requests):
+            started = time.perf_counter()
+            if i % 2:
+                response = await client.post("/items", json=payload)
+            else:
+                response = await client.get(f"/items/{i}")
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+    return latencies
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    # pylint: disable=consider-using-with
+    handler = logging.StreamHandler(open(os.devnull, "w", encoding="utf-8"))
+    for logger in (legacy_logger, access_logger):
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(handler)
+
+    for stack in STACKS:
+        asyncio.run(run_stack(stack, 200))  # Warm up
+        latencies = sorted(asyncio.run(run_stack(stack, args.requests)))
+        print(
+            f"{stack:>8}: mean {statistics.mean(latencies):.3f} ms, "
+            f"p50 {latencies[len(latencies) // 2]:.3f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms "
+            f"({args.requests} requests)"
+        )
+
+
+if __name__ == "__main__":
+    main()
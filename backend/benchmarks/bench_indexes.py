@@ -0,0 +1,212 @@
+"""
+Benchmark of the service layer queries before and after the hot lookup indexes.
+
+Seeds a throwaway SQLite database, runs every read/write service method against the
+schema without the indexes of migration 2, applies the migration and runs them again.
+For each method it prints the mean latency and the SQLite query plan of every
+statement it issued.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_indexes --users 20000 --events 2000 --memberships 200000
+"""
+
+import os
+
+os.environ.setdefault("SECRET_KEY", "benchmark_secret_key")
+os.environ.setdefault("TOKEN_REFRESH_KEY", "benchmark_refresh_key")
+os.environ.setdefault("DATABASE_URL", "sqlite:///./database/community_streak.db")
+os.environ.setdefault("DEBUG_LEVEL", "30")
+
+# pylint: disable=wrong-import-position
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+from app.db.migrations import HOT_LOOKUP_INDEXES, MIGRATIONS, run_migrations
+from app.db.models import CS_Users, CS_Events, CS_EventProps, CS_UserEvents
+from app.services.events_svc import (
+    get_events_from_db,
+    get_user_created_events,
+    get_user_joined_events,
+    get_event_details_from_db,
+    join_event,
+    exit_event,
+    mark_event_completed,
+)
+from app.services.users_svc import get_user_id
+
+INDEX_MIGRATION = 2
+
+
+def drop_hot_lookup_indexes(engine):
+    """Bring a fresh database back to the pre-migration-2 index set"""
+    with engine.begin() as conn:
+        for table, names in HOT_LOOKUP_INDEXES.items():
+            for index in table.indexes:
+                if index.name in names:
+                    index.drop(conn, checkfirst=True)
+        conn.execute(text("DELETE FROM cs_schema_version WHERE version >= :v"), {"v": INDEX_MIGRATION})
+
+
+def seed(engine, users: int, events: int, memberships: int):
+    """Bulk insert a random dataset"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(
+            insert(CS_Users),
+            [
+                {
+                    "id": i,
+                    "username": f"user{i}",
+                    "email": f"user{i}@example.com",
+                    "password_hash": "x",
+                    "flags": "regular",
+                    "created_at": now - timedelta(minutes=i),
+                }
+                for i in range(1, users + 1)
+            ],
+        )
+        conn.execute(
+            insert(CS_Events),
+            [
+                {
+                    "id": i,
+                    "name": f"event {i}",
+                    "description": "",
+                    "created_by": rng.randint(1, users),
+                    "created_at": now - timedelta(minutes=i),
+                    "is_private": i % 5 == 0,
+                    "flags": "user_created" if i % 10 else "system",
+                }
+                for i in range(1, events + 1)
+            ],
+        )
+        conn.execute(
+            insert(CS_EventProps),
+            [
+                {"event_id": i, "prop_name": "color", "prop_value": "red"}
+                for i in range(1, events + 1)
+            ],
+        )
+        pairs = set()
+        while len(pairs) < memberships:
+            pairs.add((rng.randint(1, users), rng.randint(1, events)))
+        conn.execute(
+            insert(CS_UserEvents),
+            [
+                {
+                    "user_id": user_id,
+                    "event_id": event_id,
+                    "streak_count": rng.randint(0, 365),
+                    "modified": now - timedelta(days=rng.randint(0, 3)),
+                }
+                for user_id, event_id in pairs
+            ],
+        )
+
+
+def busiest_user_and_event(engine):
+    """Pick the user with most memberships, the event with most participants and an event the user joined"""
+    with engine.connect() as conn:
+        user_id = conn.execute(
+            text("SELECT user_id FROM cs_user_events GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")
+        ).scalar()
+        event_id = conn.execute(
+            text("SELECT event_id FROM cs_user_events GROUP BY event_id ORDER BY count(*) DESC LIMIT 1")
+        ).scalar()
+        joined_event_id = conn.execute(
+            text("SELECT event_id FROM cs_user_events WHERE user_id = :u LIMIT 1"), {"u": user_id}
+        ).scalar()
+    return user_id, event_id, joined_event_id
+
+
+def cases(user_id: int, event_id: int, joined_event_id: int):
+    """The service methods to measure, as (name, callable(db)) pairs"""
+    outsider = -1  # never a member, so join and exit both take their write path
+    return [
+        ("get_user_id", lambda db: get_user_id(f"user{user_id}@example.com", db)),
+        ("get_events_from_db", lambda db: get_events_from_db(db, "user_created")),
+        ("get_user_created_events", lambda db: get_user_created_events(db, user_id)),
+        ("get_user_joined_events", lambda db: get_user_joined_events(db, user_id)),
+        (
+            "get_event_details_from_db",
+            lambda db: get_event_details_from_db(db, event_id, 100, user_id),
+        ),
+        (
+            "join_event + exit_event",
+            lambda db: (join_event(db, outsider, event_id), exit_event(db, outsider, event_id)),
+        ),
+        ("mark_event_completed", lambda db: mark_completed(db, user_id, joined_event_id)),
+    ]
+
+
+def mark_completed(db, user_id: int, event_id: int):
+    """Reset the row so every iteration takes the update path"""
+    db.query(CS_UserEvents).filter(
+        CS_UserEvents.user_id == user_id, CS_UserEvents.event_id == event_id
+    ).update({"modified": None})
+    db.commit()
+    return mark_event_completed(db, user_id, event_id)
+
+
+def measure(engine, label: str, targets: tuple, repeat: int):
+    """Run every case, print mean latency and the plan of each distinct statement"""
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    print(f"\n===== {label} =====")
+    for name, func in cases(*targets):
+        statements = []
+
+        def capture(_conn, _cursor, statement, parameters, _context, _executemany):
+            statements.append((statement, parameters))
+
+        with session_factory() as db:
+            func(db)  # warm up
+            event.listen(engine, "before_cursor_execute", capture)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func(db)
+            elapsed = (time.perf_counter() - start) / repeat
+            event.remove(engine, "before_cursor_execute", capture)
+
+        print(f"\n{name}: {elapsed * 1000:.2f} ms/call")
+        seen = set()
+        with engine.connect() as conn:
+            for statement, parameters in statements:
+                if statement in seen or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                    continue
+                seen.add(statement)
+                plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                print("  " + " ".join(statement.split())[:100])
+                for row in plan:
+                    print(f"    {row[-1]}")
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--memberships", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        run_migrations(engine)
+        drop_hot_lookup_indexes(engine)
+        print(f"Seeding {args.users} users, {args.events} events, {args.memberships} memberships...")
+        seed(engine, args.users, args.events, args.memberships)
+        targets = busiest_user_and_event(engine)
+
+        measure(engine, "before: without hot lookup indexes", targets, args.repeat)
+        version = run_migrations(engine)
+        measure(engine, f"after: migration {version} ({MIGRATIONS[-1][1]})", targets, args.repeat)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
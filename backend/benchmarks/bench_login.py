@@ -0,0 +1,152 @@
+"""
+Login throughput benchmark of the password hashing pool.
+
+Runs the application on a temporary SQLite file through httpx's ASGI transport,
+with `--clients` concurrent clients logging in for `--seconds` while a probe calls
+the sync `GET /` route every 50 ms. Two ways of running bcrypt are compared:
+
+    threadpool: the previous `run_in_threadpool`, Starlette's shared thread pool
+    pool:       `PasswordPool`, `password_workers` threads, 503 past the queue limit
+
+For each it prints the successful logins per second, the 503s, the login latency
+and the probe latency, which shows whether sync routes starve behind bcrypt.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_login --clients 50 --seconds 10 --rounds 10
+"""
+
+import os
+import tempfile
+
+BENCH_DIR = tempfile.mkdtemp(prefix="bench_login_")
+os.environ.setdefault("SECRET_KEY", "benchmark_secret_key")
+os.environ.setdefault("TOKEN_REFRESH_KEY", "benchmark_refresh_key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{BENCH_DIR}/login.db")
+os.environ.setdefault("DEBUG_LEVEL", "40")
+os.environ.setdefault("LOG_FILE", "")
+
+# pylint: disable=wrong-import-position
+import argparse
+import asyncio
+import base64
+import shutil
+import time
+import httpx
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db.models import CS_Users
+from app.db.session import engine
+from app.handlers.auth import pwd_context
+from app.handlers.passwords import PasswordPool
+from app.main import app
+from app.routes import user_routes
+
+PROFILES = ("threadpool", "pool")
+
+
+class ThreadpoolPasswords:
+    """The previous behaviour, bcrypt on Starlette's shared thread pool"""
+
+    async def hash(self, password: str) -> str:
+        """Hash a password"""
+        return await run_in_threadpool(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str):
+        """Verify a password"""
+        return await run_in_threadpool(
+            pwd_context.verify_and_update, password, password_hash
+        )
+
+
+def percentile(values: list, share: float) -> float:
+    """Value below which `share` of the values fall, in milliseconds"""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)] * 1000
+
+
+async def run_profile(profile: str, clients: int, seconds: float):
+    """Return (logins, rejected, login latencies, probe latencies)"""
+    user_routes.password_pool = (
+        ThreadpoolPasswords()
+        if profile == "threadpool"
+        else PasswordPool(settings.password_workers, settings.password_queue_size)
+    )
+    form = {"username": "bench", "password": base64.b64encode(b"secret").decode()}
+    logins, rejected, latencies, probes = 0, 0, [], []
+    deadline = time.perf_counter() + seconds
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://b", timeout=None
+    ) as client:
+
+        async def login_client():
+            nonlocal logins, rejected
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/users/login", data=form)
+                if response.status_code == 503:
+                    rejected += 1
+                    await asyncio.sleep(float(response.headers["Retry-After"]))
+                    continue
+                response.raise_for_status()
+                logins += 1
+                latencies.append(time.perf_counter() - started)
+
+        async def probe():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                (await client.get("/")).raise_for_status()
+                probes.append(time.perf_counter() - started)
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(probe(), *(login_client() for _ in range(clients)))
+    return logins, rejected, latencies, probes
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rounds", type=int, default=settings.bcrypt_rounds)
+    args = parser.parse_args()
+
+    context = pwd_context.copy(bcrypt__rounds=args.rounds)
+    with sessionmaker(bind=engine)() as db:
+        db.add(
+            CS_Users(
+                username="bench",
+                email="bench@example.com",
+                password_hash=context.hash("secret"),
+            )
+        )
+        db.commit()
+
+    async def run_profiles():
+        # One event loop, the async engine pools are bound to it
+        for profile in PROFILES:
+            logins, rejected, latencies, probes = await run_profile(
+                profile, args.clients, args.seconds
+            )
+            print(
+                f"{profile:>10}: {logins / args.seconds:6.1f} logins/s, "
+                f"{rejected} x 503, login p50 {percentile(latencies, 0.5):.0f} ms "
+                f"p99 {percentile(latencies, 0.99):.0f} ms, "
+                f"probe p50 {percentile(probes, 0.5):.1f} ms "
+                f"p99 {percentile(probes, 0.99):.1f} ms "
+                f"({args.clients} clients, bcrypt rounds {args.rounds})"
+            )
+
+    try:
+        asyncio.run(run_profiles())
+    finally:
+        engine.dispose()
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
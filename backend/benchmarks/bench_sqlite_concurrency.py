@@ -0,0 +1,158 @@
+"""
+Concurrency benchmark of the SQLite engine profile.
+
+Seeds a SQLite file, then runs several processes (like the compose replicas) that
+each issue concurrent reads and check-ins through the async service methods for a
+fixed time. Each run uses a fresh copy of the seeded file and one of two profiles:
+
+    default: the previous engine, one shared pool with no pragmas
+    tuned:   `create_async_engines`, WAL + pragmas, read pool and a single writer
+
+For each profile it prints the completed operations per second and the number of
+operations that failed with "database is locked".
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_sqlite_concurrency --processes 3 --tasks 16 --seconds 10
+"""
+
+import os
+
+os.environ.setdefault("SECRET_KEY", "benchmark_secret_key")
+os.environ.setdefault("TOKEN_REFRESH_KEY", "benchmark_refresh_key")
+os.environ.setdefault("DATABASE_URL", "sqlite:///./database/community_streak.db")
+os.environ.setdefault("DEBUG_LEVEL", "30")
+
+# pylint: disable=wrong-import-position
+import argparse
+import asyncio
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.db.migrations import run_migrations
+from app.db.models import CS_UserEvents
+from app.db.session import create_async_engines
+from app.services.events_svc import get_user_joined_events, mark_event_completed
+from benchmarks.bench_indexes import seed
+
+PROFILES = ("default", "tuned")
+
+
+def build_engines(profile: str, url: str):
+    """Return the (read, write) async engines of a profile"""
+    if profile == "tuned":
+        return create_async_engines(url)
+    engine = create_async_engine(
+        url, poolclass=AsyncAdaptedQueuePool, pool_size=5, max_overflow=10
+    )
+    return engine, engine
+
+
+def check_in(db, user_id: int, event_id: int):
+    """Read-then-write transaction: clear today's mark and mark the event again"""
+    db.query(CS_UserEvents).filter(
+        CS_UserEvents.user_id == user_id, CS_UserEvents.event_id == event_id
+    ).update({"modified": None})
+    return mark_event_completed(db, user_id, event_id)
+
+
+async def worker(read_factory, write_factory, memberships, write_ratio, deadline):
+    """Issue operations until the deadline, return (completed, locked) counts"""
+    rng = random.Random()
+    completed = locked = 0
+    while time.perf_counter() < deadline:
+        user_id, event_id = rng.choice(memberships)
+        try:
+            if rng.random() < write_ratio:
+                async with write_factory() as db:
+                    await db.run_sync(check_in, user_id, event_id)
+            else:
+                async with read_factory() as db:
+                    await db.run_sync(get_user_joined_events, user_id)
+            completed += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            locked += 1
+    return completed, locked
+
+
+async def run_process(profile, url, memberships, tasks, write_ratio, seconds):
+    """One replica: concurrent tasks sharing the engines of the profile"""
+    read_engine, write_engine = build_engines(profile, url)
+    read_factory = async_sessionmaker(read_engine, expire_on_commit=False)
+    write_factory = async_sessionmaker(write_engine, expire_on_commit=False)
+    deadline = time.perf_counter() + seconds
+    results = await asyncio.gather(
+        *(
+            worker(read_factory, write_factory, memberships, write_ratio, deadline)
+            for _ in range(tasks)
+        )
+    )
+    await read_engine.dispose()
+    await write_engine.dispose()
+    return [sum(counts) for counts in zip(*results)]
+
+
+def process_main(args):
+    """Entry point of a benchmark process"""
+    return asyncio.run(run_process(*args))
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--memberships", type=int, default=20000)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template = os.path.join(tmp, "template.db")
+        engine = create_engine(f"sqlite:///{template}")
+        run_migrations(engine)
+        seed(engine, args.users, args.events, args.memberships)
+        with engine.connect() as conn:
+            memberships = [
+                tuple(row)
+                for row in conn.exec_driver_sql(
+                    "SELECT user_id, event_id FROM cs_user_events"
+                )
+            ]
+        engine.dispose()
+
+        for profile in PROFILES:
+            path = os.path.join(tmp, f"{profile}.db")
+            shutil.copy(template, path)
+            url = f"sqlite+aiosqlite:///{path}"
+            job = (
+                profile,
+                url,
+                memberships,
+                args.tasks,
+                args.write_ratio,
+                args.seconds,
+            )
+            with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+                results = pool.map(process_main, [job] * args.processes)
+            completed = sum(result[0] for result in results)
+            locked = sum(result[1] for result in results)
+            print(
+                f"{profile:>8}: {completed / args.seconds:8.1f} ops/s, "
+                f"{locked} x 'database is locked' "
+                f"({args.processes} processes x {args.tasks} tasks, "
+                f"{args.write_ratio:.0%} writes)"
+            )
+
+
+if __name__ == "__main__":
+    main()
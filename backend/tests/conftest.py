@@ -0,0 +1,97 @@
+"""
+This file contains the shared pytest fixtures.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+# before importing the app set the required env variables
+os.environ.setdefault("SECRET_KEY", "your_secret_key_value")
+os.environ.setdefault("TOKEN_REFRESH_KEY", "your_refresh_secret_key_value")
+os.environ.setdefault("DEBUG_LEVEL", "10")
+# Importing app.main migrates the configured database, always point it at a
+# throwaway file so the checked-in database/community_streak.db is never touched
+TEST_DB_DIR = tempfile.mkdtemp(prefix="community_streak_tests_")
+atexit.register(shutil.rmtree, TEST_DB_DIR, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DB_DIR}/app.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["LOG_FILE"] = ""
+
+# pylint: disable=wrong-import-position
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.session import (
+    Base,
+    create_async_engines,
+    get_async_db,
+    get_async_write_db,
+)
+from app.main import app
+from app.services.identity_cache import identities
+
+
+def memory_engine():
+    """Single-connection in-memory SQLite engine"""
+    return create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+
+@pytest.fixture(name="db")
+def db_fixture():
+    """Fresh in-memory database per test"""
+    engine = memory_engine()
+    Base.metadata.create_all(bind=engine)
+    identities.clear()
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def session_dependency(async_engine):
+    """Dependency yielding sessions of `async_engine`"""
+
+    async def dependency():
+        async with async_sessionmaker(async_engine, expire_on_commit=False)() as db:
+            yield db
+
+    return dependency
+
+
+@pytest.fixture(name="app_client")
+def app_client_fixture():
+    """
+    Open an HTTP client on the app served from a SQLite file, e.g.
+    `async with app_client(path) as client`. Further dependency overrides set
+    inside the block are cleared on exit.
+    """
+
+    @asynccontextmanager
+    async def open_client(path):
+        read_engine, write_engine = create_async_engines(f"sqlite+aiosqlite:///{path}")
+        app.dependency_overrides[get_async_db] = session_dependency(read_engine)
+        app.dependency_overrides[get_async_write_db] = session_dependency(write_engine)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://t"
+            ) as client:
+                yield client
+        finally:
+            app.dependency_overrides.clear()
+            await read_engine.dispose()
+            await write_engine.dispose()
+
+    return open_client
@@ -0,0 +1,93 @@
+"""
+This file contains the tests for the token decoding and its cache.
+"""
+
+import time
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from app.handlers import auth
+from app.handlers.auth import (
+    TokenCache,
+    create_access_token,
+    create_refresh_token,
+    decode_access_token,
+    decode_refresh_token,
+    verified_tokens,
+)
+
+
+@pytest.fixture(name="decodes")
+def decodes_fixture(monkeypatch):
+    """Count the signature checks, starting from an empty token cache"""
+    verified_tokens.clear()
+    calls = []
+    decode = auth.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    yield calls
+    verified_tokens.clear()
+
+
+def test_signature_is_checked_once_per_token(decodes):
+    """Repeated decodes of a token are served from the cache"""
+    token = create_access_token({"sub": "ada@example.com", "uid": 1})
+    for _ in range(3):
+        assert auth._decode_current_token(token)["uid"] == 1
+    assert decode_access_token(token)["sub"] == "ada@example.com"
+    assert decodes == [token]
+    assert verified_tokens.stats() == {"hits": 3, "misses": 1, "size": 1}
+
+    # Callers get their own copy of the claims
+    auth._decode_current_token(token)["uid"] = 2
+    assert auth._decode_current_token(token)["uid"] == 1
+
+
+def test_invalid_tokens_are_not_cached(decodes):
+    """Tampered and expired tokens are rejected every time"""
+    token = create_access_token({"sub": "ada@example.com"})
+    tampered = token[:-2] + ("A" if token[-2] != "A" else "B") + token[-1]
+    expired = create_access_token(
+        {"sub": "ada@example.com"}, expires_delta=timedelta(seconds=-1)
+    )
+    for bad in (tampered, tampered, expired):
+        with pytest.raises(HTTPException) as exc:
+            auth._decode_current_token(bad)
+        assert exc.value.status_code == 401
+    assert len(decodes) == 3
+    assert verified_tokens.stats()["size"] == 0
+
+
+def test_refresh_tokens_use_the_refresh_key(decodes):
+    """Refresh tokens only decode as refresh tokens, access tokens only as access"""
+    refresh = create_refresh_token({"sub": "ada@example.com", "uid": 1})
+    access = create_access_token({"sub": "ada@example.com", "uid": 1})
+    assert decode_refresh_token(refresh)["uid"] == 1
+    assert decode_access_token(refresh) is None
+    assert decode_refresh_token(access) is None
+    assert decode_refresh_token(refresh)["uid"] == 1
+    assert len(decodes) == 3
+
+
+def test_entries_expire_and_are_bounded():
+    """Entries are dropped at `exp` and in LRU order past the size"""
+    cache = TokenCache(max_size=2)
+    now = time.time()
+    cache.put(TokenCache.key("access", "a"), {"sub": "a", "exp": now + 60})
+    cache.put(TokenCache.key("access", "b"), {"sub": "b", "exp": now - 1})
+    assert cache.get(TokenCache.key("access", "a")) == {"sub": "a", "exp": now + 60}
+    assert cache.get(TokenCache.key("access", "b")) is None
+    # Same token, other signing key
+    assert cache.get(TokenCache.key("refresh", "a")) is None
+
+    cache.put(TokenCache.key("access", "c"), {"sub": "c", "exp": now + 60})
+    cache.put(TokenCache.key("access", "d"), {"sub": "d", "exp": now + 60})
+    assert cache.get(TokenCache.key("access", "a")) is None
+    assert cache.stats()["size"] == 2
+    # Tokens without `exp` are never cached
+    cache.put(TokenCache.key("access", "e"), {"sub": "e"})
+    assert cache.get(TokenCache.key("access", "e")) is None
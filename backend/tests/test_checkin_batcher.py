@@ -0,0 +1,134 @@
+"""
+This file contains the tests for the write-behind check-in pipeline.
+"""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.session import Base
+from app.db.models import CS_Checkins, CS_UserEvents
+from app.services.checkin_batcher import CheckinBatcher
+from app.services.events_svc import mark_events_completed
+from tests.test_events_svc import seed_events
+
+
+@pytest_asyncio.fixture(name="factory")
+async def factory_fixture():
+    """In-memory async database with a user who joined three events"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with factory() as db:
+        await db.run_sync(seed_events, 3)
+    yield factory
+    await engine.dispose()
+
+
+def count_commits(factory) -> list:
+    """Collect a marker for every COMMIT of the factory's engine"""
+    commits = []
+    event.listen(
+        factory.kw["bind"].sync_engine, "commit", lambda _conn: commits.append(1)
+    )
+    return commits
+
+
+@pytest.mark.asyncio
+async def test_burst_is_written_in_one_transaction(factory):
+    """Concurrent check-ins are acknowledged after a single group commit"""
+    batcher = CheckinBatcher(factory, interval_ms=50, max_items=100)
+    batcher.start()
+    commits = count_commits(factory)
+
+    async def check_in(event_id):
+        async with factory() as db:
+            return await batcher.submit(db, 1, event_id)
+
+    results = await asyncio.gather(*(check_in(event_id) for event_id in (1, 2, 3)))
+    # Seeded streaks were never marked, so each one starts over
+    assert [result["streak_count"] for result in results] == [1, 1, 1]
+    assert len(commits) == 1
+    assert batcher.batches == 1
+
+    # Already marked today, rejected from the in-memory set
+    async with factory() as db:
+        with pytest.raises(HTTPException) as exc:
+            await batcher.submit(db, 1, 1)
+    assert exc.value.status_code == 400
+    await batcher.drain()
+
+
+@pytest.mark.asyncio
+async def test_enqueue_mode_is_written_on_drain(factory):
+    """Acknowledged check-ins are still queued until shutdown drains them"""
+    batcher = CheckinBatcher(
+        factory, interval_ms=60_000, max_items=100, durability="enqueue"
+    )
+    batcher.start()
+    async with factory() as db:
+        assert (await batcher.submit(db, 1, 2))["streak_count"] == 1
+        assert await db.run_sync(lambda s: s.query(CS_Checkins).count()) == 0
+
+    await batcher.drain()
+    async with factory() as db:
+        assert await db.run_sync(lambda s: s.query(CS_Checkins).count()) == 1
+        streak = await db.run_sync(
+            lambda s: s.query(CS_UserEvents.streak_count).filter_by(event_id=2).scalar()
+        )
+        assert streak == 1
+
+
+@pytest.mark.asyncio
+async def test_max_items_triggers_a_flush(factory):
+    """A full batch is written without waiting for the interval"""
+    batcher = CheckinBatcher(factory, interval_ms=60_000, max_items=2)
+    batcher.start()
+
+    async def check_in(event_id):
+        async with factory() as db:
+            return await batcher.submit(db, 1, event_id)
+
+    await asyncio.wait_for(asyncio.gather(check_in(1), check_in(2)), timeout=5)
+    assert batcher.batches == 1
+    await batcher.drain()
+
+
+@pytest.mark.asyncio
+async def test_checkin_marked_elsewhere_is_rejected(factory):
+    """A row marked since it was validated is not counted and fails with 400"""
+    batcher = CheckinBatcher(factory, interval_ms=60_000, max_items=100)
+    batcher.start()
+
+    async def check_in(event_id):
+        async with factory() as db:
+            return await batcher.submit(db, 1, event_id)
+
+    pending = asyncio.gather(check_in(1), check_in(2), return_exceptions=True)
+    await asyncio.sleep(0.05)
+    # Another replica marks event 1 before the batch is written
+    async with factory() as db:
+        await db.run_sync(mark_events_completed, 1, [1])
+    await batcher.flush()
+
+    rejected, written = await pending
+    assert isinstance(rejected, HTTPException) and rejected.status_code == 400
+    assert written["streak_count"] == 1
+    async with factory() as db:
+        # One check-in per event, the rejected one is not logged twice
+        assert await db.run_sync(lambda s: s.query(CS_Checkins).count()) == 2
+        streak = await db.run_sync(
+            lambda s: s.query(CS_UserEvents.streak_count).filter_by(event_id=1).scalar()
+        )
+        assert streak == 1
+    await batcher.drain()
+
+
+def test_unknown_durability_mode():
+    """Misconfiguration fails at startup"""
+    with pytest.raises(ValueError):
+        CheckinBatcher(None, interval_ms=10, max_items=1, durability="sometimes")
@@ -0,0 +1,89 @@
+"""
+This file contains the concurrency tests for the atomic check-in.
+"""
+
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.migrations import run_migrations
+from app.db.models import CS_Checkins, CS_UserEvents
+from app.db.session import configure_sqlite_engine
+from app.handlers.auth import get_current_user_id
+from app.main import app
+from app.services.events_svc import mark_event_completed
+from tests.test_events_svc import seed_events
+
+REQUESTS = 25
+
+
+def seeded_database(path) -> int:
+    """Migrated SQLite file with one user who joined two events"""
+    engine = create_engine(f"sqlite:///{path}")
+    configure_sqlite_engine(engine, writer=True)
+    run_migrations(engine)
+    with sessionmaker(bind=engine)() as db:
+        user_id = seed_events(db, 2)
+    engine.dispose()
+    return user_id
+
+
+def streak_and_checkins(path, user_id: int, event_id: int):
+    """Read back the streak and the number of logged check-ins"""
+    engine = create_engine(f"sqlite:///{path}")
+    with sessionmaker(bind=engine)() as db:
+        streak = (
+            db.query(CS_UserEvents.streak_count)
+            .filter_by(user_id=user_id, event_id=event_id)
+            .scalar()
+        )
+        checkins = db.query(CS_Checkins).filter_by(user_id=user_id).count()
+    engine.dispose()
+    return streak, checkins
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_increment_once(tmp_path, app_client):
+    """Concurrent mark-completed requests: exactly one succeeds"""
+    path = tmp_path / "hammer.db"
+    user_id = seeded_database(path)
+    async with app_client(path) as client:
+        app.dependency_overrides[get_current_user_id] = lambda: user_id
+        responses = await asyncio.gather(
+            *(client.post("/api/v1/events/1/mark-completed") for _ in range(REQUESTS))
+        )
+
+    codes = sorted(response.status_code for response in responses)
+    assert codes == [200] + [400] * (REQUESTS - 1)
+    assert streak_and_checkins(path, user_id, 1) == (1, 1)
+
+
+def test_concurrent_connections_increment_once(tmp_path):
+    """Check-ins racing on separate connections: exactly one succeeds"""
+    path = tmp_path / "threads.db"
+    user_id = seeded_database(path)
+    engine = create_engine(f"sqlite:///{path}", pool_size=8)
+    configure_sqlite_engine(engine, writer=True)
+    factory = sessionmaker(bind=engine)
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def check_in():
+        with factory() as db:
+            barrier.wait()
+            try:
+                outcomes.append(mark_event_completed(db, user_id, 2)["streak_count"])
+            except HTTPException as exc:
+                outcomes.append(exc.status_code)
+
+    threads = [threading.Thread(target=check_in) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    assert sorted(outcomes) == [1] + [400] * 7
+    assert streak_and_checkins(path, user_id, 2) == (1, 1)
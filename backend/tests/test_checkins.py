@@ -0,0 +1,77 @@
+"""
+This file contains the tests for the check-in log and its compaction.
+"""
+
+from datetime import date
+from app.db.models import (
+    CS_Users,
+    CS_Events,
+    CS_UserEvents,
+    CS_Checkins,
+    CS_CheckinSegments,
+)
+from app.services.checkins import (
+    compact_checkins,
+    date_to_day,
+    get_checkin_history,
+    merge_runs,
+    record_checkins,
+)
+from app.services.events_svc import mark_event_completed
+
+
+def test_merge_runs():
+    """Overlapping and adjacent runs are merged, gaps are kept"""
+    assert merge_runs([(5, 5), (1, 2), (3, 3), (7, 9), (8, 8)]) == [
+        (1, 3),
+        (5, 5),
+        (7, 9),
+    ]
+
+
+def test_compaction_keeps_the_calendar(db):
+    """Folding old days into segments does not change the history"""
+    base = date_to_day(date(2024, 1, 1))
+    days = [0, 1, 2, 4, 10, 11, 40]
+    record_checkins(db, [(1, 7, base + offset) for offset in days])
+    record_checkins(db, [(1, 7, base + 1)])  # duplicate, skipped
+    record_checkins(db, [(2, 7, base)])
+    db.commit()
+
+    def history():
+        return get_checkin_history(db, 1, 7, date(2024, 1, 2), date(2024, 2, 29))
+
+    before = history()
+    assert before["days_checked_in"] == 6
+    assert before["longest_streak"] == 3
+
+    summary = compact_checkins(db, before_day=base + 30, chunk_size=1)
+    assert summary["pairs"] == 2
+    assert summary["rows"] == 7
+    assert db.query(CS_CheckinSegments).filter_by(user_id=1).count() == 3
+    assert db.query(CS_Checkins).count() == 1  # only the recent day stays raw
+    assert history() == before
+
+    # A later run merges new old days into the adjacent segment
+    record_checkins(db, [(1, 7, base + 3)])
+    db.commit()
+    compact_checkins(db, before_day=base + 30)
+    assert db.query(CS_CheckinSegments).filter_by(user_id=1).count() == 2
+    assert history()["longest_streak"] == 5
+
+
+def test_mark_completed_appends_a_checkin(db):
+    """Marking an event logs the user's local day in the same transaction"""
+    user = CS_Users(username="log", email="log@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    ev = CS_Events(name="log", description="", created_by=user.id)
+    db.add(ev)
+    db.flush()
+    db.add(CS_UserEvents(user_id=user.id, event_id=ev.id, streak_count=0))
+    db.commit()
+
+    mark_event_completed(db, user.id, ev.id)
+    history = get_checkin_history(db, user.id, ev.id)
+    assert history["days_checked_in"] == 1
+    assert history["runs"] == [{"start": history["end"], "end": history["end"]}]
@@ -0,0 +1,241 @@
+"""
+This file contains the tests for the per-event stats.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from sqlalchemy import inspect
+from app.db.migrations import run_migrations
+from app.core.config import settings
+from app.db.models import CS_Events, CS_EventStats, CS_Users, CS_UserEvents
+from app.handlers.scheduler import (
+    expire_streaks,
+    reset_streak_counts,
+)
+from app.services.event_stats import (
+    reconcile_event_stats,
+    refresh_max_streaks,
+    stats_day,
+)
+from app.services.events_svc import (
+    apply_checkins,
+    create_event,
+    enroll_users,
+    exit_event,
+    exit_events,
+    get_events_from_db,
+    join_event,
+    join_events,
+    mark_events_completed,
+    prepare_checkin,
+)
+from tests.conftest import memory_engine
+
+
+def add_users(db, count):
+    """Insert users and return their ids"""
+    users = [
+        CS_Users(username=f"user{i}", email=f"user{i}@example.com", password_hash="x")
+        for i in range(count)
+    ]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+def stats(db, event_id):
+    """(participants, max streak, completions today) of an event"""
+    db.expire_all()
+    row = db.get(CS_EventStats, event_id)
+    completions = row.completions_today if row.completions_day == stats_day() else 0
+    return row.participants, row.max_streak, completions
+
+
+def test_stats_follow_membership_writes(db):
+    """Joins, completions and exits update the stats in their transaction"""
+    u1, u2, u3, u4 = add_users(db, 4)
+    event_id = create_event(db, {"name": "e", "description": "", "created_by": u1})[
+        "event"
+    ]["id"]
+    assert stats(db, event_id) == (0, 0, 0)
+
+    join_event(db, u1, event_id)
+    join_events(db, u2, [event_id])
+    enroll_users(db, event_id, [u3, u4, u1], u1)
+    assert stats(db, event_id) == (4, 0, 0)
+
+    mark_events_completed(db, u1, [event_id])
+    mark_events_completed(db, u2, [event_id])
+    mark_events_completed(db, u2, [event_id])  # Already completed today
+    assert stats(db, event_id) == (4, 1, 2)
+
+    # Exits re-read the max streak from the remaining members
+    db.query(CS_UserEvents).filter(CS_UserEvents.user_id == u1).update(
+        {"streak_count": 9}
+    )
+    db.commit()
+    exit_event(db, u3, event_id)
+    assert stats(db, event_id) == (3, 9, 2)
+    exit_events(db, u1, [event_id])
+    assert stats(db, event_id) == (2, 1, 2)
+
+    listed, _ = get_events_from_db(db)
+    assert listed[0]["participants"] == 2
+    assert listed[0]["max_streak"] == 1
+    assert listed[0]["completions_today"] == 2
+
+
+def test_racing_joins_and_exits_count_once(db):
+    """A membership written by a concurrent request is not counted twice"""
+    (user_id,) = add_users(db, 1)
+    event_id = create_event(
+        db, {"name": "e", "description": "", "created_by": user_id}
+    )["event"]["id"]
+    racing = []
+
+    def concurrent_write(conn, _cursor, statement, *_):
+        """Apply the same change, and its stats delta, just before our write"""
+        if racing and statement.startswith(racing[0][0]):
+            _, sql, delta = racing.pop()
+            conn.exec_driver_sql(sql, (user_id, event_id))
+            conn.exec_driver_sql(
+                "UPDATE cs_event_stats SET participants = participants + ?",
+                (delta,),
+            )
+
+    sa_event.listen(db.get_bind(), "before_cursor_execute", concurrent_write)
+    try:
+        racing.append(
+            (
+                "INSERT INTO cs_user_events",
+                "INSERT INTO cs_user_events (user_id, event_id) VALUES (?, ?)",
+                1,
+            )
+        )
+        assert join_events(db, user_id, [event_id])[0]["status"] == "already_joined"
+        assert stats(db, event_id)[0] == 1
+
+        racing.append(
+            (
+                "DELETE FROM cs_user_events",
+                "DELETE FROM cs_user_events WHERE user_id = ? AND event_id = ?",
+                -1,
+            )
+        )
+        assert exit_events(db, user_id, [event_id])[0]["status"] == "not_joined"
+        assert stats(db, event_id)[0] == 0
+    finally:
+        sa_event.remove(db.get_bind(), "before_cursor_execute", concurrent_write)
+
+
+def test_rejected_checkins_are_not_counted(db):
+    """A batched check-in for a membership marked since is not a completion"""
+    u1, u2 = add_users(db, 2)
+    event_id = create_event(db, {"name": "e", "description": "", "created_by": u1})[
+        "event"
+    ]["id"]
+    join_events(db, u1, [event_id])
+    join_events(db, u2, [event_id])
+    checkins = [prepare_checkin(db, u1, event_id), prepare_checkin(db, u2, event_id)]
+    mark_events_completed(db, u1, [event_id])
+    assert stats(db, event_id) == (2, 1, 1)
+
+    applied = apply_checkins(db, checkins)
+    assert [checkin["user_id"] for checkin in applied] == [u2]
+    assert stats(db, event_id) == (2, 1, 2)
+
+
+def test_reset_lowers_max_streak(db):
+    """The streak reset re-reads the max streak of the events it touched"""
+    (user_id,) = add_users(db, 1)
+    event_id = create_event(
+        db, {"name": "e", "description": "", "created_by": user_id}
+    )["event"]["id"]
+    join_event(db, user_id, event_id)
+    db.query(CS_UserEvents).update(
+        {"streak_count": 5, "modified": datetime.utcnow() - timedelta(days=3)}
+    )
+    db.commit()
+    reconcile_event_stats(db)
+    assert stats(db, event_id) == (1, 5, 0)
+
+    reset_streak_counts(db)
+    assert stats(db, event_id) == (1, 0, 0)
+
+
+def test_lapsed_top_streak_leaves_the_max(db, monkeypatch):
+    """With lazy expiry the max streak only counts the streaks still alive"""
+    monkeypatch.setattr(settings, "lazy_streak_expiry", True)
+    u1, u2 = add_users(db, 2)
+    event_id = create_event(db, {"name": "e", "description": "", "created_by": u1})[
+        "event"
+    ]["id"]
+    join_events(db, u1, [event_id])
+    join_events(db, u2, [event_id])
+    marked = datetime(2026, 1, 10, 12, 0)
+    for user_id, streak_count, days in ((u1, 9, 0), (u2, 2, 1)):
+        db.query(CS_UserEvents).filter(CS_UserEvents.user_id == user_id).update(
+            {"streak_count": streak_count, "modified": marked + timedelta(days=days)}
+        )
+    refresh_max_streaks(db, [event_id], now=marked + timedelta(days=1))
+    db.commit()
+    assert stats(db, event_id)[1] == 9
+
+    # The 9 day streak was last marked two local days ago, the hourly job drops it
+    assert not expire_streaks(db, now=marked + timedelta(days=2))
+    assert stats(db, event_id)[1] == 2
+    db.query(CS_UserEvents).filter(CS_UserEvents.user_id == u1).update(
+        {"modified": marked + timedelta(days=2)}
+    )
+    db.commit()
+    summary = reconcile_event_stats(db, now=marked + timedelta(days=2))
+    assert (summary["repaired"], stats(db, event_id)[1]) == (1, 9)
+
+
+def test_reconcile_repairs_drift(db):
+    """Missing and drifted rows are recounted, correct rows are left alone"""
+    u1, u2 = add_users(db, 2)
+    first = create_event(db, {"name": "a", "description": "", "created_by": u1})
+    first_id = first["event"]["id"]
+    join_event(db, u1, first_id)
+    # Written behind the service layer: no stats row, and a membership not counted
+    db.add(CS_Events(id=50, name="b", description="", created_by=u1))
+    db.add(CS_UserEvents(user_id=u1, event_id=50, streak_count=3))
+    db.add(
+        CS_UserEvents(
+            user_id=u2, event_id=first_id, streak_count=2, modified=datetime.utcnow()
+        )
+    )
+    db.commit()
+
+    summary = reconcile_event_stats(db, chunk_size=1)
+    assert (summary["events"], summary["added"], summary["repaired"]) == (2, 1, 1)
+    assert stats(db, first_id) == (2, 2, 1)
+    assert stats(db, 50) == (1, 3, 0)
+
+    summary = reconcile_event_stats(db)
+    assert (summary["added"], summary["repaired"]) == (0, 0)
+
+
+def test_migration_backfills_stats():
+    """Existing events get their stats counted by the migration"""
+    engine = memory_engine()
+    run_migrations(engine, target=5)
+    with engine.begin() as conn:
+        conn.execute(
+            CS_Users.__table__.insert(),
+            [{"id": 1, "username": "u", "email": "e", "password_hash": "x"}],
+        )
+        conn.execute(
+            CS_Events.__table__.insert(), [{"id": 1, "name": "e", "created_by": 1}]
+        )
+        conn.execute(
+            CS_UserEvents.__table__.insert(),
+            [{"user_id": 1, "event_id": 1, "streak_count": 4}],
+        )
+    assert "cs_event_stats" not in inspect(engine).get_table_names()
+
+    run_migrations(engine)
+    with engine.connect() as conn:
+        row = conn.execute(CS_EventStats.__table__.select()).one()
+    assert (row.event_id, row.participants, row.max_streak) == (1, 1, 4)
@@ -0,0 +1,368 @@
+"""
+This file contains the tests for the event service methods.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.core.config import settings
+from app.db.session import Base
+from app.db.models import CS_Users, CS_Events, CS_EventProps, CS_UserEvents
+from app.services.events_svc import (
+    get_events_from_db,
+    get_user_created_events,
+    get_user_joined_events,
+    get_event_details_from_db,
+    get_user_joined_events_async,
+    create_events,
+    enroll_users,
+    exit_events,
+    join_event,
+    join_events,
+    mark_event_completed_async,
+    mark_events_completed,
+)
+from app.services.timezones import set_user_timezone
+
+
+def seed_events(db, count: int) -> int:
+    """Create a user who created and joined `count` events, each with two props"""
+    user = CS_Users(username="alice", email="alice@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    for i in range(count):
+        ev = CS_Events(name=f"event {i}", description="", created_by=user.id)
+        db.add(ev)
+        db.flush()
+        db.add_all(
+            [
+                CS_EventProps(event_id=ev.id, prop_name="color", prop_value="red"),
+                CS_EventProps(event_id=ev.id, prop_name="icon", prop_value="star"),
+                CS_UserEvents(user_id=user.id, event_id=ev.id, streak_count=i),
+            ]
+        )
+    db.commit()
+    return user.id
+
+
+def count_queries(db, func, *args):
+    """Run func and return (result, number of SQL statements executed)"""
+    statements = []
+
+    def before_cursor_execute(*_):
+        statements.append(1)
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        db.expire_all()
+        result = func(db, *args)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return result, len(statements)
+
+
+@pytest.mark.parametrize(
+    "func, needs_user",
+    [
+        (get_events_from_db, False),
+        (get_user_created_events, True),
+        (get_user_joined_events, True),
+    ],
+)
+def test_listing_query_count_is_constant(db, func, needs_user):
+    """Listing endpoints issue the same number of queries for 1 and 50 events"""
+    user_id = seed_events(db, 1)
+    args = (user_id,) if needs_user else (None,)
+    small, small_queries = count_queries(db, func, *args)
+
+    for i in range(49):
+        ev = CS_Events(name=f"more {i}", description="", created_by=user_id)
+        db.add(ev)
+        db.flush()
+        db.add(CS_EventProps(event_id=ev.id, prop_name="color", prop_value="blue"))
+        db.add(CS_UserEvents(user_id=user_id, event_id=ev.id, streak_count=1))
+    db.commit()
+    large, large_queries = count_queries(db, func, *args)
+
+    if func is get_events_from_db:
+        small, large = small[0], large[0]
+    assert len(small) == 1
+    assert len(large) == 50
+    assert small_queries == large_queries
+
+
+def test_joined_events_include_props_and_streaks(db):
+    """Batched results keep props and streak counts attached to the right event"""
+    user_id = seed_events(db, 3)
+    events = get_user_joined_events(db, user_id)
+
+    assert sorted(e["streak_count"] for e in events) == [0, 1, 2]
+    for e in events:
+        assert e["props"] == [
+            {"name": "color", "value": "red"},
+            {"name": "icon", "value": "star"},
+        ]
+
+
+def test_events_keyset_pagination(db):
+    """Walking the cursors returns every matching event exactly once, newest first"""
+    user_id = seed_events(db, 7)
+    # Same created_at for a few rows so the id tie-breaker is exercised
+    same_time = datetime(2024, 1, 1)
+    for ev in db.query(CS_Events).filter(CS_Events.id <= 3):
+        ev.created_at = same_time
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = get_events_from_db(db, limit=3, cursor=cursor)
+        assert len(page) <= 3
+        seen.extend(e["id"] for e in page)
+        if cursor is None:
+            break
+
+    # Ids 1-3 are the oldest rows, the rest were created in id order
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 7
+
+    page, _ = get_events_from_db(db, created_by=user_id + 1)
+    assert not page
+
+
+def test_events_invalid_cursor(db):
+    """A tampered cursor is rejected with 400"""
+    with pytest.raises(HTTPException) as exc:
+        get_events_from_db(db, cursor="not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_event_details_rank_outside_top_x(db):
+    """Users outside the top X still get their exact rank"""
+    user_id = seed_events(db, 1)
+    event_id = db.query(CS_Events.id).scalar()
+    for i in range(5):
+        other = CS_Users(username=f"u{i}", email=f"u{i}@example.com", password_hash="x")
+        db.add(other)
+        db.flush()
+        db.add(CS_UserEvents(user_id=other.id, event_id=event_id, streak_count=i + 1))
+    db.commit()
+
+    details = get_event_details_from_db(db, event_id, 2, user_id)
+    assert [u["streak_count"] for u in details["top_users"]] == [5, 4]
+    assert details["user_details"]["rank"] == 6
+    assert details["user_counts"] == 6
+
+    late = CS_Users(username="late", email="late@example.com", password_hash="x")
+    db.add(late)
+    db.commit()
+    join_event(db, late.id, event_id)
+    details = get_event_details_from_db(db, event_id, 2, late.id)
+    assert details["user_details"]["rank"] == 7
+    assert details["user_counts"] == 7
+
+
+def test_event_details_neighbours_and_expired_streaks(db, monkeypatch):
+    """Ties rank by user id, lapsed streaks rank as 0 with lazy expiry"""
+    monkeypatch.setattr(settings, "lazy_streak_expiry", True)
+    user_id = seed_events(db, 1)
+    event_id = db.query(CS_Events.id).scalar()
+    now = datetime.utcnow()
+    streaks = {"top": (9, now - timedelta(days=3)), "a": (4, now), "b": (4, now)}
+    for name, (streak_count, modified) in streaks.items():
+        other = CS_Users(username=name, email=f"{name}@example.com", password_hash="x")
+        db.add(other)
+        db.flush()
+        db.add(
+            CS_UserEvents(
+                user_id=other.id,
+                event_id=event_id,
+                streak_count=streak_count,
+                modified=modified,
+            )
+        )
+    db.commit()
+    # Cutoffs are picked by the timezone of each member
+    set_user_timezone(db, user_id, "Asia/Kolkata")
+
+    details = get_event_details_from_db(db, event_id, 1, user_id, 1)
+    assert [u["username"] for u in details["top_users"]] == ["a"]
+    nearby = details["user_details"]["nearby_users"]
+    assert [(u["rank"], u["username"], u["streak_count"]) for u in nearby] == [
+        (2, "b", 4),
+        (3, "alice", 0),
+        (4, "top", 0),
+    ]
+    assert details["user_details"]["rank"] == 3
+    assert details["user_counts"] == 4
+
+
+def test_event_details_statement_count(db):
+    """Details take two statements, whatever the event size"""
+    user_id = seed_events(db, 1)
+    event_id = db.query(CS_Events.id).scalar()
+    set_user_timezone(db, user_id, "Asia/Kolkata")
+    db.commit()
+
+    details, queries = count_queries(
+        db, get_event_details_from_db, event_id, 10, user_id
+    )
+    assert queries == 2
+    assert details["user_details"]["status"] == "Part of the event"
+    assert details["top_users"][0]["userid"] == user_id
+
+    for i in range(30):
+        other = CS_Users(username=f"n{i}", email=f"n{i}@example.com", password_hash="x")
+        db.add(other)
+        db.flush()
+        join_event(db, other.id, event_id)
+    _, queries = count_queries(db, get_event_details_from_db, event_id, 10, user_id)
+    assert queries == 2
+
+    outsider = CS_Users(username="out", email="out@example.com", password_hash="x")
+    db.add(outsider)
+    db.commit()
+    details = get_event_details_from_db(db, event_id, 10, outsider.id)
+    assert details["user_details"] == {"status": "Not part of the event"}
+    assert get_event_details_from_db(db, 999, 10, user_id) == {
+        "error": "Event not found"
+    }
+
+
+def test_bulk_mark_completed(db):
+    """Many events are marked in one transaction with a result per event"""
+    user_id = seed_events(db, 3)
+    results = mark_events_completed(db, user_id, [1, 2, 2, 99])
+    assert [(r["event_id"], r["status"], r["streak_count"]) for r in results] == [
+        (1, "completed", 1),
+        (2, "completed", 1),
+        (99, "not_found", None),
+    ]
+    results = mark_events_completed(db, user_id, [2, 3])
+    assert [r["status"] for r in results] == ["already_completed", "completed"]
+
+
+def test_bulk_mark_completed_query_count_is_constant(db):
+    """Marking 2 or 40 events issues the same statements"""
+    user_id = seed_events(db, 40)
+    _, small_queries = count_queries(db, mark_events_completed, user_id, [1, 2])
+    _, large_queries = count_queries(
+        db, mark_events_completed, user_id, list(range(3, 41))
+    )
+    assert small_queries == large_queries
+
+
+def test_bulk_join_and_exit(db):
+    """Joins and exits of many events report a status per event"""
+    user_id = seed_events(db, 2)
+    extra = create_events(db, user_id, [{"name": "x", "description": ""}] * 2)
+    new_ids = [event["id"] for event in extra]
+
+    results = join_events(db, user_id, [1, *new_ids, 99])
+    assert [r["status"] for r in results] == [
+        "already_joined",
+        "joined",
+        "joined",
+        "not_found",
+    ]
+    assert len(get_user_joined_events(db, user_id)) == 4
+
+    results = exit_events(db, user_id, [2, new_ids[0], new_ids[0], 99])
+    assert [r["status"] for r in results] == ["exited", "exited", "not_found"]
+    assert exit_events(db, user_id, [2])[0]["status"] == "not_joined"
+    assert len(get_user_joined_events(db, user_id)) == 2
+
+
+def test_enroll_users(db):
+    """Many users join one event in a single call"""
+    user_id = seed_events(db, 1)
+    others = [
+        CS_Users(username=f"u{i}", email=f"u{i}@x.com", password_hash="x")
+        for i in range(3)
+    ]
+    db.add_all(others)
+    db.commit()
+    results = enroll_users(db, 1, [user_id, *(u.id for u in others), 404], user_id)
+    assert [r["status"] for r in results] == [
+        "already_joined",
+        "joined",
+        "joined",
+        "joined",
+        "not_found",
+    ]
+    assert get_event_details_from_db(db, 1, 10, user_id)["user_counts"] == 4
+    with pytest.raises(HTTPException) as exc:
+        enroll_users(db, 404, [user_id], user_id)
+    assert exc.value.status_code == 404
+
+
+def test_enroll_requires_event_creator(db):
+    """Users who did not create the event cannot enroll anyone, admins can"""
+    owner_id = seed_events(db, 1)
+    intruder = CS_Users(username="intruder", email="i@x.com", password_hash="x")
+    admin = CS_Users(
+        username="admin", email="a@x.com", password_hash="x", flags="admin"
+    )
+    db.add_all([intruder, admin])
+    db.commit()
+
+    with pytest.raises(HTTPException) as exc:
+        enroll_users(db, 1, [intruder.id], intruder.id)
+    assert exc.value.status_code == 403
+    assert get_event_details_from_db(db, 1, 10, owner_id)["user_counts"] == 1
+
+    results = enroll_users(db, 1, [intruder.id], admin.id)
+    assert [r["status"] for r in results] == ["joined"]
+
+
+def test_create_events_with_props(db):
+    """A batch of events is created with its props, in one commit"""
+    user_id = seed_events(db, 0)
+    created = create_events(
+        db,
+        user_id,
+        [
+            {"name": "run", "description": "", "props": [{"name": "km", "value": "5"}]},
+            {"name": "read", "description": "", "is_private": False},
+        ],
+    )
+    assert [event["name"] for event in created] == ["run", "read"]
+    assert created[0]["props"] == [{"name": "km", "value": "5"}]
+    events, _ = get_events_from_db(db)
+    assert {event["name"]: event["props"] for event in events}["run"] == [
+        {"name": "km", "value": "5"}
+    ]
+
+
+def test_bulk_join_query_count_is_constant(db):
+    """Joining 2 or 30 events issues the same statements"""
+    user_id = seed_events(db, 0)
+    ids = [
+        event["id"]
+        for event in create_events(db, user_id, [{"name": "e", "description": ""}] * 32)
+    ]
+    _, small_queries = count_queries(db, join_events, user_id, ids[:2])
+    _, large_queries = count_queries(db, join_events, user_id, ids[2:])
+    assert small_queries == large_queries
+
+
+@pytest.mark.asyncio
+async def test_async_service_versions():
+    """The async versions run the same service methods through the async driver"""
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        user_id = await db.run_sync(seed_events, 2)
+        events = await get_user_joined_events_async(db, user_id)
+        assert len(events) == 2
+
+        result = await mark_event_completed_async(db, user_id, events[0]["id"])
+        assert result["streak_count"] == events[0]["streak_count"] + 1
+        with pytest.raises(HTTPException):
+            await mark_event_completed_async(db, user_id, events[0]["id"])
+    await engine.dispose()
@@ -0,0 +1,88 @@
+"""
+This file contains the tests for the identity cache and the token user id.
+"""
+
+import time
+import pytest
+from fastapi import HTTPException
+from app.handlers.auth import create_access_token, get_current_user_id
+from app.services.identity_cache import IdentityCache, identities
+from app.services.users_svc import (
+    create_user,
+    get_user_id,
+    get_user_profile,
+    update_password_hash,
+)
+from tests.test_events_svc import count_queries
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    """The least recently used entry is evicted first, expired entries are misses"""
+    cache = IdentityCache(max_size=2, ttl_seconds=60)
+    cache.put("a", {"id": 1})
+    cache.put("b", {"id": 2})
+    assert cache.get("a") == (True, {"id": 1})
+    cache.put("c", {"id": 3})
+    assert cache.get("b") == (False, None)
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 1,
+        "token_hits": 0,
+        "size": 2,
+    }
+
+    now = time.monotonic()
+    monkeypatch.setattr("app.services.identity_cache.time.monotonic", lambda: now + 61)
+    assert cache.get("a") == (False, None)
+
+
+def test_invalidate_user_drops_every_identity():
+    """Entries under both the username and the email go away together"""
+    cache = IdentityCache(max_size=10, ttl_seconds=60)
+    cache.put("ann", {"id": 1})
+    cache.put("ann@example.com", {"id": 1})
+    cache.put("bob", {"id": 2})
+    cache.invalidate_user(1)
+    assert cache.stats()["size"] == 1
+    assert cache.get("bob")[0]
+
+
+def test_get_user_id_is_served_from_the_cache(db):
+    """The second lookup of an identity runs no query"""
+    user = create_user(db, "cached", "cached@example.com", "x")
+    assert count_queries(db, lambda s: get_user_id("cached", s))[1] == 1
+    assert count_queries(db, lambda s: get_user_id("cached", s)) == (user.id, 0)
+    assert get_user_profile("cached", db)["email"] == "cached@example.com"
+
+
+def test_signup_invalidates_unknown_identity(db):
+    """An identity cached as unknown resolves once the user signs up"""
+    assert get_user_id("late@example.com", db) is None
+    user = create_user(db, "late", "late@example.com", "x")
+    assert get_user_id("late@example.com", db) == user.id
+
+
+def test_password_update_invalidates_the_user(db):
+    """Updating a user drops their cached identities, a lost race keeps them"""
+    user = create_user(db, "rehashed", "rehashed@example.com", "old")
+    get_user_profile("rehashed", db)
+    get_user_profile("rehashed@example.com", db)
+    assert identities.stats()["size"] == 2
+
+    assert not update_password_hash(db, user.id, "stale", "new")
+    assert identities.stats()["size"] == 2
+    assert update_password_hash(db, user.id, "old", "new")
+    assert identities.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_token_user_id_skips_the_lookup():
+    """A token with the uid claim resolves without a database session"""
+    identities.clear()
+    token = create_access_token({"sub": "ann@example.com", "uid": 42})
+    assert await get_current_user_id(token, db=None) == 42
+    assert identities.stats()["token_hits"] == 1
+
+    with pytest.raises(HTTPException):
+        await get_current_user_id("not-a-token", db=None)
@@ -0,0 +1,60 @@
+"""
+This file contains the tests for the scheduler leader election.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.core.metrics import scheduler_job_duration
+from app.db.models import CS_JobRuns
+from app.handlers.leadership import SchedulerLeader, try_acquire_lease
+
+
+def test_lease_is_exclusive_until_it_expires(db):
+    """One holder at a time, another replica takes over an expired lease"""
+    now = datetime(2024, 3, 1, 12, 0)
+    assert try_acquire_lease(db, "jobs", "a", 30, now=now)
+    assert not try_acquire_lease(db, "jobs", "b", 30, now=now + timedelta(seconds=10))
+    # The holder renews its own lease
+    assert try_acquire_lease(db, "jobs", "a", 30, now=now + timedelta(seconds=20))
+    assert not try_acquire_lease(db, "jobs", "b", 30, now=now + timedelta(seconds=40))
+
+    # "a" stopped renewing, "b" fails over and "a" cannot take it back
+    later = now + timedelta(seconds=51)
+    assert try_acquire_lease(db, "jobs", "b", 30, now=later)
+    assert not try_acquire_lease(db, "jobs", "a", 30, now=later)
+
+
+def test_jobs_run_once_and_are_recorded(db):
+    """Only the leader runs a job, each run is logged with its outcome"""
+    scheduler_job_duration.clear()
+    factory = sessionmaker(bind=db.get_bind())
+    leader = SchedulerLeader("jobs", "a", 30, session_factory=factory)
+    follower = SchedulerLeader("jobs", "b", 30, session_factory=factory)
+    calls = []
+
+    def job():
+        calls.append(1)
+        return {"rows": 3}
+
+    def failing_job():
+        raise RuntimeError("boom")
+
+    assert leader.leader_only(job)() == {"rows": 3}
+    assert follower.leader_only(job)() is None
+    with pytest.raises(RuntimeError):
+        leader.leader_only(failing_job)()
+
+    assert calls == [1]
+    runs = db.query(CS_JobRuns).order_by(CS_JobRuns.id).all()
+    assert [(run.job_name, run.holder, run.outcome) for run in runs] == [
+        ("job", "a", "success"),
+        ("failing_job", "a", "failed"),
+    ]
+    assert runs[0].detail == "{'rows': 3}"
+    assert runs[0].duration >= 0
+    assert sum(scheduler_job_duration.labels("job", "success").counts) == 1
+    assert sum(scheduler_job_duration.labels("failing_job", "failed").counts) == 1
+
+    leader.release()
+    assert follower.heartbeat()
@@ -0,0 +1,97 @@
+"""
+This file contains the tests for the queue-based log pipeline.
+"""
+
+import json
+import logging
+import pytest
+from app.core import logging_config
+from app.core.config import settings
+from app.core.logging_config import (
+    JsonFormatter,
+    parse_log_levels,
+    setup_logging,
+    stop_logging,
+)
+
+LOG_SETTINGS = ("log_format", "log_file", "log_max_bytes", "log_backup_count")
+
+
+@pytest.fixture(name="log_file")
+def log_file_fixture(tmp_path):
+    """Point the log pipeline at a temporary file, restore it afterwards"""
+    saved = {name: getattr(settings, name) for name in LOG_SETTINGS + ("log_levels",)}
+    was_running = logging_config._listener is not None  # pylint: disable=W0212
+    root_level = logging.getLogger().level
+    settings.log_file = str(tmp_path / "test.log")
+    yield tmp_path / "test.log"
+    stop_logging()
+    for name, value in saved.items():
+        setattr(settings, name, value)
+    logging.getLogger().setLevel(root_level)
+    if was_running:
+        setup_logging()
+
+
+def test_parse_log_levels():
+    """Per-logger levels accept names and numbers"""
+    assert parse_log_levels(" access=warning, sqlalchemy.engine=10 ,") == {
+        "access": logging.WARNING,
+        "sqlalchemy.engine": logging.DEBUG,
+    }
+    assert parse_log_levels("") == {}
+    with pytest.raises(ValueError):
+        parse_log_levels("access=LOUD")
+    with pytest.raises(ValueError):
+        parse_log_levels("=INFO")
+
+
+def test_json_formatter_includes_access_fields():
+    """Access log fields and tracebacks become JSON keys"""
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = logging.getLogger("access").makeRecord(
+            "access", logging.ERROR, __file__, 1, "GET %s", ("/x",), None
+        )
+        record.exc_text = "Traceback: boom"
+    record.access = {"method": "GET", "status": 500}
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "GET /x"
+    assert (entry["level"], entry["logger"]) == ("ERROR", "access")
+    assert (entry["method"], entry["status"]) == ("GET", 500)
+    assert entry["exception"] == "Traceback: boom"
+
+
+def test_records_are_written_by_the_listener(log_file):
+    """Records are rendered at call time and written as JSON lines on stop"""
+    settings.log_format = "json"
+    settings.log_levels = "test.quiet=ERROR"
+    setup_logging()
+    payload = {"step": 1}
+    logging.getLogger("test.loud").warning("payload %s", payload)
+    payload["step"] = 2  # Changed after the call, must not show in the log
+    logging.getLogger("test.quiet").warning("dropped")
+    try:
+        raise ValueError("bad")
+    except ValueError:
+        logging.getLogger("test.loud").exception("failed")
+    stop_logging()
+
+    lines = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [line["message"] for line in lines] == ["payload {'step': 1}", "failed"]
+    assert "ValueError: bad" in lines[1]["exception"]
+
+
+def test_log_file_is_rotated(log_file):
+    """The file rolls over at log_max_bytes, keeping log_backup_count files"""
+    settings.log_max_bytes = 200
+    settings.log_backup_count = 2
+    setup_logging()
+    for i in range(50):
+        logging.getLogger("test.rotate").warning("line %s", i)
+    stop_logging()
+
+    files = sorted(path.name for path in log_file.parent.iterdir())
+    assert files == ["test.log", "test.log.1", "test.log.2"]
+    assert log_file.stat().st_size <= 200
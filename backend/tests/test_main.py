@@ -2,15 +2,7 @@
 This file contains the tests for the main FastAPI application.
 """
 
-import os
-
-# before importing set the required env variables
-os.environ["SECRET_KEY"] = "your_secret_key_value"
-os.environ["REFRESH_SECRET_KEY"] = "your_refresh_secret_key_value"
-os.environ["DATABASE_URL"] = "sqlite:///./database/community_streak.db"
-os.environ["DEBUG_LEVEL"] = "10"
-
-
+# The environment (and the test database) is set up by tests/conftest.py
 from fastapi.testclient import TestClient
 from app.main import app
 
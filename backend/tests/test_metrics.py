@@ -0,0 +1,102 @@
+"""
+This file contains the tests for the metrics and the /metrics endpoint.
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from app.core.metrics import (
+    MetricsRegistry,
+    db_pool_checkout_wait,
+    http_request_db_queries,
+    http_request_duration,
+)
+from app.core.middlewares import MetricsMiddleware
+from app.db import session
+from app.db.session import TimedQueuePool, instrument_engine
+
+
+def test_render_prometheus_text():
+    """Counters, gauges, histograms and collectors in the text format"""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests", "Requests.", ("route",))
+    inflight = registry.gauge("inflight", "In flight.")
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+
+    @registry.collector("cache_size", "gauge", "Cache size.")
+    def _cache_size():
+        yield {"cache": 'a"b'}, 3
+
+    requests.labels("/x").inc()
+    requests.labels("/x").inc(2)
+    inflight.inc()
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/x"} 3.0' in lines
+    assert "inflight 1.0" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 3.65" in lines
+    assert 'cache_size{cache="a\\"b"} 3' in lines
+
+
+def test_requests_are_measured_by_route_template(tmp_path, monkeypatch):
+    """Latency and query counts per route template, pool checkout waits"""
+    monkeypatch.setattr(session, "_monitored_pools", {})
+    for metric in (http_request_duration, http_request_db_queries):
+        metric.clear()
+    db_pool_checkout_wait.clear()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'metrics.db'}",
+        poolclass=TimedQueuePool,
+        pool_logging_name="test",
+        pool_size=1,
+        max_overflow=0,
+    )
+    instrument_engine(engine, "test", capacity=1)
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+            conn.exec_driver_sql("SELECT 2")
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    route = "/items/{item_id}"
+    assert sum(http_request_duration.labels("GET", route, "200").counts) == 2
+    assert sum(http_request_duration.labels("GET", "unmatched", "404").counts) == 1
+    assert http_request_db_queries.labels(route).sum == 4
+    assert http_request_db_queries.labels("unmatched").sum == 0
+    assert sum(db_pool_checkout_wait.labels("test").counts) == 2
+    engine.dispose()
+
+
+def test_metrics_endpoint():
+    """The application serves its metrics"""
+    # pylint: disable=import-outside-toplevel
+    from app.main import app
+
+    client = TestClient(app)
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/"' in text
+    assert 'db_pool_connections{engine="read",state="checked_out"}' in text
+    assert 'db_pool_saturation{engine="write"}' in text
+    assert "websocket_connections 0.0" in text
+    assert 'identity_cache_events_total{outcome="hits"}' in text
@@ -0,0 +1,130 @@
+"""
+This file contains the tests for the access log middleware.
+"""
+
+import logging
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.middlewares import AccessLogMiddleware, access_logger
+from app.main import app as main_app
+from app.routes import user_routes
+
+
+def build_client() -> TestClient:
+    """Small app wrapped in the access log"""
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return await request.json()
+
+    @app.post("/fail")
+    async def fail(request: Request):
+        await request.body()
+        raise HTTPException(status_code=503, detail="down")
+
+    @app.get("/blocked")
+    async def blocked():
+        raise HTTPException(status_code=403, detail="no")
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"a", b"b", b"c"]))
+
+    app.add_middleware(AccessLogMiddleware)
+    return TestClient(app)
+
+
+@pytest.fixture(name="records")
+def records_fixture(caplog):
+    """Capture the access log at INFO"""
+    caplog.set_level(logging.INFO, logger=access_logger.name)
+    return lambda: [
+        record for record in caplog.records if record.name == access_logger.name
+    ]
+
+
+def test_one_line_per_request_without_body(records):
+    """Successful requests log one line, without the body by default"""
+    response = build_client().post("/echo?token=secret", json={"a": 1})
+    assert response.json() == {"a": 1}
+    assert len(records()) == 1
+    fields = records()[0].access
+    assert (fields["method"], fields["path"], fields["status"]) == (
+        "POST",
+        "/echo",
+        200,
+    )
+    assert "body" not in fields
+    assert "secret" not in records()[0].getMessage()
+
+
+def test_errors_log_the_body(records):
+    """Server errors are logged at ERROR with the request body"""
+    build_client().post("/fail", json={"why": "x"})
+    assert records()[0].levelno == logging.ERROR
+    assert records()[0].access["body"] == '{"why":"x"}'
+
+
+def test_secrets_are_not_logged(records, monkeypatch):
+    """Secret fields are masked, form bodies are never kept"""
+    build_client().post("/fail", json={"a": 1, "password": "hunter2", "b": 2})
+    assert records()[0].access["body"] == '{"a":1,"password":"***","b":2}'
+
+    # A secret cut by the byte limit is masked as well
+    monkeypatch.setattr(settings, "access_log_body_bytes", 22)
+    build_client().post("/fail", json={"a": 1, "token": "abcdefgh"})
+    assert records()[1].access["body"] == '{"a":1,"token":"***"'
+
+    build_client().post("/fail", data={"password": "hunter2"})
+    assert "body" not in records()[2].access
+
+
+def test_overloaded_login_logs_no_body(records, monkeypatch):
+    """A 503 from /login, the password pool being full, does not log the form"""
+
+    async def find_user(_db, _username):
+        return SimpleNamespace(id=1, username="ada", password_hash="x")
+
+    class FullPool:
+        """Pool refusing every call"""
+
+        async def verify_and_update(self, _password, _hash):
+            raise HTTPException(status_code=503, detail="Busy")
+
+    monkeypatch.setattr(user_routes, "get_user_by_name_or_email_async", find_user)
+    monkeypatch.setattr(user_routes, "password_pool", FullPool())
+    response = TestClient(main_app).post(
+        "/api/v1/users/login", data={"username": "ada", "password": "aHVudGVyMg=="}
+    )
+    assert response.status_code == 503
+    (record,) = records()
+    assert record.levelno == logging.ERROR
+    assert "body" not in record.access
+    assert "aHVudGVyMg" not in record.getMessage()
+
+
+def test_sampled_bodies_are_truncated(records, monkeypatch):
+    """With a sample rate of 1 every body is logged, up to the byte limit"""
+    monkeypatch.setattr(settings, "access_log_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "access_log_body_bytes", 4)
+    build_client().post("/echo", json={"abcdef": 1})
+    assert records()[0].access["body"] == '{"ab'
+
+
+def test_blocked_requests_are_warnings(records):
+    """403 responses replace the old blocked request middleware"""
+    build_client().get("/blocked")
+    assert records()[0].levelno == logging.WARNING
+
+
+def test_streaming_and_disabled_logger(caplog):
+    """Streaming passes through, nothing is logged when the logger is disabled"""
+    caplog.set_level(logging.CRITICAL, logger=access_logger.name)
+    response = build_client().get("/stream")
+    assert response.content == b"abc"
+    assert not caplog.records
@@ -0,0 +1,52 @@
+"""
+This file contains the tests for the versioned schema migrations.
+"""
+
+from sqlalchemy import inspect, text
+from app.db.migrations import MIGRATIONS, run_migrations
+from tests.conftest import memory_engine
+
+
+def test_migrations_are_idempotent():
+    """A fresh database ends at the latest version, re-running is a no-op"""
+    engine = memory_engine()
+    latest = MIGRATIONS[-1][0]
+
+    assert run_migrations(engine) == latest
+    assert run_migrations(engine) == latest
+
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("cs_user_events")}
+    assert {"uq_cs_user_events_user_event", "ix_cs_user_events_event_streak"} <= indexes
+
+
+def test_index_migration_merges_duplicate_memberships():
+    """Duplicate (user_id, event_id) rows are merged into the oldest one"""
+    engine = memory_engine()
+    with engine.begin() as conn:
+        # Legacy table as created by Base.metadata.create_all, without the new indexes
+        conn.execute(
+            text(
+                "CREATE TABLE cs_user_events (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                "event_id INTEGER NOT NULL, streak_count INTEGER, modified DATETIME, created_at DATETIME)"
+            )
+        )
+        # The newer duplicate holds the longer streak and the latest check-in
+        conn.execute(
+            text(
+                "INSERT INTO cs_user_events (id, user_id, event_id, streak_count, modified) "
+                "VALUES (1, 1, 1, 3, '2026-01-01 10:00:00.000000'), "
+                "(2, 1, 1, 7, '2026-01-05 10:00:00.000000'), "
+                "(3, 2, 1, 0, NULL), (4, 1, 1, NULL, NULL)"
+            )
+        )
+
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT id, streak_count, modified FROM cs_user_events ORDER BY id")
+        ).all()
+    assert [tuple(row) for row in rows] == [
+        (1, 7, "2026-01-05 10:00:00.000000"),
+        (3, 0, None),
+    ]
@@ -0,0 +1,92 @@
+"""
+This file contains the tests for the password hashing pool and the login rehash.
+"""
+
+import asyncio
+import base64
+import threading
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.db.migrations import run_migrations
+from app.db.models import CS_Users
+from app.handlers import passwords
+from app.handlers.auth import pwd_context
+from app.handlers.passwords import PasswordPool
+from app.routes import user_routes
+
+
+@pytest.mark.asyncio
+async def test_pool_refuses_calls_beyond_its_queue():
+    """One worker and one waiting call, the third concurrent call gets a 503"""
+    pool = PasswordPool(workers=1, queue_size=1)
+    release = threading.Event()
+    running = [
+        asyncio.ensure_future(pool.run(release.wait)),
+        asyncio.ensure_future(pool.run(release.wait)),
+    ]
+    await asyncio.sleep(0)
+    assert pool.pending == 2
+
+    with pytest.raises(HTTPException) as exc:
+        await pool.run(release.wait)
+    assert exc.value.status_code == 503
+    assert pool.rejected == 1
+
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert pool.pending == 0
+    assert await pool.run(sum, [1, 2]) == 3
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_hashes(tmp_path, monkeypatch, app_client):
+    """A valid login with an old bcrypt cost stores a hash with the current cost"""
+    old_context = pwd_context.copy(bcrypt__rounds=4)
+    monkeypatch.setattr(passwords, "pwd_context", pwd_context.copy(bcrypt__rounds=5))
+    pool = PasswordPool(workers=1, queue_size=4)
+    monkeypatch.setattr(user_routes, "password_pool", pool)
+
+    path = tmp_path / "login.db"
+    engine = create_engine(f"sqlite:///{path}")
+    run_migrations(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(
+            CS_Users(
+                username="ada",
+                email="ada@example.com",
+                password_hash=old_context.hash("secret"),
+            )
+        )
+        db.commit()
+    try:
+        async with app_client(path) as client:
+
+            async def login(password: str) -> int:
+                response = await client.post(
+                    "/api/v1/users/login",
+                    data={
+                        "username": "ada",
+                        "password": base64.b64encode(password.encode()).decode(),
+                    },
+                )
+                return response.status_code
+
+            assert await login("wrong") == 401
+            with sessionmaker(bind=engine)() as db:
+                assert db.query(CS_Users.password_hash).scalar().startswith("$2b$04$")
+
+            assert await login("secret") == 200
+            with sessionmaker(bind=engine)() as db:
+                new_hash = db.query(CS_Users.password_hash).scalar()
+            assert new_hash.startswith("$2b$05$")
+
+            # Up to date now, nothing left to rewrite
+            assert await login("secret") == 200
+            with sessionmaker(bind=engine)() as db:
+                assert db.query(CS_Users.password_hash).scalar() == new_hash
+    finally:
+        engine.dispose()
+        pool.shutdown()
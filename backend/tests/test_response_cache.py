@@ -0,0 +1,184 @@
+"""
+This file contains the tests for the response cache.
+"""
+
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.core.response_cache import (
+    EVENTS_TAG,
+    LRUBackend,
+    ResponseCache,
+    event_tag,
+    response_cache,
+)
+from app.db.models import CS_Events, CS_Users
+from app.services.events_svc import create_event, join_event
+from app.services.timezones import set_user_timezone
+
+
+@pytest.fixture(name="cache")
+def cache_fixture():
+    """Cache with a small in-process backend"""
+    return ResponseCache(LRUBackend(max_size=2))
+
+
+def versions(tags):
+    """Current versions of tags in the global cache"""
+    return asyncio.run(response_cache.backend.versions(tags))
+
+
+def make_client(cache, loads, ttl=60):
+    """App with a cached route counting how often it is built"""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(request: Request, item_id: int, user: str = ""):
+        async def load():
+            loads.append(item_id)
+            return {"id": item_id, "version": len(loads)}, {"X-Extra": "1"}
+
+        return await cache.respond(
+            request, (event_tag(item_id),), ttl, load, vary=f"user={user}"
+        )
+
+    return TestClient(app)
+
+
+@pytest.mark.asyncio
+async def test_lru_backend_expires_and_evicts():
+    """Entries expire after their TTL and the least recently used is evicted"""
+    backend = LRUBackend(max_size=2)
+    await backend.set("a", b"1", 60)
+    await backend.set("b", b"2", 60)
+    await backend.get("a")
+    await backend.set("c", b"3", 60)
+    values = [await backend.get(key) for key in ("a", "b", "c")]
+    assert values == [b"1", None, b"3"]
+    assert len(backend) == 2
+
+    await backend.set("short", b"4", 0.01)
+    time.sleep(0.02)
+    assert await backend.get("short") is None
+    assert await backend.versions(["x", "y"]) == (0, 0)
+    await backend.bump(["x"])
+    assert await backend.versions(["x", "y"]) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_invalidate_on_the_event_loop(cache):
+    """Sync callers on the event loop bump the versions in a task"""
+    cache.invalidate(event_tag(1), event_tag(2))
+    assert await cache.backend.versions([event_tag(1)]) == (0,)
+    await asyncio.sleep(0)
+    assert await cache.backend.versions([event_tag(1), event_tag(2)]) == (1, 1)
+
+
+def test_hits_etag_and_invalidation(cache):
+    """Repeated reads are served from the cache until their tag is invalidated"""
+    loads = []
+    client = make_client(cache, loads)
+
+    first = client.get("/items/1")
+    second = client.get("/items/1")
+    assert first.json() == second.json() == {"id": 1, "version": 1}
+    assert first.headers["etag"] == second.headers["etag"]
+    assert second.headers["x-extra"] == "1"
+    assert loads == [1]
+
+    # Keys include the query and the vary string
+    client.get("/items/1", params={"user": "other"})
+    assert loads == [1, 1]
+
+    not_modified = client.get(
+        "/items/1", headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert loads == [1, 1]
+
+    cache.invalidate(event_tag(2))
+    client.get("/items/1")
+    assert loads == [1, 1]
+    cache.invalidate(event_tag(1))
+    third = client.get("/items/1", headers={"If-None-Match": first.headers["etag"]})
+    assert third.status_code == 200
+    assert third.json() == {"id": 1, "version": 3}
+    assert cache.stats()["not_modified"] == 1
+
+
+def test_zero_ttl_disables_caching(cache):
+    """A TTL of 0 builds every response"""
+    loads = []
+    client = make_client(cache, loads, ttl=0)
+    client.get("/items/1")
+    response = client.get("/items/1")
+    assert loads == [1, 1]
+    assert "etag" not in response.headers
+
+
+def test_backend_errors_are_misses():
+    """A failing store serves every response from the database"""
+
+    class BrokenBackend(LRUBackend):
+        """Store whose every call fails"""
+
+        async def versions(self, tags):
+            raise ConnectionError("down")
+
+        async def bump(self, tags):
+            raise ConnectionError("down")
+
+    cache = ResponseCache(BrokenBackend(10))
+    loads = []
+    client = make_client(cache, loads)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/1").status_code == 200
+    cache.invalidate(event_tag(1))
+    assert loads == [1, 1]
+    assert cache.stats()["errors"] == 3
+
+
+def test_size_of_a_shared_store_is_not_reported():
+    """Only the in-process store reports its size"""
+    assert ResponseCache(LRUBackend(10)).stats()["size"] == 0
+    assert ResponseCache(object()).stats()["size"] is None
+
+
+def test_service_writes_invalidate(db):
+    """Creating and joining events bump the versions of their tags"""
+    user = CS_Users(username="u", email="u@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+
+    before = versions([EVENTS_TAG])
+    event_id = create_event(
+        db, {"name": "e", "description": "", "created_by": user.id}
+    )["event"]["id"]
+    assert versions([EVENTS_TAG])[0] == before[0] + 1
+
+    before = versions([event_tag(event_id)])
+    join_event(db, user.id, event_id)
+    assert versions([event_tag(event_id)])[0] == before[0] + 1
+    assert db.query(CS_Events).count() == 1
+
+
+def test_timezone_change_invalidates_joined_events(db):
+    """A new timezone changes the effective streaks shown by the user's events"""
+    user = CS_Users(username="u", email="u@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    joined, other = (
+        create_event(db, {"name": n, "description": "", "created_by": user.id})[
+            "event"
+        ]["id"]
+        for n in ("joined", "other")
+    )
+    join_event(db, user.id, joined)
+
+    tags = [event_tag(joined), event_tag(other)]
+    before = versions(tags)
+    set_user_timezone(db, user.id, "Asia/Kolkata")
+    assert versions(tags) == (before[0] + 1, before[1])
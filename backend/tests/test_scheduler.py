@@ -0,0 +1,142 @@
+"""
+This file contains the tests for the scheduled streak jobs.
+"""
+
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.db.models import CS_Users, CS_Events, CS_UserEvents, CS_UserProps
+from app.handlers.scheduler import expire_streaks, reset_streak_counts
+from app.services.events_svc import (
+    get_event_details_from_db,
+    get_user_joined_events,
+    mark_event_completed,
+)
+from app.services.timezones import (
+    get_user_timezone,
+    set_user_timezone,
+    streak_cutoff_utc,
+)
+
+
+def test_streak_cutoff_is_yesterdays_local_midnight():
+    """The cutoff does not depend on how late after midnight the job runs"""
+    assert streak_cutoff_utc("UTC", datetime(2024, 3, 2, 0, 7)) == datetime(2024, 3, 1)
+    # 2024-03-02 19:10 UTC is 00:40 on the 3rd in Kolkata (+05:30)
+    assert streak_cutoff_utc("Asia/Kolkata", datetime(2024, 3, 2, 19, 10)) == datetime(
+        2024, 3, 1, 18, 30
+    )
+
+
+def test_reset_only_touches_stale_non_zero_streaks(db):
+    """Stale and NULL `modified` rows are reset in chunks, fresh streaks are kept"""
+    now = datetime.utcnow()
+    rows = {
+        "stale": CS_UserEvents(
+            user_id=1, event_id=1, streak_count=4, modified=now - timedelta(days=3)
+        ),
+        "never_marked": CS_UserEvents(
+            user_id=2, event_id=1, streak_count=2, modified=None
+        ),
+        "yesterday": CS_UserEvents(
+            user_id=3, event_id=1, streak_count=7, modified=now - timedelta(days=1)
+        ),
+        "today": CS_UserEvents(user_id=4, event_id=1, streak_count=1, modified=now),
+        "already_zero": CS_UserEvents(
+            user_id=5, event_id=1, streak_count=0, modified=now - timedelta(days=9)
+        ),
+    }
+    for i in range(6, 11):
+        rows[f"stale{i}"] = CS_UserEvents(
+            user_id=i, event_id=2, streak_count=i, modified=now - timedelta(days=5)
+        )
+    db.add_all(rows.values())
+    db.commit()
+
+    summary = reset_streak_counts(db, chunk_size=2)
+
+    assert summary["rows"] == 7
+    assert summary["chunks"] == 4
+    db.expire_all()
+    streaks = {name: row.streak_count for name, row in rows.items()}
+    assert streaks["stale"] == streaks["never_marked"] == 0
+    assert streaks["yesterday"] == 7
+    assert streaks["today"] == 1
+    assert all(streaks[f"stale{i}"] == 0 for i in range(6, 11))
+
+
+def test_hourly_runs_reset_each_timezone_at_its_cutoff(db):
+    """Each run only resets the users whose local day ended since they marked"""
+    marked = datetime(2024, 3, 1, 12, 0)
+    utc_user = CS_UserEvents(user_id=1, event_id=1, streak_count=3, modified=marked)
+    kolkata_user = CS_UserEvents(user_id=2, event_id=1, streak_count=5, modified=marked)
+    db.add_all([utc_user, kolkata_user])
+    db.commit()
+    set_user_timezone(db, 2, "Asia/Kolkata")
+
+    # Kolkata reaches midnight of the 3rd first, the UTC user is left alone
+    assert expire_streaks(db, now=datetime(2024, 3, 2, 19, 0))["rows"] == 1
+    db.expire_all()
+    assert (utc_user.streak_count, kolkata_user.streak_count) == (3, 0)
+
+    # The run at UTC midnight was missed, the next one catches up
+    assert expire_streaks(db, now=datetime(2024, 3, 3, 5, 0))["rows"] == 1
+    db.expire_all()
+    assert utc_user.streak_count == 0
+
+
+def test_reset_without_a_local_midnight(db):
+    """A DST change at midnight (no local hour 0 that day) does not skip the reset"""
+    # Havana jumps from 00:00 to 01:00 on 2026-03-08, 05:00 UTC is 01:00 local
+    havana_user = CS_UserEvents(
+        user_id=1, event_id=1, streak_count=4, modified=datetime(2026, 3, 6, 17, 0)
+    )
+    db.add(havana_user)
+    db.commit()
+    set_user_timezone(db, 1, "America/Havana")
+
+    assert expire_streaks(db, now=datetime(2026, 3, 8, 5, 0))["rows"] == 1
+    db.expire_all()
+    assert havana_user.streak_count == 0
+
+
+def test_lazy_expiry_computes_streaks_on_read(db, monkeypatch):
+    """With lazy expiry the job writes nothing and reads report the effective streak"""
+    monkeypatch.setattr(settings, "lazy_streak_expiry", True)
+    user = CS_Users(username="lazy", email="lazy@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    ev = CS_Events(name="lazy", description="", created_by=user.id)
+    db.add(ev)
+    db.flush()
+    stale = CS_UserEvents(
+        user_id=user.id,
+        event_id=ev.id,
+        streak_count=5,
+        modified=datetime.utcnow() - timedelta(days=3),
+    )
+    db.add(stale)
+    db.commit()
+
+    assert not expire_streaks(db, now=datetime(2024, 3, 3, 0, 0))
+    db.expire_all()
+    assert stale.streak_count == 5
+
+    assert get_user_joined_events(db, user.id)[0]["streak_count"] == 0
+    details = get_event_details_from_db(db, ev.id, 10, user.id)
+    assert details["top_users"][0]["streak_count"] == 0
+    assert details["user_details"]["streak_count"] == 0
+
+    assert mark_event_completed(db, user.id, ev.id)["streak_count"] == 1
+
+
+def test_user_timezone_with_two_live_rows(db):
+    """A duplicate live timezone row (racing updates) resolves to the newest one"""
+    db.add_all(
+        [
+            CS_UserProps(user_id=1, attribute_name="timezone", attribute_value=tz)
+            for tz in ("Asia/Kolkata", "Europe/Paris")
+        ]
+    )
+    db.commit()
+
+    assert get_user_timezone(db, 1) == "Europe/Paris"
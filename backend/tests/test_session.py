@@ -0,0 +1,62 @@
+"""
+This file contains the tests for the SQLite engine profile.
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from app.core.config import settings
+from app.db.session import configure_sqlite_engine, create_async_engines
+
+
+def file_engine(path, writer=False):
+    """Engine on a SQLite file with the application profile"""
+    engine = create_engine(f"sqlite:///{path}")
+    configure_sqlite_engine(engine, writer=writer)
+    return engine
+
+
+def test_pragmas_are_applied_on_connect(tmp_path):
+    """Every new connection gets WAL and the tuned pragmas"""
+    engine = file_engine(tmp_path / "pragmas.db")
+    with engine.connect() as conn:
+
+        def pragma(name):
+            return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == settings.sqlite_busy_timeout_ms
+        assert pragma("cache_size") == settings.sqlite_cache_size
+    engine.dispose()
+
+
+def test_writers_take_the_lock_up_front(tmp_path, monkeypatch):
+    """A second writer waits at BEGIN while readers keep reading the last commit"""
+    monkeypatch.setattr(settings, "sqlite_busy_timeout_ms", 50)
+    path = tmp_path / "writers.db"
+    first, second = file_engine(path, writer=True), file_engine(path, writer=True)
+    reader = file_engine(path)
+    with first.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+
+    with first.begin() as conn:
+        conn.execute(text("INSERT INTO t VALUES (1)"))
+        with pytest.raises(OperationalError, match="locked"):
+            with second.begin():
+                pass
+        with reader.connect() as read_conn:
+            assert read_conn.execute(text("SELECT count(*) FROM t")).scalar() == 0
+
+    for engine in (first, second, reader):
+        engine.dispose()
+
+
+def test_async_write_engine_has_a_single_connection(tmp_path):
+    """SQLite writers of a process queue on a one-connection pool"""
+    read_engine, write_engine = create_async_engines(
+        f"sqlite+aiosqlite:///{tmp_path / 'split.db'}"
+    )
+    assert read_engine.pool.size() == 5
+    assert write_engine.pool.size() == 1
+    assert write_engine.pool._max_overflow == 0  # pylint: disable=protected-access
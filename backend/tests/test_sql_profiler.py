@@ -0,0 +1,88 @@
+"""
+This file contains the tests for the SQL profiler and the slow-query log.
+"""
+
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from app.core.config import settings
+from app.core.middlewares import SqlProfileMiddleware
+from app.db import session
+from app.db.session import instrument_engine
+
+
+def records(caplog, logger: str) -> list:
+    """Captured records of one logger"""
+    return [record for record in caplog.records if record.name == logger]
+
+
+@pytest.fixture(name="client")
+def client_fixture(tmp_path, monkeypatch):
+    """App whose route issues one query per item, an N+1 pattern"""
+    monkeypatch.setattr(session, "_monitored_pools", {})
+    monkeypatch.setattr(settings, "sql_slow_query_ms", 0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    instrument_engine(engine, "test", capacity=15)
+
+    app = FastAPI()
+
+    @app.get("/items")
+    def list_items():
+        with engine.connect() as conn:
+            ids = [row[0] for row in conn.exec_driver_sql("SELECT 1 UNION SELECT 2")]
+            for item_id in ids * 3:
+                conn.exec_driver_sql("SELECT ? + 1", (item_id,))
+        return ids
+
+    app.add_middleware(SqlProfileMiddleware)
+    yield TestClient(app)
+    engine.dispose()
+
+
+def test_profiling_is_opt_in(client, monkeypatch, caplog):
+    """Requests are profiled only with the header or the setting"""
+    caplog.set_level(logging.INFO, logger="sql.profile")
+    assert "x-sql-profile" not in client.get("/items").headers
+    # The header is ignored unless allowed
+    response = client.get("/items", headers={"X-SQL-Profile": "1"})
+    assert "x-sql-profile" not in response.headers
+    assert not records(caplog, "sql.profile")
+
+    monkeypatch.setattr(settings, "sql_profiling", True)
+    assert "x-sql-profile" in client.get("/items").headers
+
+
+def test_repeated_statements_are_flagged(client, monkeypatch, caplog):
+    """The summary header and the log point out the N+1 statement"""
+    monkeypatch.setattr(settings, "sql_profile_by_header", True)
+    caplog.set_level(logging.INFO, logger="sql.profile")
+    response = client.get("/items", headers={"X-SQL-Profile": "1"})
+    assert response.json() == [1, 2]
+    summary = response.headers["x-sql-profile"]
+    assert summary.startswith("queries=7; duration_ms=")
+    assert summary.endswith("; repeated=1; slow=0")
+
+    (record,) = records(caplog, "sql.profile")
+    assert record.levelno == logging.WARNING
+    assert "possible N+1, 6x" in record.getMessage()
+    assert "parameters=(2,)" in record.getMessage()
+
+    # Below the threshold the profile is informational
+    caplog.clear()
+    monkeypatch.setattr(settings, "sql_profile_repeat_threshold", 7)
+    response = client.get("/items", headers={"X-SQL-Profile": "1"})
+    assert "repeated=0" in response.headers["x-sql-profile"]
+    assert records(caplog, "sql.profile")[0].levelno == logging.INFO
+
+
+def test_slow_queries_are_logged(client, monkeypatch, caplog):
+    """Statements over the threshold are logged without profiling"""
+    monkeypatch.setattr(settings, "sql_slow_query_ms", 1e-6)
+    caplog.set_level(logging.WARNING, logger="sql.slow")
+    client.get("/items")
+    messages = [record.getMessage() for record in records(caplog, "sql.slow")]
+    assert len(messages) == 7
+    assert messages[-1].startswith("Slow query (")
+    assert messages[-1].endswith("SELECT ? + 1 parameters=(2,)")